@@ -0,0 +1,83 @@
+"""
+Bytes on the wire for `PDBeMolstar.custom_data` with and without binary buffers.
+
+Each source is sent both uncompressed as zero-copy binary buffers
+(`compression=None`) and gzip-compressed (`compression="gzip"`).
+
+Run with `python benchmarks/custom_data_transport.py`. The time until the
+frontend fires `loadComplete` depends on the browser and needs to be measured
+there; open the devtools network/performance tab while displaying the viewer
+created at the bottom of this script in a notebook.
+"""
+
+# %%
+import base64
+import json
+import mmap
+import time
+from pathlib import Path
+
+import numpy as np
+from ipywidgets.widgets.widget import _remove_buffers
+
+from ipymolstar import PDBeMolstar
+
+root = Path(__file__).parent.parent
+fpth = root / "assets" / "6vsb.bcif"
+
+
+def wire_size(widget: PDBeMolstar) -> tuple[int, int, float]:
+    """Return (json bytes, binary buffer bytes, seconds) to serialize the state."""
+    t0 = time.perf_counter()
+    state, _, buffers = _remove_buffers(widget.get_state())
+    payload = json.dumps(state)
+    elapsed = time.perf_counter() - t0
+    return len(payload), sum(memoryview(b).nbytes for b in buffers), elapsed
+
+
+def report(label: str, json_bytes: int, buffer_bytes: int, elapsed: float):
+    total = json_bytes + buffer_bytes
+    print(
+        f"{label:<16} json={json_bytes:>10,d} B  buffers={buffer_bytes:>10,d} B  "
+        f"total={total:>10,d} B  serialize={elapsed * 1e3:7.2f} ms"
+    )
+
+
+# %%
+raw = fpth.read_bytes()
+print(f"{fpth.name}: {len(raw):,d} bytes on disk")
+
+# base64 inside the JSON state, as a JSON-only transport would need
+encoded = {"data": base64.b64encode(raw).decode(), "format": "cif", "binary": True}
+t0 = time.perf_counter()
+size = len(json.dumps({"custom_data": encoded}))
+report("base64/json", size, 0, time.perf_counter() - t0)
+
+sources = {
+    "bytes": raw,
+    "memoryview": memoryview(raw),
+    "numpy": np.fromfile(fpth, dtype=np.uint8),
+}
+with fpth.open("rb") as f:
+    sources["mmap"] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    for compression in (None, "gzip"):
+        for label, data in sources.items():
+            view = PDBeMolstar(
+                custom_data={"data": data, "format": "cif", "binary": True},
+                compression=compression,
+            )
+            report(f"{label}/{compression or 'raw'}", *wire_size(view))
+            view.close()
+
+# %%
+view = PDBeMolstar(
+    custom_data={
+        "data": np.fromfile(fpth, dtype=np.uint8),
+        "format": "cif",
+        "binary": True,
+    },
+    compression=None,
+    hide_water=True,
+)
+view
@@ -0,0 +1,171 @@
+"""
+Time to first frame of `PDBeMolstar` with the bundled plugin and with the CDN.
+
+The widget module is rendered in a bare page with a minimal model, loading
+`assets/1qyn.pdb` as custom data so that only the plugin code is fetched. The
+widget sets `performance` marks when its module is evaluated, when it starts
+rendering and on the first frame after loading the structure; times are in ms
+from navigation.
+
+Each run uses a fresh browser context (cold cache), followed by a reload in the
+same context (warm cache). Requires playwright (`pip install playwright &&
+playwright install chromium`) and the bundle built with `npm run build`. The CDN
+variant is bundled the same way with esbuild, with the pdbe-molstar package
+replaced by a module which imports the plugin from the CDN, and needs network
+access.
+
+Run with `python benchmarks/time_to_first_frame.py [runs]`.
+"""
+
+# %%
+import functools
+import http.server
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from ipymolstar import PDBeMolstar
+
+root = Path(__file__).parent.parent
+# stands in for pdbe-molstar/lib/viewer in the CDN variant
+CDN_MODULE = (
+    'import "https://cdn.jsdelivr.net/npm/pdbe-molstar@3.3.2/build/pdbe-molstar-plugin.js";\n'
+    "export const PDBeMolstarPlugin = window.PDBeMolstarPlugin;\n"
+)
+MARKS = ["ipymolstar:module", "ipymolstar:render", "ipymolstar:first-frame"]
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head><link rel="stylesheet" href="pdbe-light.css"></head>
+<body>
+<div id="viewer"></div>
+<script type="module">
+const state = %(state)s;
+const listeners = {};
+const model = {
+  get: (name) => state[name],
+  set: (name, value) => { state[name] = value; },
+  on: (name, callback) => { (listeners[name] ??= []).push(callback); },
+  off: () => {},
+  save_changes: () => {},
+  send: () => {},
+};
+const { default: widget } = await import("./%(module)s");
+widget.render({ model, el: document.getElementById("viewer") });
+</script>
+</body>
+</html>
+"""
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def build_cdn_variant(directory: Path):
+    """Bundle js/pdbemolstar.js as `npm run build` does, with pdbe-molstar from the CDN."""
+    esbuild = root / "node_modules" / ".bin" / "esbuild"
+    if not esbuild.exists():
+        raise RuntimeError("Install the build dependencies with `npm install` first")
+    # the alias maps pdbe-molstar/lib/viewer to pdbe-molstar-cdn/lib/viewer.js
+    module = directory / "pdbe-molstar-cdn" / "lib" / "viewer.js"
+    module.parent.mkdir(parents=True)
+    module.write_text(CDN_MODULE)
+    subprocess.run(
+        [
+            str(esbuild),
+            str(root / "js" / "pdbemolstar.js"),
+            "--bundle",
+            "--minify",
+            "--format=esm",
+            "--alias:pdbe-molstar=./pdbe-molstar-cdn",
+            "--external:https://*",
+            "--outfile=cdn.js",
+        ],
+        cwd=directory,
+        check=True,
+    )
+
+
+def write_variants(directory: Path) -> dict[str, str]:
+    bundle = root / "src" / "ipymolstar" / "static" / "pdbemolstar.js"
+    if not bundle.exists():
+        raise RuntimeError("Build the bundle with `npm run build` first")
+    (directory / "bundled.js").write_text(bundle.read_text())
+    shutil.copy(root / "src" / "ipymolstar" / "static" / "pdbe-light.css", directory)
+    build_cdn_variant(directory)
+
+    widget = PDBeMolstar(
+        custom_data={
+            "data": (root / "assets" / "1qyn.pdb").read_text(),
+            "format": "pdb",
+            "binary": False,
+        },
+        compression=None,
+    )
+    state = json.dumps(widget.get_state())
+    pages = {}
+    for variant in ["bundled", "cdn"]:
+        page = f"{variant}.html"
+        (directory / page).write_text(
+            PAGE % {"state": state, "module": f"{variant}.js"}
+        )
+        pages[variant] = page
+    return pages
+
+
+def read_marks(page) -> dict[str, float]:
+    page.wait_for_function(
+        "performance.getEntriesByName('ipymolstar:first-frame').length > 0",
+        timeout=120_000,
+    )
+    return {
+        name.split(":")[1]: page.evaluate(
+            f"performance.getEntriesByName('{name}')[0].startTime"
+        )
+        for name in MARKS
+    }
+
+
+def measure(browser, url: str) -> tuple[dict, dict]:
+    context = browser.new_context()
+    page = context.new_page()
+    page.goto(url)
+    cold = read_marks(page)
+    page.reload()
+    warm = read_marks(page)
+    context.close()
+    return cold, warm
+
+
+def report(label: str, results: list[dict]):
+    medians = {k: statistics.median(r[k] for r in results) for k in results[0]}
+    print(f"{label:<16}" + "  ".join(f"{k}={v:8.1f} ms" for k, v in medians.items()))
+
+
+# %%
+if __name__ == "__main__":
+    from playwright.sync_api import sync_playwright
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        pages = write_variants(Path(tmp))
+        handler = functools.partial(QuietHandler, directory=tmp)
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        with sync_playwright() as p:
+            browser = p.chromium.launch(args=["--use-gl=swiftshader"])
+            for variant, page in pages.items():
+                results = [measure(browser, f"{base}/{page}") for _ in range(runs)]
+                report(f"{variant} (cold)", [cold for cold, _ in results])
+                report(f"{variant} (warm)", [warm for _, warm in results])
+            browser.close()
+        server.shutdown()
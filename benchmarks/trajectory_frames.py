@@ -0,0 +1,113 @@
+"""
+Resident memory while streaming the frames of a large trajectory to a viewer.
+
+Writes a DCD file of about `size` GB (default 3) to a temporary directory and
+sends all its frames through `PDBeMolstar`'s frame messages, as the frontend
+requests them while playing, with the messages dropped instead of sent. The
+resident set size (RSS) is sampled along the way, and compared to reading the
+whole file into memory. Also times random access to frames.
+
+Run with `python benchmarks/trajectory_frames.py [size]`. RSS is read from
+/proc and thus only reported on Linux.
+"""
+
+# %%
+import random
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ipymolstar import PDBeMolstar
+
+N_ATOMS = 100_000
+# frames requested by the frontend at once, see AHEAD in js/trajectory.js
+WINDOW = 32
+
+
+def rss_mb() -> float:
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def write_dcd(path: Path, n_frames: int, n_atoms: int):
+    def record(payload: bytes) -> bytes:
+        marker = struct.pack("<i", len(payload))
+        return marker + payload + marker
+
+    control = [0] * 20
+    control[0], control[19] = n_frames, 24
+    rng = np.random.default_rng(0)
+    with path.open("wb") as f:
+        f.write(record(b"CORD" + struct.pack("<20i", *control)))
+        f.write(record(struct.pack("<i", 1) + b"ipymolstar benchmark".ljust(80)))
+        f.write(record(struct.pack("<i", n_atoms)))
+        axis = rng.uniform(-50, 50, n_atoms).astype("<f4")
+        for i in range(n_frames):
+            for k in range(3):
+                f.write(record((axis + i + k).tobytes()))
+
+
+size_gb = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+n_frames = int(size_gb * 1024**3 // (N_ATOMS * 12))
+directory = tempfile.TemporaryDirectory()
+path = Path(directory.name) / "trajectory.dcd"
+t0 = time.perf_counter()
+write_dcd(path, n_frames, N_ATOMS)
+print(
+    f"{path.name}: {n_frames:,d} frames of {N_ATOMS:,d} atoms, "
+    f"{path.stat().st_size / 1024**3:.2f} GB, written in {time.perf_counter() - t0:.1f} s"
+)
+
+# %%
+viewer = PDBeMolstar(molecule_id="1qyn")
+sent = []
+viewer.send = lambda content, buffers=None: sent.append(sum(b.nbytes for b in buffers))
+
+baseline = rss_mb()
+print(f"RSS before opening: {baseline:8.1f} MB")
+viewer.open_frames(path)
+samples = []
+t0 = time.perf_counter()
+for start in range(0, n_frames, WINDOW):
+    viewer._handle_custom_msg(
+        {"type": "get_frames", "start": start, "stop": start + WINDOW}, []
+    )
+    samples.append(rss_mb())
+elapsed = time.perf_counter() - t0
+print(
+    f"streamed {sum(sent) / 1024**3:.2f} GB in {elapsed:.1f} s "
+    f"({n_frames / elapsed:,.0f} frames/s)"
+)
+for fraction in (0.1, 0.25, 0.5, 0.75, 1.0):
+    rss = samples[max(0, int(len(samples) * fraction) - 1)]
+    print(f"RSS after {fraction:4.0%} of frames: {rss:8.1f} MB")
+print(
+    f"RSS peak while streaming: {max(samples):8.1f} MB (+{max(samples) - baseline:.1f} MB)"
+)
+
+# %%
+source = viewer._frames._source
+indices = random.Random(0).sample(range(n_frames), min(n_frames, 1000))
+t0 = time.perf_counter()
+for index in indices:
+    source.read(index)
+print(
+    f"random access: {(time.perf_counter() - t0) / len(indices) * 1e3:.3f} ms per frame"
+)
+viewer.clear_frames()
+
+# %%
+t0 = time.perf_counter()
+data = np.fromfile(path, dtype=np.uint8)
+print(
+    f"reading the whole file instead: RSS {rss_mb():8.1f} MB "
+    f"in {time.perf_counter() - t0:.1f} s"
+)
+del data
+directory.cleanup()
@@ -222,43 +222,49 @@ metadata = GlobalMetadata(
     description="a block dangling from two strings",
     description_format=None,
 )
-snapshots = []
 
-state = initial_state
 
-for i in range(500):
-    scene = Scene()
-    upd_vertexes = [state[0] >> point for point in vertexes]
+def simulate(n_frames: int):
+    state = initial_state
+    for i in range(n_frames):
+        scene = Scene()
+        upd_vertexes = [state[0] >> point for point in vertexes]
 
-    for c, face in zip(face_colors, faces):
-        f_vertices = [upd_vertexes[i] for i in face]
-        scene.quadrilateral(f_vertices, color=f"#{c.lower()}")
+        for c, face in zip(face_colors, faces):
+            f_vertices = [upd_vertexes[i] for i in face]
+            scene.quadrilateral(f_vertices, color=f"#{c.lower()}")
 
-    scene.point(
-        *xyz(attach_1.normalized()), size=0.1, color="green", tooltip="attach_1"
-    )
-    scene.point(
-        *xyz(attach_2.normalized()), size=0.1, color="green", tooltip="attach_2"
-    )
+        scene.point(
+            *xyz(attach_1.normalized()), size=0.1, color="green", tooltip="attach_1"
+        )
+        scene.point(
+            *xyz(attach_2.normalized()), size=0.1, color="green", tooltip="attach_2"
+        )
 
-    scene.append([attach_1, upd_vertexes[0]], color="black", size=0.02)
-    scene.append([attach_2, upd_vertexes[1]], color="black", size=0.02)
+        scene.append([attach_1, upd_vertexes[0]], color="black", size=0.02)
+        scene.append([attach_2, upd_vertexes[1]], color="black", size=0.02)
 
-    snapshot = scene.builder.get_snapshot(
-        title=str(i), linger_duration_ms=2, transition_duration_ms=2
-    )
-    snapshots.append(snapshot)
+        yield scene.builder.get_snapshot(
+            title=str(i), linger_duration_ms=2, transition_duration_ms=2
+        )
+
+        # update the state
+        state = RK4(dState, state, 0.01)
 
-    # update the state
-    state = RK4(dState, state, 0.01)
 
+# %%
+# stream the simulation; frames are computed as they are played
+view = MolViewSpec()
+stream = view.stream(simulate(10_000), buffer_size=100)
+view
+
+# %%
+# alternatively, load all snapshots at once as a multi-state document
 states = States(
-    snapshots=snapshots,
+    snapshots=list(simulate(500)),
     metadata=metadata,
 ).dumps()
 
-
-# %%
 mvs_load_options = {"keepSnapshotCamera": True} | DEFAULT_MVS_LOAD_OPTIONS
 view = MolViewSpec(msvj_data=states, mvs_load_options=mvs_load_options)
 view
@@ -1,4 +1,3 @@
-import copy
 import math
 import warnings
 from io import StringIO
@@ -105,7 +104,7 @@ def Page():
         structure = load_structure(pdb_id.value)
         com = calculate_com(structure)
 
-        return builder, com
+        return builder.get_state().dumps(), com
 
     load_task = solara.lab.use_task(load_structure_and_com, dependencies=[pdb_id.value])
 
@@ -133,19 +132,23 @@ def Page():
             if load_task.latest is None:
                 solara.Markdown("Loading...")
             else:
-                builder, com = (
+                msvj_data, com = (
                     load_task.value if load_task.finished else load_task.latest
                 )
 
+                # only the camera changes with the controls, the scene is not reloaded
                 target, position, up = target_spherical_to_tpu(
                     target=com,
                     phi=phi.value,
                     theta=theta.value,
                     radius=radius.value,
                 )
-                local_builder = builder.model_copy()
-                local_builder.camera(target=target, position=position, up=up)
+                camera = {
+                    "target": target,
+                    "position": position,
+                    "up": up,
+                    "transition_duration_ms": 250,
+                }
 
-                msvj_data = local_builder.get_state().dumps()
                 with solara.Div(style="opacity: 0.3" if load_task.pending else None):
-                    view = MolViewSpec.element(msvj_data=msvj_data)
+                    view = MolViewSpec.element(msvj_data=msvj_data, camera=camera)
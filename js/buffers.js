@@ -0,0 +1,20 @@
+// inverse of `_separate_buffers` in python
+export function putBuffers(obj, bufferPaths, buffers) {
+  bufferPaths.forEach((path, i) => {
+    let target = obj;
+    for (const key of path.slice(0, -1)) {
+      target = target[key];
+    }
+    target[path[path.length - 1]] = buffers[i];
+  });
+}
+
+// binary values arrive as DataView (anywidget) or ArrayBuffer (panel)
+export function toTypedArray(value, Type) {
+  const view = ArrayBuffer.isView(value) ? value : new DataView(value);
+  if (view.byteOffset % Type.BYTES_PER_ELEMENT !== 0) {
+    const copy = view.buffer.slice(view.byteOffset, view.byteOffset + view.byteLength);
+    return new Type(copy);
+  }
+  return new Type(view.buffer, view.byteOffset, view.byteLength / Type.BYTES_PER_ELEMENT);
+}
@@ -0,0 +1,21 @@
+function standardize_color(str) {
+  var ctx = document.createElement("canvas").getContext("2d");
+  ctx.fillStyle = str;
+  return ctx.fillStyle;
+}
+
+// Mol* color from a CSS color (hex or named) or an {r, g, b} object
+export function toRgb(color) {
+  if (typeof color === "object" && color !== null) {
+    return { r: color.r, g: color.g, b: color.b };
+  }
+  var hex = standardize_color(color);
+  var result = /^#?([a-f\d]{2})([a-f\d]{2})([a-f\d]{2})$/i.exec(hex);
+  return result
+    ? {
+        r: parseInt(result[1], 16),
+        g: parseInt(result[2], 16),
+        b: parseInt(result[3], 16),
+      }
+    : null;
+}
@@ -0,0 +1,304 @@
+// Page-level pool of live WebGL contexts, shared by the viewers of all
+// ipymolstar widgets. Browsers keep only around 16 contexts alive per page and
+// silently drop the oldest beyond that, leaving black canvases. Instead, at
+// most `size` viewers keep a live context: the least recently used viewers
+// beyond that are parked, showing their last frame as an image while their
+// context is released with WEBGL_lose_context. A parked viewer is restored
+// when it is interacted with or receives new data; Mol* recreates its GPU
+// resources when the context is restored.
+class ContextPool {
+  constructor(size) {
+    this.size = size; // 0 keeps all contexts live
+    this.live = new Set(); // least recently used first
+    this.listeners = new Set();
+  }
+
+  acquire(viewer) {
+    const count = this.live.size;
+    this.live.delete(viewer);
+    this.live.add(viewer);
+    viewer.unpark();
+    this.evict();
+    if (this.live.size !== count) this.notify();
+  }
+
+  release(viewer) {
+    if (this.live.delete(viewer)) this.notify();
+  }
+
+  resize(size) {
+    if (size === this.size) return;
+    this.size = size;
+    this.evict();
+    this.notify();
+  }
+
+  evict() {
+    for (const viewer of this.live) {
+      if (this.size <= 0 || this.live.size <= this.size) break;
+      this.live.delete(viewer);
+      viewer.park();
+    }
+  }
+
+  notify() {
+    this.listeners.forEach((listener) => listener(this.live.size));
+  }
+
+  subscribe(listener) {
+    this.listeners.add(listener);
+    listener(this.live.size);
+    return () => this.listeners.delete(listener);
+  }
+}
+
+if (!globalThis.__ipymolstarContextPool) {
+  const pool = new ContextPool(0);
+  // live viewers stop rendering while the page is hidden
+  document.addEventListener?.("visibilitychange", () => pool.live.forEach((viewer) => viewer.syncLoop()));
+  globalThis.__ipymolstarContextPool = pool;
+}
+export const contextPool = globalThis.__ipymolstarContextPool;
+
+// events on the viewer container which restore a parked viewer
+const INTERACTIONS = ["pointerenter", "pointerdown", "wheel", "focusin"];
+// further events which keep a viewer from going idle
+const ACTIVITY = ["pointermove", "keydown"];
+
+// A Mol* plugin's canvas as a member of the context pool. Its render loop only
+// runs while the context is live, the viewer is visible on a visible page, and
+// it has been interacted with or updated within the last `idleTimeout` ms.
+export class PooledViewer {
+  constructor(container) {
+    this.container = container;
+    this.plugin = null;
+    this.extension = null;
+    this.image = null;
+    this.restoring = null;
+    this.visible = true;
+    this.running = false;
+    this.disposed = false;
+
+    this.idleTimeout = 0; // 0 never goes idle
+    this.idle = false;
+    this.lastActive = performance.now();
+    this.idleTimer = null;
+
+    // seconds with the render loop running and paused, and the number of draws
+    this.stats = { active_s: 0, paused_s: 0, draws: 0 };
+    this.since = null;
+    this.drawSubscription = null;
+    this.onStateChange = null;
+    this.reported = null;
+
+    this.onInteraction = () => this.use();
+    this.onActivity = () => this.touch();
+    INTERACTIONS.forEach((name) => container.addEventListener(name, this.onInteraction));
+    ACTIVITY.forEach((name) => container.addEventListener(name, this.onActivity));
+  }
+
+  get parked() {
+    return this.image !== null;
+  }
+
+  get state() {
+    if (!this.visible) return "offscreen";
+    if (!this.plugin) return "loading";
+    if (this.parked) return "parked";
+    if (document.hidden) return "hidden";
+    if (this.idle) return "idle";
+    return "running";
+  }
+
+  // join the pool once the plugin has created its canvas
+  attach(plugin) {
+    const context = plugin && plugin.canvas3dContext;
+    if (!context || this.disposed) return;
+    this.plugin = plugin;
+    this.extension = context.webgl.gl.getExtension("WEBGL_lose_context");
+    // Mol* starts its render loop when the canvas is created
+    this.running = true;
+    this.since = performance.now();
+    // didDraw is a BehaviorSubject, skip its current value
+    let current = true;
+    this.drawSubscription = plugin.canvas3d?.didDraw.subscribe(() => {
+      if (!current) this.stats.draws++;
+    });
+    current = false;
+    this.use();
+    this.syncLoop();
+  }
+
+  // a viewer scrolled into view is used, one scrolled out of view stops rendering
+  setVisible(visible) {
+    this.visible = visible;
+    if (visible) this.use();
+    this.syncLoop();
+  }
+
+  setIdleTimeout(ms) {
+    this.idleTimeout = ms;
+    this.touch();
+  }
+
+  // run the render loop only while live, visible and not idle; with `force`
+  // also when Mol* may have started or stopped it by itself
+  syncLoop(force = false) {
+    const canvas3d = this.plugin && this.plugin.canvas3d;
+    const run = !this.parked && this.visible && !document.hidden && !this.idle;
+    if (canvas3d && (force || run !== this.running)) {
+      if (run) {
+        canvas3d.animate();
+        canvas3d.requestDraw();
+      } else {
+        canvas3d.pause();
+      }
+      this.setRunning(run);
+    }
+    this.report();
+  }
+
+  setRunning(running) {
+    const now = performance.now();
+    this.stats[this.running ? "active_s" : "paused_s"] += (now - this.since) / 1000;
+    this.since = now;
+    this.running = running;
+  }
+
+  // current state and stats, with the draws avoided while paused estimated from
+  // the draw rate while running
+  report() {
+    const state = this.state;
+    if (!this.onStateChange || state === this.reported) return;
+    this.reported = state;
+    if (this.plugin) this.setRunning(this.running);
+    const { active_s, paused_s, draws } = this.stats;
+    const rate = active_s > 0 ? draws / active_s : 0;
+    this.onStateChange(state, { ...this.stats, draws_avoided: Math.round(rate * paused_s) });
+  }
+
+  // interaction or an update, resumes rendering when idle
+  touch() {
+    this.lastActive = performance.now();
+    if (this.idle) {
+      this.idle = false;
+      this.syncLoop();
+    }
+    this.scheduleIdle();
+  }
+
+  scheduleIdle() {
+    if (this.idleTimer !== null || !this.idleTimeout || this.disposed) return;
+    const wait = this.lastActive + this.idleTimeout - performance.now();
+    this.idleTimer = setTimeout(() => {
+      this.idleTimer = null;
+      if (!this.idleTimeout) return;
+      if (performance.now() - this.lastActive < this.idleTimeout) {
+        this.scheduleIdle();
+        return;
+      }
+      this.idle = true;
+      this.syncLoop();
+    }, Math.max(0, wait));
+  }
+
+  // mark as recently used, restoring the context if parked
+  use() {
+    this.touch();
+    if (this.plugin) contextPool.acquire(this);
+  }
+
+  // use and wait until the context is live
+  async live() {
+    this.use();
+    await this.restoring;
+  }
+
+  park() {
+    if (this.parked || !this.extension) return;
+    const { canvas } = this.plugin.canvas3dContext;
+    // Mol* preserves the drawing buffer, so the canvas still holds the last frame
+    const image = document.createElement("img");
+    image.src = canvas.toDataURL();
+    Object.assign(image.style, {
+      position: "absolute",
+      left: `${canvas.offsetLeft}px`,
+      top: `${canvas.offsetTop}px`,
+      width: `${canvas.clientWidth}px`,
+      height: `${canvas.clientHeight}px`,
+      pointerEvents: "none",
+    });
+    canvas.parentElement.insertBefore(image, canvas.nextSibling);
+    this.image = image;
+    this.plugin.canvas3d?.pause(true);
+    if (this.running) this.setRunning(false);
+    this.extension.loseContext();
+    this.report();
+  }
+
+  unpark() {
+    if (!this.parked) return;
+    const image = this.image;
+    this.image = null;
+    this.restoring = new Promise((resolve) => {
+      const restored = this.plugin.canvas3dContext.contextRestored.subscribe(() => {
+        restored.unsubscribe();
+        this.restoring = null;
+        this.syncLoop();
+        // keep the image until the restored context has drawn a frame
+        requestAnimationFrame(() => requestAnimationFrame(() => image.remove()));
+        resolve();
+      });
+    });
+    this.extension.restoreContext();
+  }
+
+  dispose() {
+    this.disposed = true;
+    INTERACTIONS.forEach((name) => this.container.removeEventListener(name, this.onInteraction));
+    ACTIVITY.forEach((name) => this.container.removeEventListener(name, this.onActivity));
+    clearTimeout(this.idleTimer);
+    this.drawSubscription?.unsubscribe();
+    contextPool.release(this);
+    this.image?.remove();
+  }
+}
+
+// milliseconds over which changes of the pool are coalesced into one update
+// of a model's `live_contexts`; every widget on the page reports to its own
+// model, such that viewers mounting together would otherwise each send a
+// message per viewer
+const LIVE_CONTEXTS_DELAY = 100;
+
+// Keep the model's `live_contexts` at the number of live contexts on the page
+export function syncLiveContexts(model) {
+  let timer = null;
+  const unsubscribe = contextPool.subscribe(() => {
+    timer ??= setTimeout(() => {
+      timer = null;
+      const count = contextPool.live.size;
+      if (model.get("live_contexts") === count) return;
+      model.set("live_contexts", count);
+      model.save_changes();
+    }, LIVE_CONTEXTS_DELAY);
+  });
+  return () => {
+    clearTimeout(timer);
+    unsubscribe();
+  };
+}
+
+// Keep the model's `render_state` and `render_stats` up to date, and the
+// viewer's idle timeout at the model's `idle_timeout` (in seconds)
+export function syncRenderState(model, viewer) {
+  viewer.onStateChange = (state, stats) => {
+    model.set("render_state", state);
+    model.set("render_stats", stats);
+    model.save_changes();
+  };
+  const setIdleTimeout = () => viewer.setIdleTimeout(model.get("idle_timeout") * 1000);
+  setIdleTimeout();
+  viewer.report();
+  model.on("change:idle_timeout", setIdleTimeout);
+  return () => model.off("change:idle_timeout", setIdleTimeout);
+}
@@ -0,0 +1,266 @@
+import { PDBeMolstarPlugin } from "pdbe-molstar/lib/viewer";
+import { PooledViewer, contextPool, syncLiveContexts } from "./context_pool.js";
+import { observeVisibility } from "./visibility.js";
+import { capture } from "./screenshot.js";
+import { toRgb } from "./colors.js";
+
+// custom_data above the compression threshold is sent compressed
+async function customDataUrl({ data, compression, ...rest }) {
+  let blob = new Blob([data]);
+  if (compression) {
+    const stream = blob.stream().pipeThrough(new DecompressionStream(compression));
+    blob = await new Response(stream).blob();
+  }
+  return { ...rest, url: URL.createObjectURL(blob) };
+}
+
+async function getOptions(model, entry) {
+  return {
+    moleculeId: entry.molecule_id || "",
+    customData: entry.custom_data ? await customDataUrl(entry.custom_data) : undefined,
+    bgColor: toRgb(model.get("bg_color")),
+    hideControls: true,
+    hideCanvasControls: ["expand", "selection", "animation", "controlToggle", "controlInfo"],
+    sequencePanel: false,
+    pdbeLink: false,
+  };
+}
+
+function label(entry, index) {
+  return entry.molecule_id || (entry.custom_data && entry.custom_data.label) || `#${index}`;
+}
+
+// Grid of structures drawn by one pdbe-molstar plugin: tiles are rendered to
+// images in turn once they scroll into view, and the selected tile is shown
+// in the interactive viewer above the grid. Loads of tiles and of the
+// selected structure share the plugin and are queued.
+function render({ model, el }) {
+  const viewerContainer = document.createElement("div");
+  Object.assign(viewerContainer.style, {
+    position: "relative",
+    width: model.get("width"),
+    height: model.get("height"),
+    maxWidth: "100%",
+    boxSizing: "border-box",
+  });
+  const grid = document.createElement("div");
+  grid.style.display = "grid";
+  grid.style.gap = "4px";
+  grid.style.marginTop = "4px";
+  el.append(viewerContainer, grid);
+
+  contextPool.resize(model.get("context_pool_size"));
+  const viewerInstance = new PDBeMolstarPlugin();
+  const pooled = new PooledViewer(viewerContainer);
+  const unsyncLiveContexts = syncLiveContexts(model);
+
+  let queue = Promise.resolve();
+  function enqueue(task) {
+    queue = queue.then(task).catch((error) => console.error(error));
+    return queue;
+  }
+
+  let loadWaiters = [];
+  const loadCompleteSubscription = viewerInstance.events.loadComplete.subscribe((success) =>
+    loadWaiters.splice(0).forEach((resolve) => resolve(success))
+  );
+
+  // index of the structure the plugin shows
+  let shown = null;
+  let rendered = false;
+
+  async function show(entry) {
+    const options = await getOptions(model, entry);
+    const loaded = new Promise((resolve) => loadWaiters.push(resolve));
+    if (!rendered) {
+      rendered = true;
+      await viewerInstance.render(viewerContainer, options);
+      pooled.attach(viewerInstance.plugin);
+    } else {
+      viewerInstance.visual.update(options, true);
+    }
+    try {
+      if ((await loaded) === false) {
+        throw new Error(`loading ${label(entry, shown)} failed`);
+      }
+    } finally {
+      if (options.customData) {
+        URL.revokeObjectURL(options.customData.url);
+      }
+    }
+  }
+
+  async function showSelected() {
+    const index = model.get("selected");
+    const entry = model.get("structures")[index];
+    if (index === null || index === shown || !entry) {
+      return;
+    }
+    shown = index;
+    await show(entry);
+  }
+
+  function reportTiming(index, timing) {
+    const timings = model.get("tile_timings").slice();
+    timings[index] = timing;
+    model.set("tile_timings", timings);
+    model.save_changes();
+  }
+
+  let tiles = [];
+  let pendingTiles = 0;
+
+  function renderTile(tile, entry) {
+    pendingTiles++;
+    enqueue(async () => {
+      try {
+        if (tile.disposed) {
+          return;
+        }
+        const started = performance.now();
+        shown = tile.index;
+        await show(entry);
+        const loaded = performance.now();
+        const size = Math.round(model.get("tile_size") * (window.devicePixelRatio || 1));
+        const png = await capture(viewerInstance.plugin, pooled, { width: size, height: size });
+        if (tile.disposed) {
+          return;
+        }
+        tile.url = URL.createObjectURL(new Blob([png], { type: "image/png" }));
+        tile.image.src = tile.url;
+        reportTiming(tile.index, {
+          load_ms: Math.round(loaded - started),
+          render_ms: Math.round(performance.now() - loaded),
+        });
+      } catch (error) {
+        tile.element.title = String(error);
+        reportTiming(tile.index, { error: String(error) });
+      } finally {
+        // show the selected structure again once all visible tiles are done
+        if (--pendingTiles === 0) {
+          enqueue(showSelected);
+        }
+      }
+    });
+  }
+
+  function highlightSelected() {
+    const selected = model.get("selected");
+    tiles.forEach((tile) => {
+      tile.element.style.outline = tile.index === selected ? "2px solid #1a73e8" : "none";
+    });
+  }
+
+  function disposeTiles() {
+    tiles.forEach((tile) => {
+      tile.disposed = true;
+      tile.unobserve();
+      if (tile.url) {
+        URL.revokeObjectURL(tile.url);
+      }
+    });
+    tiles = [];
+    grid.replaceChildren();
+  }
+
+  function buildTiles() {
+    disposeTiles();
+    const size = `${model.get("tile_size")}px`;
+    layoutGrid();
+    const structures = model.get("structures");
+    tiles = structures.map((entry, index) => {
+      const element = document.createElement("div");
+      Object.assign(element.style, {
+        position: "relative",
+        width: size,
+        height: size,
+        cursor: "pointer",
+        background: model.get("bg_color"),
+      });
+      const image = document.createElement("img");
+      Object.assign(image.style, { width: "100%", height: "100%", display: "block" });
+      const caption = document.createElement("span");
+      caption.textContent = label(entry, index);
+      Object.assign(caption.style, {
+        position: "absolute",
+        left: "4px",
+        bottom: "2px",
+        fontSize: "11px",
+        pointerEvents: "none",
+      });
+      element.append(image, caption);
+      element.addEventListener("click", () => {
+        model.set("selected", index);
+        model.save_changes();
+      });
+      grid.appendChild(element);
+
+      const tile = { element, image, index, url: null, queued: false, disposed: false };
+      tile.unobserve = observeVisibility(element, (visible) => {
+        if (visible && !tile.queued) {
+          tile.queued = true;
+          renderTile(tile, entry);
+        }
+      });
+      return tile;
+    });
+    highlightSelected();
+    // timings of the tiles about to be rendered
+    model.set("tile_timings", structures.map(() => null));
+    model.save_changes();
+  }
+
+  function layoutGrid() {
+    grid.style.gridTemplateColumns = `repeat(${model.get("columns")}, ${model.get("tile_size")}px)`;
+  }
+
+  buildTiles();
+  const unobserve = observeVisibility(viewerContainer, (visible) => {
+    if (visible) {
+      enqueue(showSelected);
+    }
+    pooled.setVisible(visible);
+  });
+
+  const callbacks = {
+    "change:structures": () => {
+      shown = null;
+      buildTiles();
+      enqueue(showSelected);
+    },
+    "change:columns": layoutGrid,
+    "change:tile_size": buildTiles,
+    "change:selected": () => {
+      highlightSelected();
+      pooled.use();
+      enqueue(showSelected);
+    },
+    "change:bg_color": () => {
+      if (rendered) {
+        viewerInstance.canvas.setBgColor(toRgb(model.get("bg_color")));
+      }
+    },
+    "change:context_pool_size": () => contextPool.resize(model.get("context_pool_size")),
+    "change:height": () => {
+      viewerContainer.style.height = model.get("height");
+    },
+    "change:width": () => {
+      viewerContainer.style.width = model.get("width");
+    },
+  };
+  Object.entries(callbacks).forEach(([name, callback]) => model.on(name, callback));
+
+  return () => {
+    Object.entries(callbacks).forEach(([name, callback]) => model.off(name, callback));
+    unobserve();
+    disposeTiles();
+    unsyncLiveContexts();
+    pooled.dispose();
+    loadCompleteSubscription.unsubscribe();
+    if (viewerInstance.plugin) {
+      viewerInstance.plugin.dispose();
+    }
+  };
+}
+
+export default { render };
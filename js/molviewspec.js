@@ -1,11 +1,283 @@
 // import "./widget.css";
 import 'molstar/build/viewer/molstar.css';
 import { Viewer, PluginExtensions } from 'molstar/build/viewer/molstar'
+import { PooledViewer, contextPool, syncLiveContexts, syncRenderState } from './context_pool.js';
+import { observeVisibility } from './visibility.js';
+import { ScreenshotQueue } from './screenshot.js';
 
 
 function updateFromMSVJ(viewer, msvj, options) {
     const mvsData = PluginExtensions.mvs.MVSData.fromMVSJ(msvj);
-    PluginExtensions.mvs.loadMVS(viewer.plugin, mvsData, options);
+    return PluginExtensions.mvs.loadMVS(viewer.plugin, mvsData, options);
+}
+
+// Apply a patch as created by `ipymolstar.molviewspec._diff_tree` in place
+function applyPatch(tree, ops) {
+    for (const { op, path, value } of ops) {
+        if (path.length === 0) {
+            tree = value;
+            continue;
+        }
+        let target = tree;
+        for (const key of path.slice(0, -1)) target = target[key];
+        const key = path[path.length - 1];
+        if (op === "remove") {
+            Array.isArray(target) ? target.splice(key, 1) : delete target[key];
+        } else if (op === "add" && Array.isArray(target)) {
+            target.splice(key, 0, value);
+        } else {
+            target[key] = value;
+        }
+    }
+    return tree;
+}
+
+function sameParams(a, b) {
+    try {
+        return JSON.stringify(a) === JSON.stringify(b);
+    } catch {
+        return false;
+    }
+}
+
+// Nodes which position the camera; when these are unchanged an update keeps
+// the current view
+function cameraNodes(node, out = []) {
+    if (node.kind === "camera" || node.kind === "focus") out.push(node);
+    for (const child of node.children ?? []) cameraNodes(child, out);
+    return out;
+}
+
+// State builder for loadMVS which reconciles with the current state instead
+// of deleting and recreating it. The MVS loader derives state refs from the
+// parent ref and transformer, so an unchanged node gets the same ref as in the
+// previous load: such transforms are kept, updated when their params changed,
+// and only transforms which are no longer in the tree are deleted.
+function reconcilingBuilder(state) {
+    const builder = state.build();
+    const reused = new Set();
+    const added = new Set();
+    const current = (ref) => builder.currentTree.transforms.get(ref);
+
+    const wrap = (node) => Object.assign(Object.create(node), {
+        apply(transformer, params, options) {
+            const ref = options?.ref;
+            const existing = ref && current(ref);
+            if (existing && existing.transformer === transformer) {
+                reused.add(ref);
+                const next = builder.to(ref);
+                if (!sameParams(existing.params, params)) next.update(params);
+                return wrap(next);
+            }
+            const next = node.apply(transformer, params, options);
+            added.add(next.ref);
+            return wrap(next);
+        },
+        tag(tags) {
+            const tagged = current(node.ref).tags ?? [];
+            if (!tags.every(tag => tagged.includes(tag))) node.tag(tags);
+            return this;
+        },
+        dependsOn(refs) {
+            if (!sameParams(current(node.ref).dependsOn ?? [], refs)) node.dependsOn(refs);
+            return this;
+        },
+    });
+
+    const prune = (ref) => {
+        const children = [];
+        builder.currentTree.children.get(ref).forEach(child => children.push(child));
+        for (const child of children) {
+            if (reused.has(child)) prune(child);
+            else if (!added.has(child)) builder.delete(child);
+        }
+    };
+
+    return Object.assign(Object.create(builder), {
+        to: (selector) => wrap(builder.to(selector)),
+        // the loader clears the state first, deletions are done on commit
+        delete() {
+            return this;
+        },
+        commit(options) {
+            prune(builder.currentTree.root.ref);
+            return builder.commit(options);
+        },
+    });
+}
+
+async function patchFromMSVJ(viewer, previous, msvj, options) {
+    const mvsData = PluginExtensions.mvs.MVSData.fromMVSJ(msvj);
+    const plugin = viewer.plugin;
+    const keepCamera = options.keepCamera || sameParams(
+        cameraNodes(previous.root), cameraNodes(mvsData.root)
+    );
+    plugin.build = () => reconcilingBuilder(plugin.state.data);
+    try {
+        await PluginExtensions.mvs.loadMVS(plugin, mvsData, { ...options, keepCamera });
+    } finally {
+        delete plugin.build;
+    }
+}
+
+// MVS camera positions are given for a view where the target region fills the
+// field of view; scaled as in the Mol* MVS loader for the current projection.
+function fovFactor(camera) {
+    const { mode, fov } = camera.state;
+    return mode === "orthographic" ? 1 / (2 * Math.tan(fov / 2)) : 1 / (2 * Math.sin(fov / 2));
+}
+
+function toSnapshot(camera, { target, position, up }) {
+    const factor = fovFactor(camera);
+    const dir = target.map((x, i) => position[i] - x);
+    const length2 = dir.reduce((sum, x) => sum + x * x, 0);
+    const dot = dir.reduce((sum, x, i) => sum + x * up[i], 0);
+    const radius = Math.sqrt(length2) / 2;
+    // up, made orthogonal to the view direction
+    const ortho = up.map((x, i) => x - dir[i] * dot / length2);
+    const norm = Math.hypot(...ortho);
+    return {
+        target: [...target],
+        position: target.map((x, i) => x + dir[i] * factor),
+        up: ortho.map(x => x / norm),
+        radius,
+        radiusMax: radius,
+    };
+}
+
+function fromSnapshot(camera) {
+    const { target, position, up } = camera.state;
+    const factor = fovFactor(camera);
+    const round = (x) => Math.round(x * 1000) / 1000;
+    return {
+        target: Array.from(target, round),
+        position: Array.from(target, (x, i) => round(x + (position[i] - x) / factor)),
+        up: Array.from(up, round),
+    };
+}
+
+// Fixed-size ring buffer of streamed snapshots, indexed by frame number
+class FrameBuffer {
+    constructor(size) {
+        this.frames = new Array(size);
+        this.head = 0;  // next frame to play
+        this.tail = 0;  // next frame to receive
+        this.ended = false;
+        this.waiter = null;
+    }
+
+    push(start, frames) {
+        frames.forEach((frame, i) => {
+            // the producer only sends frames for free slots
+            this.frames[(start + i) % this.frames.length] = frame;
+        });
+        this.tail = start + frames.length;
+        this.wake();
+    }
+
+    end() {
+        this.ended = true;
+        this.wake();
+    }
+
+    wake() {
+        this.waiter?.();
+        this.waiter = null;
+    }
+
+    // Next frame, waits for frames to arrive; null when the stream ended
+    async shift() {
+        while (this.head === this.tail) {
+            if (this.ended) return null;
+            await new Promise(resolve => this.waiter = resolve);
+        }
+        const slot = this.head++ % this.frames.length;
+        const frame = this.frames[slot];
+        this.frames[slot] = undefined;
+        return frame;
+    }
+}
+
+// Single-state MVS document for a streamed snapshot
+function snapshotDocument(frame) {
+    if (frame.kind === "single") return frame;
+    return {
+        kind: "single",
+        root: frame.root,
+        metadata: { version: "1", timestamp: new Date().toISOString(), title: frame.metadata?.title },
+    };
+}
+
+// Compressed payloads are sent as {compression, data}
+function decompress(data, compression) {
+    const blob = new Blob([data]);
+    if (!compression) return blob;
+    const stream = blob.stream().pipeThrough(new DecompressionStream(compression));
+    return new Response(stream).blob();
+}
+
+async function readMsvj(value) {
+    if (typeof value === "string") return value;
+    return (await decompress(value.data, value.compression)).text();
+}
+
+// Register assets with the plugin's asset manager under `base`, as Mol* does
+// for the files of MVSX archives, such that downloads of their URLs are
+// served from memory
+async function registerAssets(plugin, assets, base) {
+    return Promise.all(Object.entries(assets).map(async ([name, { data, compression }]) => {
+        const url = new URL(name, base).href;
+        const asset = { kind: "url", id: url, url };
+        const file = new File([await decompress(data, compression)], name.split("/").pop());
+        plugin.managers.asset.set(asset, file);
+        return asset;
+    }));
+}
+
+function parseTree(msvj) {
+    try {
+        return JSON.parse(msvj);
+    } catch {
+        return null;
+    }
+}
+
+// Patched documents by patch message: each patch is applied once (as a
+// promise of the patched document) and shared by all views of a model. The
+// result is stored on the model so that views created later start from the
+// current document.
+const patched = new WeakMap();
+// Last patch of each model: the msvj_data it applies to and the promise of
+// its document. Decompressing a base document is async, so patches are
+// chained such that a patch arriving while the previous one is still being
+// applied applies to its result rather than to the stale base.
+const lastPatch = new WeakMap();
+
+function patchDocument(model, msg) {
+    if (patched.has(msg)) return patched.get(msg);
+    const value = model.get("msvj_data");
+    const read = () => readMsvj(value).then(msvj => JSON.parse(msvj));
+    // msvj_data is unchanged since the last patch, or is its result, unless
+    // python sent a full document in the meantime
+    let previous = lastPatch.get(model);
+    if (previous && value !== previous.value && value !== previous.msvj) previous = null;
+    const base = previous
+        ? previous.document.then(({ tree }) => structuredClone(tree), read)
+        : read();
+    const entry = { value, msvj: null };
+    entry.document = base.then(tree => {
+        tree = applyPatch(tree, msg.ops);
+        const msvj = JSON.stringify(tree);
+        entry.msvj = msvj;
+        const current = model.get("msvj_data");
+        if (current === value || (previous && current === previous.msvj)) {
+            model.set("msvj_data", msvj);
+        }
+        return { tree, msvj };
+    });
+    lastPatch.set(model, entry);
+    patched.set(msg, entry.document);
+    return entry.document;
 }
 
 function render({ model, el }) {
@@ -21,40 +293,243 @@ function render({ model, el }) {
     viewerContainer.style.boxSizing = "border-box";
 
     let viewer = null;
+    const pooled = new PooledViewer(viewerContainer);
+    contextPool.resize(model.get("context_pool_size"));
+    // MVSJ document shown by (or queued for) this view and its parsed tree
+    let shown = null;
+    let shownTree = null;
+    let loading = Promise.resolve();
+
+    // Loads are chained so that state updates never overlap
+    function load(msvj, tree = null) {
+        const previous = shownTree;
+        shown = msvj;
+        shownTree = tree ?? parseTree(msvj);
+        const options = model.get('mvs_load_options');
+        // multi-state documents are loaded as snapshots and always in full
+        const incremental = previous?.root && tree?.root && options.replaceExisting;
+        pooled.use();
+        loading = loading.then(async () => {
+            // relative URLs resolve to the assets
+            const assets = await assetsReady;
+            const loadOptions = assets ? { ...options, sourceUrl: `${assets.base}index.mvsj` } : options;
+            return incremental
+                ? patchFromMSVJ(viewer, previous, msvj, loadOptions)
+                : updateFromMSVJ(viewer, msvj, loadOptions);
+        }).catch(err => console.error(err));
+    }
+
+    // Assets currently registered and their base URL
+    let assetsReady = Promise.resolve(null);
+    let assetsVersion = 0;
 
-    const ViewerOptions = model.get("viewer_options");
+    function updateAssets() {
+        const assets = model.get("assets");
+        const previous = assetsReady;
+        assetsReady = (async () => {
+            const manager = viewer.plugin.managers.asset;
+            (await previous)?.assets.forEach(asset => manager.delete(asset));
+            if (!assets || Object.keys(assets).length === 0) return null;
+            const base = `arcp://ipymolstar-${uniqueId}-${assetsVersion++}/`;
+            return { base, assets: await registerAssets(viewer.plugin, assets, base) };
+        })().catch(err => {
+            console.error(err);
+            return null;
+        });
+    }
 
-    // Initialize the viewer first
-    Viewer.create(viewerContainer, ViewerOptions).then(v => {
+    // Stream currently played by this view
+    let stream = null;
+
+    async function play(id, buffer, { chunk_size, fps }) {
+        let acked = 0;
+        while (stream?.id === id) {
+            const frame = await buffer.shift();
+            if (frame === null || stream?.id !== id) break;
+            const started = performance.now();
+            const doc = snapshotDocument(frame);
+            load(JSON.stringify(doc), doc);
+            await loading;
+            const linger = fps ? 1000 / fps : frame.metadata?.linger_duration_ms ?? 0;
+            const remaining = linger - (performance.now() - started);
+            await new Promise(resolve => remaining > 0
+                ? setTimeout(resolve, remaining)
+                : requestAnimationFrame(resolve));
+            if (buffer.head - acked >= chunk_size || buffer.head === buffer.tail) {
+                acked = buffer.head;
+                model.send({ type: "stream_ack", stream: id, played: acked });
+            }
+        }
+    }
+
+    const streamMessages = {
+        stream_start: (msg) => {
+            const buffer = new FrameBuffer(msg.buffer_size);
+            stream = { id: msg.stream, buffer };
+            if (viewer) play(msg.stream, buffer, msg);
+            else stream.pending = msg;
+        },
+        stream_frames: (msg) => stream?.buffer.push(msg.start, msg.frames),
+        stream_end: () => stream?.buffer.end(),
+        stream_stop: () => {
+            stream?.buffer.end();
+            stream = null;
+        },
+    };
+
+    // Camera value last reported by this view, and the time until which camera
+    // changes are not reported as they come from a camera set from python.
+    let reported = null;
+    let quietUntil = 0;
+    let reportTimer = null;
+    let lastReport = 0;
+
+    function applyCamera() {
+        const value = model.get("camera");
+        const canvas3d = viewer?.plugin.canvas3d;
+        if (!canvas3d || !value || value === reported) return;
+        pooled.use();
+        const durationMs = value.transition_duration_ms ?? 0;
+        quietUntil = performance.now() + durationMs + 100;
+        canvas3d.requestCameraReset({ durationMs, snapshot: toSnapshot(canvas3d.camera, value) });
+    }
+
+    function reportCamera() {
+        reportTimer = null;
+        if (performance.now() < quietUntil) return;
+        lastReport = performance.now();
+        reported = fromSnapshot(viewer.plugin.canvas3d.camera);
+        model.set("camera", reported);
+        model.save_changes();
+    }
+
+    // Trailing-edge throttle to at most `camera_rate` reports per second
+    function scheduleCameraReport() {
+        const rate = model.get("camera_rate");
+        if (!rate || reportTimer !== null || performance.now() < quietUntil) return;
+        const wait = Math.max(0, lastReport + 1000 / rate - performance.now());
+        reportTimer = setTimeout(reportCamera, wait);
+    }
+
+    async function loadModel() {
+        const value = model.get("msvj_data");
+        const msvj = await readMsvj(value);
+        // skip values replaced while decompressing
+        if (model.get("msvj_data") !== value) return;
+        if (msvj && msvj.trim() !== "" && msvj !== shown) load(msvj);
+    }
+
+    // The viewer is created and the data loaded once the container is first
+    // visible, so that viewers below the fold or in hidden tabs cost nothing
+    let starting = null;
+    let disposed = false;
+    let cameraSubscription = null;
+
+    function start() {
+        starting ??= Viewer.create(viewerContainer, model.get("viewer_options")).then(v => init(v));
+        return starting;
+    }
+
+    async function init(v) {
+        if (disposed) {
+            v.plugin.dispose();
+            return;
+        }
         viewer = v;
+        pooled.attach(v.plugin);
+        updateAssets();
         // If we have an initial schema, load it
-        const msvj = model.get("msvj_data");
-        if (msvj && msvj.trim() !== "") {
-            const options = model.get('mvs_load_options')
-            updateFromMSVJ(viewer, msvj, options)
-        };
-
-    });
+        await loadModel();
+        if (stream?.pending) play(stream.id, stream.buffer, stream.pending);
+        loading.then(() => {
+            if (disposed) return;
+            applyCamera();
+            cameraSubscription = viewer.plugin.canvas3d?.camera.stateChanged.subscribe(scheduleCameraReport);
+        });
+    }
 
     el.appendChild(viewerContainer);
+    const unsyncLiveContexts = syncLiveContexts(model);
+    const unsyncRenderState = syncRenderState(model, pooled);
 
-    model.on("change:msvj_data", () => {
-        console.log("Schema changed");
-        const msvj = model.get("msvj_data");
-        if (msvj && msvj.trim() !== "") {
-            const options = model.get('mvs_load_options')
-            updateFromMSVJ(viewer, msvj, options)
-        };
+    // Start when first visible and only render while visible
+    const unobserve = observeVisibility(viewerContainer, visible => {
+        if (visible) start();
+        pooled.setVisible(visible);
     });
 
-    // Watch for changes to dimensions
-    model.on("change:height", () => {
-        viewerContainer.style.height = model.get("height");
+    // Screenshots of the current or of other states, see screenshot.js
+    const screenshots = new ScreenshotQueue(model, pooled, {
+        ready: async () => {
+            await start();
+            return viewer.plugin;
+        },
+        settle: () => loading,
+        prepare: (request) => readMsvj(request.msvj),
+        show: (msvj) => {
+            load(msvj);
+            return loading;
+        },
+        restore: async () => {
+            shown = shownTree = null;
+            await loadModel();
+            await loading;
+        },
     });
 
-    model.on("change:width", () => {
-        viewerContainer.style.width = model.get("width");
-    });
+    const callbacks = {
+        // Asset URLs change with the assets, requiring a full reload
+        "change:assets": () => {
+            if (!viewer) return;
+            updateAssets();
+            shown = shownTree = null;
+            queueMicrotask(loadModel);
+        },
+        // Deferred, such that a patch which updates msvj_data is applied by all
+        // views before they compare it to what they show
+        "change:msvj_data": () => queueMicrotask(() => viewer && loadModel()),
+        "msg:custom": async (msg, buffers) => {
+            if (msg.type === "screenshot") {
+                screenshots.push(msg, buffers);
+                return;
+            }
+            if (msg.type === "screenshot_end") {
+                screenshots.end();
+                return;
+            }
+            if (msg.stream) {
+                // ignore messages for streams replaced in the meantime
+                if (msg.type === "stream_start" || msg.stream === stream?.id) streamMessages[msg.type](msg);
+                return;
+            }
+            if (msg.type !== "patch") return;
+            const { tree, msvj } = await patchDocument(model, msg);
+            if (viewer && shown !== msvj) load(msvj, structuredClone(tree));
+        },
+        "change:camera": applyCamera,
+        "change:context_pool_size": () => contextPool.resize(model.get("context_pool_size")),
+        // Watch for changes to dimensions
+        "change:height": () => {
+            viewerContainer.style.height = model.get("height");
+        },
+        "change:width": () => {
+            viewerContainer.style.width = model.get("width");
+        },
+    };
+    Object.entries(callbacks).forEach(([name, callback]) => model.on(name, callback));
+
+    return () => {
+        disposed = true;
+        Object.entries(callbacks).forEach(([name, callback]) => model.off(name, callback));
+        cameraSubscription?.unsubscribe();
+        clearTimeout(reportTimer);
+        unobserve();
+        unsyncLiveContexts();
+        unsyncRenderState();
+        pooled.dispose();
+        viewer?.plugin.dispose();
+        viewer = null;
+    };
 }
 
 export default { render };
@@ -0,0 +1,749 @@
+import { PDBeMolstarPlugin } from "pdbe-molstar/lib/viewer";
+import {
+  PooledViewer,
+  contextPool,
+  syncLiveContexts,
+  syncRenderState,
+} from "./context_pool.js";
+import { observeVisibility } from "./visibility.js";
+import { toRgb } from "./colors.js";
+import { putBuffers, toTypedArray } from "./buffers.js";
+import { ScreenshotQueue } from "./screenshot.js";
+import { TrajectoryPlayer } from "./trajectory.js";
+
+// time-to-first-frame marks, see benchmarks/time_to_first_frame.py
+performance.mark("ipymolstar:module");
+
+// Group columnar residue data into runs of consecutive residues of the same
+// chain for which `same(i, j)` holds. Payloads with `residue_end` are already
+// merged into ranges in python.
+function residueRuns(payload, same) {
+  const residues = toTypedArray(payload.residue_number, Int32Array);
+  const ends = payload.residue_end ? toTypedArray(payload.residue_end, Int32Array) : null;
+  const chains = payload.chain_index ? toTypedArray(payload.chain_index, Uint16Array) : null;
+
+  const runs = [];
+  let last = null;
+  for (let i = 0; i < residues.length; i++) {
+    const chain = chains ? payload.chain_table[chains[i]] : undefined;
+    if (ends) {
+      runs.push({ chain: chain, start: residues[i], end: ends[i], index: i });
+      continue;
+    }
+    if (
+      same &&
+      last &&
+      last.chain === chain &&
+      last.end + 1 === residues[i] &&
+      same(last.index, i)
+    ) {
+      last.end = residues[i];
+      continue;
+    }
+    last = { chain: chain, start: residues[i], end: residues[i], index: i };
+    runs.push(last);
+  }
+  return runs;
+}
+
+function runQuery(payload, run) {
+  const prefix = payload.auth ? "auth_" : "";
+  const query = {
+    [`start_${prefix}residue_number`]: run.start,
+    [`end_${prefix}residue_number`]: run.end,
+  };
+  if (run.chain !== undefined) {
+    query[payload.auth ? "auth_asym_id" : "struct_asym_id"] = run.chain;
+  }
+  return query;
+}
+
+// Expand columnar residue colors into `select` query params, merging runs of
+// consecutive residues with the same chain and color into a single range.
+function expandResidueColors(payload) {
+  const colors = toTypedArray(payload.color, Uint8Array);
+  const same = (i, j) =>
+    colors[3 * i] === colors[3 * j] &&
+    colors[3 * i + 1] === colors[3 * j + 1] &&
+    colors[3 * i + 2] === colors[3 * j + 2];
+
+  return residueRuns(payload, same).map((run) => {
+    const [r, g, b] = colors.subarray(3 * run.index, 3 * run.index + 3);
+    return { ...runQuery(payload, run), color: { r: r, g: g, b: b } };
+  });
+}
+
+// Expand columnar tooltips, stored as indices into a table of unique strings,
+// into `tooltips` query params.
+function expandResidueTooltips(payload) {
+  const index = toTypedArray(payload.tooltip_index, Uint32Array);
+
+  return residueRuns(payload, null).map((run) => ({
+    ...runQuery(payload, run),
+    tooltip: payload.tooltip_table[index[run.index]],
+  }));
+}
+
+function getHideStructure(model) {
+  var hideStructure = [];
+
+  if (model.get("hide_polymer")) {
+    hideStructure.push("polymer");
+  }
+  if (model.get("hide_water")) {
+    hideStructure.push("water");
+  }
+  if (model.get("hide_heteroatoms")) {
+    hideStructure.push("het");
+  }
+  if (model.get("hide_carbs")) {
+    hideStructure.push("carbs");
+  }
+  if (model.get("hide_non_standard")) {
+    hideStructure.push("nonStandard");
+  }
+  if (model.get("hide_coarse")) {
+    hideStructure.push("coarse");
+  }
+
+  return hideStructure;
+}
+
+function getVisibility(model) {
+  var visibility = {
+    polymer: !model.get("hide_polymer"),
+    het: !model.get("hide_heteroatoms"),
+    water: !model.get("hide_water"),
+    carbs: !model.get("hide_carbs"),
+    // maps ?
+  };
+
+  return visibility;
+}
+
+function getHideCanvasControls(model) {
+  var hideCanvasControls = [];
+  if (model.get("hide_controls_icon")) {
+    hideCanvasControls.push("controlToggle");
+  }
+  if (model.get("hide_expand_icon")) {
+    hideCanvasControls.push("expand");
+  }
+  if (model.get("hide_settings_icon")) {
+    hideCanvasControls.push("controlInfo");
+  }
+  if (model.get("hide_selection_icon")) {
+    hideCanvasControls.push("selection");
+  }
+  if (model.get("hide_animation_icon")) {
+    hideCanvasControls.push("animation");
+  }
+
+  return hideCanvasControls;
+}
+
+// Page-level LRU cache of downloaded structure data, shared by all widget
+// instances. Entries hold a blob URL pdbe-molstar loads from and are keyed by
+// content hash (custom_data) or by the model-server request (molecule_id).
+class StructureCache {
+  constructor(budget) {
+    this.budget = budget;
+    this.size = 0;
+    this.entries = new Map();
+    this.pending = new Map();
+    this.urls = new Set();
+  }
+
+  get(key) {
+    const entry = this.entries.get(key);
+    if (entry) {
+      // re-insert so that map iteration order is least recently used first
+      this.entries.delete(key);
+      this.entries.set(key, entry);
+    }
+    return entry;
+  }
+
+  set(key, blob) {
+    const existing = this.get(key);
+    if (existing) {
+      return existing;
+    }
+    if (blob.size > this.budget) {
+      return null;
+    }
+    const entry = { url: URL.createObjectURL(blob), size: blob.size };
+    this.entries.set(key, entry);
+    this.urls.add(entry.url);
+    this.size += entry.size;
+    this.evict();
+    return entry;
+  }
+
+  // deduplicates concurrent requests for the same key across widgets
+  async fetch(key, load) {
+    const entry = this.get(key);
+    if (entry) {
+      return entry;
+    }
+    if (!this.pending.has(key)) {
+      const request = load()
+        .then((blob) => this.set(key, blob))
+        .finally(() => this.pending.delete(key));
+      this.pending.set(key, request);
+    }
+    return this.pending.get(key);
+  }
+
+  evict() {
+    for (const [key, entry] of this.entries) {
+      if (this.size <= this.budget) {
+        break;
+      }
+      this.entries.delete(key);
+      this.urls.delete(entry.url);
+      this.size -= entry.size;
+      URL.revokeObjectURL(entry.url);
+    }
+  }
+}
+
+globalThis.__ipymolstarStructureCache ??= new StructureCache(0);
+const structureCache = globalThis.__ipymolstarStructureCache;
+
+async function contentHash(data) {
+  const digest = await crypto.subtle.digest("SHA-256", data);
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+// url pdbe-molstar requests for a plain `moleculeId` load; other load modes
+// build their own requests and are not cached
+function getModelServerUrl(model, moleculeId) {
+  if (
+    model.get("ligand_view") ||
+    model.get("superposition") ||
+    model.get("alphafold_view") ||
+    model.get("low_precision_coords")
+  ) {
+    return null;
+  }
+  const encoding = model.get("encoding");
+  return `${model.get("pdbe_url")}model-server/v1/${moleculeId.toLowerCase()}/full?encoding=${encoding}`;
+}
+
+// custom_data above the compression threshold (or read from .gz files) is sent
+// compressed with a `compression` key ("gzip" or "deflate")
+function decompress(data, compression) {
+  const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream(compression));
+  return new Response(stream).blob();
+}
+
+async function getCustomData(model, source) {
+  var customData = source.custom_data;
+  const cacheEnabled = structureCache.budget > 0;
+
+  if (customData && 'data' in customData) {
+    // binary comm buffers arrive as DataView; wrap without copying and
+    // leave the model's value untouched so later updates can reuse it
+    const { data, compression, ...rest } = customData;
+    const blob = async () => (compression ? decompress(data, compression) : new Blob([data]));
+    let entry = null;
+    if (cacheEnabled && globalThis.crypto && crypto.subtle) {
+      const key = `sha256:${await contentHash(data)}`;
+      entry = await structureCache.fetch(key, blob);
+    }
+    const url = entry ? entry.url : URL.createObjectURL(await blob());
+    return { ...rest, url: url };
+  }
+
+  const url =
+    !customData && source.molecule_id && cacheEnabled && getModelServerUrl(model, source.molecule_id);
+  if (url) {
+    try {
+      const entry = await structureCache.fetch(url, async () => {
+        const response = await fetch(url);
+        if (!response.ok) {
+          throw new Error(`${response.status} ${response.statusText}`);
+        }
+        return response.blob();
+      });
+      if (entry) {
+        return { url: entry.url, format: "mmcif", binary: model.get("encoding") === "bcif" };
+      }
+    } catch (error) {
+      // let pdbe-molstar request the entry itself
+      console.warn(`ipymolstar: caching ${url} failed:`, error);
+    }
+  }
+
+  return customData;
+}
+
+function revokeCustomData(options) {
+  const url = options && options.customData && options.customData.url;
+  if (url && url.startsWith("blob:") && !structureCache.urls.has(url)) {
+    URL.revokeObjectURL(url);
+  }
+}
+
+const EmptyFocusBindings = {
+  clickCenterFocus: { triggers: [], action: '', description: '' },
+  clickCenterFocusSelectMode: { triggers: [], action: '', description: '' },
+  clickResetCameraOnEmpty: { triggers: [], action: '', description: '' },
+  clickResetCameraOnEmptySelectMode: { triggers: [], action: '', description: '' }
+};
+
+
+// `source` overrides the model's molecule_id and custom_data, e.g. for
+// screenshots of other structures
+async function getOptions(model, source = null) {
+  source = source || { molecule_id: model.get("molecule_id"), custom_data: model.get("custom_data") };
+  var options = {
+    moleculeId: source.molecule_id || "",
+    customData: await getCustomData(model, source),
+    assemblyId: model.get("assembly_id"),
+    defaultPreset: model.get("default_preset"),
+    ligandView: model.get("ligand_view"),
+    alphafoldView: model.get("alphafold_view"),
+    superposition: model.get("superposition"),
+    superpositionParams: model.get("superposition_params"),
+    visualStyle: model.get("visual_style"),
+    loadMaps: model.get("load_maps"),
+    bgColor: toRgb(model.get("bg_color")),
+    selectColor: toRgb(model.get("select_color")),
+    lighting: model.get("lighting"),
+    validationAnnotation: model.get("validation_annotation"),
+    symmetryAnnotation: model.get("symmetry_annotation"),
+    pdbeUrl: model.get("pdbe_url"),
+    encoding: model.get("encoding"),
+    lowPrecisionCoords: model.get("low_precision_coords"),
+    selectInteraction: model.get("select_interaction"),
+    // selectBindings: EmptySelectBindings,
+    granularity: model.get("granularity"),
+    subscribeEvents: model.get("subscribe_events"),
+    hideControls: model.get("hide_controls"),
+    hideCanvasControls: getHideCanvasControls(model),
+    sequencePanel: model.get("sequence_panel"),
+    pdbeLink: model.get("pdbe_link"),
+    loadingOverlay: model.get("loading_overlay"),
+    expanded: model.get("expanded"),
+    landscape: model.get("landscape"),
+    reactive: model.get("reactive"),
+  };
+
+  if (model.get('click_focus') == false) {
+      options.focusBindings = EmptyFocusBindings;
+  }
+
+  return options;
+}
+
+// identifies the residue (or other loci) an event refers to
+function eventKey(eventData) {
+  return JSON.stringify([
+    eventData.entry_id,
+    eventData.entity_id,
+    eventData.chain_id,
+    eventData.auth_chain_id,
+    eventData.residueNumber,
+    eventData.authResidueNumber,
+    eventData.authInsCode,
+    eventData.seq_id,
+    eventData.label_atom_id,
+  ]);
+}
+
+// Rate limits mouseover events sent to python to `mouseover_rate` Hz with
+// trailing-edge delivery, and drops consecutive events for the same loci.
+// The number of dropped events is sent along with the next delivered event.
+class MouseoverThrottle {
+  constructor(model) {
+    this.model = model;
+    this.lastKey = null;
+    this.lastSent = -Infinity;
+    this.pending = null;
+    this.timer = null;
+    this.dropped = 0;
+  }
+
+  push(eventData) {
+    const key = eventKey(eventData);
+    if (key === this.lastKey) {
+      this.dropped++;
+      return;
+    }
+    this.lastKey = key;
+
+    const rate = this.model.get("mouseover_rate");
+    const wait = rate > 0 ? this.lastSent + 1000 / rate - performance.now() : 0;
+    if (wait <= 0 && this.timer === null) {
+      this.send(eventData);
+      return;
+    }
+    if (this.pending !== null) {
+      this.dropped++;
+    }
+    this.pending = eventData;
+    if (this.timer === null) {
+      this.timer = setTimeout(() => {
+        this.timer = null;
+        const pending = this.pending;
+        this.pending = null;
+        this.send(pending);
+      }, wait);
+    }
+  }
+
+  send(eventData) {
+    this.lastSent = performance.now();
+    this.model.set("mouseover_event", eventData);
+    if (this.dropped > 0) {
+      this.model.set("mouseover_dropped", this.model.get("mouseover_dropped") + this.dropped);
+      this.dropped = 0;
+    }
+    this.model.save_changes();
+  }
+
+  // forget the last loci and cancel pending delivery, e.g. on mouseout
+  reset() {
+    if (this.timer !== null) {
+      clearTimeout(this.timer);
+      this.timer = null;
+      this.pending = null;
+      this.dropped++;
+    }
+    this.lastKey = null;
+  }
+}
+
+function subscribe(model, name, callback) {
+  model.on(name, callback);
+  return () => model.off(name, callback);
+}
+
+async function render({ model, el }) {
+  let viewerContainer = document.createElement("div");
+  viewerContainer.id = "viewer_container";
+
+  viewerContainer.style.height = model.get("height");
+  viewerContainer.style.width = model.get("width");
+
+  // Make the container responsive
+  viewerContainer.style.maxWidth = "100%";
+  viewerContainer.style.boxSizing = "border-box";
+
+  structureCache.budget = model.get("structure_cache_size");
+  structureCache.evict();
+  contextPool.resize(model.get("context_pool_size"));
+
+  var viewerInstance = new PDBeMolstarPlugin();
+  const pooled = new PooledViewer(viewerContainer);
+  let currentOptions = null;
+  el.appendChild(viewerContainer);
+  const unsyncLiveContexts = syncLiveContexts(model);
+  const unsyncRenderState = syncRenderState(model, pooled);
+  const trajectory = new TrajectoryPlayer(model, pooled);
+
+  // resolved on the next loadComplete (with false if loading failed), when
+  // loading a structure
+  let pendingLoad = null;
+  let loadWaiters = [];
+  function expectLoad(options) {
+    if (options.moleculeId || options.customData) {
+      pendingLoad = new Promise((resolve) => loadWaiters.push(resolve));
+    }
+    return pendingLoad;
+  }
+
+  // the plugin is rendered and the structure loaded once the viewer is first
+  // visible, so that viewers below the fold or in hidden tabs cost nothing
+  let starting = null;
+  function start() {
+    starting ??= (async () => {
+      performance.mark("ipymolstar:render");
+      currentOptions = await getOptions(model);
+      expectLoad(currentOptions);
+      await viewerInstance.render(viewerContainer, currentOptions);
+      pooled.attach(viewerInstance.plugin);
+    })();
+    return starting;
+  }
+
+  let updateCount = 0;
+  async function updateViewer() {
+    if (!starting) {
+      // the options are read on start
+      return;
+    }
+    const count = ++updateCount;
+    const options = await getOptions(model);
+    await starting;
+    if (count !== updateCount) {
+      // superseded by a newer update while resolving the data
+      revokeCustomData(options);
+      return;
+    }
+    revokeCustomData(currentOptions);
+    currentOptions = options;
+    expectLoad(currentOptions);
+    viewerInstance.visual.update(currentOptions, true);
+  }
+
+  // screenshots of the current or of other structures, see screenshot.js;
+  // trajectory frames are not shown on the other structures
+  let showingOther = false;
+  const screenshots = new ScreenshotQueue(model, pooled, {
+    ready: async () => {
+      await start();
+      return viewerInstance.plugin;
+    },
+    settle: () => pendingLoad,
+    prepare: (load) => getOptions(model, load),
+    show: async (options) => {
+      showingOther = true;
+      trajectory.detach();
+      const loading = expectLoad(options);
+      viewerInstance.visual.update(options, true);
+      try {
+        if ((await loading) === false) {
+          throw new Error("loading the structure failed");
+        }
+      } finally {
+        revokeCustomData(options);
+      }
+    },
+    restore: async () => {
+      showingOther = false;
+      await updateViewer();
+      await pendingLoad;
+    },
+  });
+
+  // commands sent from python as custom messages
+  const commands = {
+    select: (data) => viewerInstance.visual.select(data),
+    select_arrays: (payload) => {
+      viewerInstance.visual.select({
+        data: expandResidueColors(payload),
+        nonSelectedColor: payload.nonSelectedColor,
+        keepColors: payload.keepColors,
+        keepRepresentations: payload.keepRepresentations,
+      });
+    },
+    tooltips_arrays: (payload) => {
+      viewerInstance.visual.tooltips({ data: expandResidueTooltips(payload) });
+    },
+    focus: (data) => viewerInstance.visual.focus(data),
+    set_color: (data) => viewerInstance.visual.setColor(data),
+    reset: (data) => viewerInstance.visual.reset(data),
+    update: (data) => viewerInstance.visual.update(data),
+    clear_highlight: () => viewerInstance.visual.clearHighlight(),
+    clear_selection: (data) => viewerInstance.visual.clearSelection(data.number),
+    clear_tooltips: () => viewerInstance.visual.clearTooltips(),
+  };
+
+  let loaded = false;
+  let lastCommandId = 0;
+  let pendingCommands = [];
+
+  function applyCommands(commandList) {
+    for (const { id, name, data } of commandList) {
+      // ids increase per widget; skip commands that were already applied
+      if (id <= lastCommandId) {
+        continue;
+      }
+      lastCommandId = id;
+      commands[name](data);
+    }
+  }
+
+  function onCustomMessage(msg, buffers) {
+    if (msg.type === "screenshot") {
+      screenshots.push(msg, buffers);
+      return;
+    }
+    if (msg.type === "screenshot_end") {
+      screenshots.end();
+      return;
+    }
+    if (msg.type === "frames") {
+      trajectory.receive(msg, buffers);
+      return;
+    }
+    if (msg.type !== "commands") {
+      return;
+    }
+    putBuffers(msg.commands, msg.buffer_paths || [], buffers || []);
+    if (!loaded) {
+      // the plugin ignores commands until the first structure is loaded
+      pendingCommands.push(...msg.commands);
+      return;
+    }
+    // apply all commands of a message within one frame so they render together
+    requestAnimationFrame(() => applyCommands(msg.commands));
+  }
+
+  // callbacks to be called after loading is complete
+  let callbacksLoadComplete = {
+    "change:spin": () => viewerInstance.visual.toggleSpin(model.get("spin")),
+    "change:hide_polymer": () => {
+      viewerInstance.visual.visibility({ polymer: !model.get("hide_polymer") });
+    },
+    "change:hide_water": () => {
+      viewerInstance.visual.visibility({ water: !model.get("hide_water") });
+    },
+    "change:hide_heteroatoms": () => {
+      viewerInstance.visual.visibility({ het: !model.get("hide_heteroatoms") });
+    },
+    "change:hide_carbs": () => {
+      viewerInstance.visual.visibility({ carbs: !model.get("hide_carbs") });
+    },
+    "change:hide_non_standard": () => {
+      viewerInstance.visual.visibility({
+        nonStandard: !model.get("hide_non_standard"),
+      });
+    },
+    "change:hide_coarse": () => {
+      viewerInstance.visual.visibility({ coarse: !model.get("hide_coarse") });
+    },
+    "change:color_data": () => {
+      const selectValue = model.get("color_data");
+      if (selectValue !== null) {
+        commands.select(selectValue);
+      }
+    },
+    "change:highlight": () => {
+      const highlightValue = model.get("highlight");
+      if (highlightValue !== null) {
+      viewerInstance.visual.highlight(highlightValue);
+      }
+    },
+    "change:highlight_color": () => {
+      const highlightColorValue = model.get("highlight_color");      
+      if (highlightColorValue !== null) {
+        viewerInstance.visual.setColor({ highlight: highlightColorValue });
+      }
+    },
+    "change:tooltips": () => {
+      const tooltipValue = model.get("tooltips");
+      if (tooltipValue !== null) {
+        viewerInstance.visual.tooltips(tooltipValue);
+      }
+    },
+  };
+
+  let otherCallbacks = {
+    "change:molecule_id": updateViewer,
+    "change:custom_data": updateViewer,
+    "change:visual_style": updateViewer,
+    "change:expanded": () => {
+      viewerInstance.canvas.toggleExpanded(model.get("expanded"));
+    },
+    "change:bg_color": () => {
+      viewerInstance.canvas.setBgColor(toRgb(model.get("bg_color")));
+    },
+    "change:frame": () => trajectory.seek(model.get("frame")),
+    "change:frame_count": () => trajectory.sync(),
+    "change:playing": () => trajectory.setPlaying(),
+    "msg:custom": onCustomMessage,
+  };
+
+  let combinedCallbacks = Object.assign(
+    {},
+    callbacksLoadComplete,
+    otherCallbacks
+  );
+
+  const loadCompleteSubscription = viewerInstance.events.loadComplete.subscribe((success) => {
+    if (!loaded) {
+      requestAnimationFrame(() => performance.mark("ipymolstar:first-frame"));
+    }
+    // trigger callabacks which need to be called after loading
+    Object.values(callbacksLoadComplete).forEach((callback) => callback());
+    loaded = true;
+    applyCommands(pendingCommands);
+    pendingCommands = [];
+    if (!showingOther) {
+      trajectory.attach(viewerInstance.plugin);
+    }
+    // colors applied before are gone; python sends the next coloring in full
+    model.send({ type: "load_complete" });
+    loadWaiters.splice(0).forEach((resolve) => resolve(success));
+  });
+
+  // settings shared by all viewers on the page
+  let pageCallbacks = {
+    "change:structure_cache_size": () => {
+      structureCache.budget = model.get("structure_cache_size");
+      structureCache.evict();
+    },
+    "change:context_pool_size": () => {
+      contextPool.resize(model.get("context_pool_size"));
+    },
+  };
+
+  // subscribe to events and collect unsubscribe funcs; updates from python
+  // restore the viewer's context if it was parked. Before the viewer is
+  // started, only commands are kept: everything else is read on start.
+  let unsubscribes = Object.entries(combinedCallbacks).map(([name, callback]) =>
+    subscribe(model, name, (...args) => {
+      if (!starting && name !== "msg:custom") {
+        return;
+      }
+      pooled.use();
+      return callback(...args);
+    })
+  );
+  Object.entries(pageCallbacks).forEach(([name, callback]) =>
+    unsubscribes.push(subscribe(model, name, callback))
+  );
+
+  // start when first visible and only render while visible
+  const unobserve = observeVisibility(viewerContainer, (visible) => {
+    if (visible) {
+      start();
+    }
+    pooled.setVisible(visible);
+  });
+
+  const mouseover = new MouseoverThrottle(model);
+
+  // pdbe-molstar dispatches its events on the plugin's target element, from
+  // where they bubble up to the document; listen on the container so that
+  // each widget only forwards events of its own viewer
+  const eventListeners = {
+    "PDB.molstar.mouseover": (e) => mouseover.push(e.eventData),
+    "PDB.molstar.mouseout": (e) => {
+      mouseover.reset();
+      model.set("mouseout_event", !model.get("mouseout_event") );
+      model.save_changes();
+    },
+    "PDB.molstar.click": (e) => {
+      model.set("click_event", e.eventData);
+      model.save_changes();
+    },
+  };
+  Object.entries(eventListeners).forEach(([name, listener]) =>
+    viewerContainer.addEventListener(name, listener)
+  );
+
+  return () => {
+    unsubscribes.forEach((unsubscribe) => unsubscribe());
+    Object.entries(eventListeners).forEach(([name, listener]) =>
+      viewerContainer.removeEventListener(name, listener)
+    );
+    mouseover.reset();
+    loadCompleteSubscription.unsubscribe();
+    unobserve();
+    unsyncLiveContexts();
+    unsyncRenderState();
+    trajectory.dispose();
+    pooled.dispose();
+    if (viewerInstance.plugin) {
+      viewerInstance.plugin.dispose();
+    }
+    revokeCustomData(currentOptions);
+  };
+}
+
+export default { render };
@@ -0,0 +1,100 @@
+import { putBuffers } from "./buffers.js";
+
+// Render the plugin's current view to PNG bytes with Mol*'s screenshot helper,
+// at `supersample` times the size and scaled down if requested
+export async function capture(plugin, pooled, { width, height, transparent, supersample }) {
+  await pooled.live();
+  const { canvas } = plugin.canvas3dContext;
+  width = width || canvas.clientWidth;
+  height = height || canvas.clientHeight;
+  if (!width || !height) {
+    throw new Error("the viewer has no size, pass width and height");
+  }
+  const scale = supersample || 1;
+  const helper = plugin.helpers.viewportScreenshot;
+  const values = helper.values;
+  helper.behaviors.values.next({
+    ...values,
+    transparent,
+    axes: { name: "off", params: {} },
+    resolution: { name: "custom", params: { width: width * scale, height: height * scale } },
+  });
+  try {
+    const uri = await helper.getImageDataUri();
+    let blob = await (await fetch(uri)).blob();
+    if (scale > 1) {
+      blob = await downscale(blob, width, height);
+    }
+    return await blob.arrayBuffer();
+  } finally {
+    helper.behaviors.values.next(values);
+    // Mol* resumes the render loop after drawing the image
+    pooled.syncLoop(true);
+  }
+}
+
+async function downscale(blob, width, height) {
+  const bitmap = await createImageBitmap(blob);
+  const canvas = document.createElement("canvas");
+  canvas.width = width;
+  canvas.height = height;
+  const context = canvas.getContext("2d");
+  context.imageSmoothingQuality = "high";
+  context.drawImage(bitmap, 0, 0, width, height);
+  bitmap.close();
+  return new Promise((resolve) => canvas.toBlob(resolve, "image/png"));
+}
+
+// Screenshot requests from python (`ipymolstar.screenshot.Screenshots`),
+// rendered one at a time in order. The data of requests which load a structure
+// or state is prepared as soon as they arrive, while earlier requests render.
+// Once python ends the batch of such requests, the viewer shows its own data
+// again; the queue may run empty in between while python awaits replies.
+//
+// The viewer provides `ready()`, resolving to the plugin once created,
+// `settle()`, resolving once loads in progress are done, and `prepare(load)`,
+// `show(prepared)` and `restore()`, each returning a promise that resolves
+// once done.
+export class ScreenshotQueue {
+  constructor(model, pooled, viewer) {
+    this.model = model;
+    this.pooled = pooled;
+    this.viewer = viewer;
+    this.queue = Promise.resolve();
+    this.dirty = false;
+  }
+
+  push(msg, buffers) {
+    if (msg.load) {
+      putBuffers(msg.load, msg.buffer_paths || [], buffers || []);
+    }
+    const ready = this.viewer.ready();
+    const prepared = msg.load ? ready.then(() => this.viewer.prepare(msg.load)) : null;
+    // rejections are reported when the request is handled
+    prepared?.catch(() => {});
+    this.queue = this.queue.then(async () => {
+      try {
+        const plugin = await ready;
+        if (prepared) {
+          this.dirty = true;
+          await this.viewer.show(await prepared);
+        } else {
+          await this.viewer.settle();
+        }
+        const png = await capture(plugin, this.pooled, msg);
+        this.model.send({ type: "screenshot", id: msg.id }, undefined, [png]);
+      } catch (error) {
+        this.model.send({ type: "screenshot", id: msg.id, error: String(error) });
+      }
+    });
+  }
+
+  end() {
+    this.queue = this.queue.then(async () => {
+      if (this.dirty) {
+        this.dirty = false;
+        await this.viewer.restore().catch((error) => console.error(error));
+      }
+    });
+  }
+}
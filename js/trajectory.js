@@ -0,0 +1,306 @@
+import { PluginStateObject as SO, PluginStateTransform } from "molstar/lib/mol-plugin-state/objects";
+import { ParamDefinition as PD } from "molstar/lib/mol-util/param-definition";
+import { Task } from "molstar/lib/mol-task";
+import { Model } from "molstar/lib/mol-model/structure";
+import { Coordinates } from "molstar/lib/mol-model/structure/coordinates";
+import { toTypedArray } from "./buffers.js";
+
+// frames requested ahead of the frame shown, and bytes of frames kept per
+// player; frames farthest ahead in playback order are dropped first
+const AHEAD = 32;
+const CACHE_BYTES = 64 * 1024 ** 2;
+
+// players on the page by id; the state tree refers to their frames by id
+const players = new Map();
+let playerIds = 0;
+
+// Trajectory of one frame: the coordinates of the frame on the topology of
+// the parent trajectory, or the parent itself if there is no such frame.
+// Inserted between the loaded trajectory and its model, such that showing
+// another frame updates the geometry of the existing structure and
+// representations instead of rebuilding them.
+let frameTransform = null;
+function FrameTransform() {
+  frameTransform ??= PluginStateTransform.BuiltIn({
+    name: "ipymolstar-trajectory-frame",
+    display: { name: "Trajectory Frame" },
+    from: SO.Molecule.Trajectory,
+    to: SO.Molecule.Trajectory,
+    params: {
+      player: PD.Text("", { isHidden: true }),
+      frame: PD.Numeric(-1, {}, { isHidden: true }),
+    },
+  })({
+    apply({ a, params }) {
+      return Task.create("Trajectory frame", async () => {
+        const frame = players.get(params.player)?.frames.get(params.frame);
+        if (!frame) {
+          return new SO.Molecule.Trajectory(a.data, { label: a.label, description: a.description });
+        }
+        const coordinates = Coordinates.create([frame], frame.time, frame.time);
+        const trajectory = Model.trajectoryFromModelAndCoordinates(a.data.representative, coordinates);
+        return new SO.Molecule.Trajectory(trajectory, {
+          label: a.label,
+          description: `Frame ${params.frame + 1}`,
+        });
+      });
+    },
+  });
+  return frameTransform;
+}
+
+// interleaved float32 xyz coordinates of `nAtoms` atoms
+function toFrame(buffer, nAtoms, index) {
+  const xyz = toTypedArray(buffer, Float32Array);
+  const x = new Float32Array(nAtoms);
+  const y = new Float32Array(nAtoms);
+  const z = new Float32Array(nAtoms);
+  for (let i = 0, j = 0; i < nAtoms; i++, j += 3) {
+    x[i] = xyz[j];
+    y[i] = xyz[j + 1];
+    z[i] = xyz[j + 2];
+  }
+  return {
+    elementCount: nAtoms,
+    time: { value: index, unit: "step" },
+    x,
+    y,
+    z,
+    xyzOrdering: { isIdentity: true },
+  };
+}
+
+// Trajectory frames sent from python (`ipymolstar.trajectory.Frames`), shown
+// on the loaded structure and played at `fps` frames per second. Frames are
+// requested for a window ahead of the frame shown once the structure is
+// loaded, and as `frame_count` grows.
+export class TrajectoryPlayer {
+  constructor(model, pooled) {
+    this.model = model;
+    this.pooled = pooled;
+    this.id = `ipymolstar-trajectory-${++playerIds}`;
+    this.frames = new Map();
+    // frames requested and not yet received
+    this.pending = new Set();
+    this.frameBytes = 0;
+    this.cacheBytes = CACHE_BYTES;
+    this.plugin = null;
+    this.ref = null;
+    // frame shown by the plugin and frame to show, -1 for the topology's own
+    // coordinates
+    this.shown = null;
+    this.target = null;
+    this.updating = null;
+    this.raf = null;
+    this.last = 0;
+    this.reported = 0;
+    this.tick = this.tick.bind(this);
+    players.set(this.id, this);
+  }
+
+  // (re)loading a structure replaces the state tree
+  attach(plugin) {
+    this.plugin = plugin;
+    this.ref = null;
+    this.shown = null;
+    this.sync();
+    this.seek(this.model.get("frame"));
+    this.setPlaying();
+  }
+
+  // the plugin shows another structure for now, e.g. for screenshots
+  detach() {
+    if (this.raf !== null) {
+      cancelAnimationFrame(this.raf);
+      this.raf = null;
+    }
+    this.plugin = null;
+    this.ref = null;
+    this.shown = null;
+  }
+
+  receive(msg, buffers) {
+    this.frameBytes = msg.n_atoms * 3 * Float32Array.BYTES_PER_ELEMENT;
+    buffers.forEach((buffer, i) => {
+      const index = msg.start + i;
+      this.frames.set(index, toFrame(buffer, msg.n_atoms, index));
+      this.pending.delete(index);
+    });
+    this.evict();
+    this.update();
+  }
+
+  // drop frames beyond `frame_count`
+  sync() {
+    const count = this.model.get("frame_count");
+    for (const index of [...this.frames.keys(), ...this.pending]) {
+      if (index >= count) {
+        this.frames.delete(index);
+        this.pending.delete(index);
+      }
+    }
+    if (count === 0) {
+      this.seek(-1);
+    } else if (this.target !== null) {
+      this.request(Math.max(this.target, 0));
+    }
+  }
+
+  seek(frame) {
+    const count = this.model.get("frame_count");
+    this.target = count > 0 ? Math.min(Math.max(frame, 0), count - 1) : -1;
+    if (this.target >= 0) {
+      this.request(this.target);
+    }
+    this.update();
+  }
+
+  // request the frames of the window from `start` which are neither received
+  // nor requested, once half the window or the frame at `start` is missing
+  request(start) {
+    if (!this.plugin) {
+      return;
+    }
+    const count = this.model.get("frame_count");
+    const fit = this.frameBytes ? Math.floor(this.cacheBytes / this.frameBytes) : AHEAD;
+    const stop = Math.min(count, start + Math.max(1, Math.min(AHEAD, fit)));
+    const missing = [];
+    for (let index = start; index < stop; index++) {
+      if (!this.frames.has(index) && !this.pending.has(index)) {
+        missing.push(index);
+      }
+    }
+    if (missing[0] !== start && missing.length < (stop - start) / 2) {
+      return;
+    }
+    // one request per run of consecutive frames
+    let first = 0;
+    missing.forEach((index, i) => {
+      this.pending.add(index);
+      if (missing[i + 1] !== index + 1) {
+        this.model.send({ type: "get_frames", start: missing[first], stop: index + 1 });
+        first = i + 1;
+      }
+    });
+  }
+
+  // keep the frames next in playback order within the byte budget
+  evict() {
+    const count = this.model.get("frame_count");
+    if (count === 0) {
+      // frames of a count not yet synced; dropped by `sync` if cleared
+      return;
+    }
+    const excess = this.frames.size - Math.max(1, Math.floor(this.cacheBytes / this.frameBytes));
+    if (excess <= 0) {
+      return;
+    }
+    const cursor = Math.max(this.target ?? 0, 0);
+    const ahead = (index) => (index - cursor + count) % count;
+    [...this.frames.keys()]
+      .filter((index) => index !== this.target)
+      .sort((a, b) => ahead(b) - ahead(a))
+      .slice(0, excess)
+      .forEach((index) => this.frames.delete(index));
+  }
+
+  // show the target frame, skipping frames targeted while updating
+  update() {
+    if (this.updating || !this.plugin || this.target === this.shown) {
+      return;
+    }
+    this.updating = (async () => {
+      while (this.target !== null && this.target !== this.shown) {
+        const frame = this.target;
+        if (frame >= 0 && !this.frames.has(frame)) {
+          // shown once received
+          break;
+        }
+        await this.commit(frame);
+        this.shown = frame;
+      }
+    })()
+      .catch((error) => {
+        console.error(error);
+        this.target = this.shown;
+      })
+      .finally(() => {
+        this.updating = null;
+      });
+  }
+
+  async commit(frame) {
+    this.pooled.touch();
+    const transformer = FrameTransform();
+    const params = { player: this.id, frame };
+    if (this.ref && this.plugin.state.data.cells.has(this.ref)) {
+      await this.plugin.build().to(this.ref).update(params).commit();
+      return;
+    }
+    if (frame < 0) {
+      return;
+    }
+    const parent = this.plugin.managers.structure.hierarchy.current.trajectories.find(
+      (trajectory) => trajectory.cell.transform.transformer !== transformer
+    );
+    if (!parent) {
+      throw new Error("no structure loaded to show trajectory frames on");
+    }
+    const update = this.plugin.build();
+    this.ref = update.to(parent.cell.transform.ref).insert(transformer, params).ref;
+    await update.commit();
+  }
+
+  setPlaying() {
+    if (this.model.get("playing") && this.plugin) {
+      this.raf ??= requestAnimationFrame(this.tick);
+    } else if (this.raf !== null) {
+      cancelAnimationFrame(this.raf);
+      this.raf = null;
+      this.report();
+    }
+  }
+
+  // advance at `fps` while visible; at the end start over if `loop`, else
+  // wait for new frames
+  tick(now) {
+    this.raf = requestAnimationFrame(this.tick);
+    if (this.updating || this.target !== this.shown || !this.pooled.visible || document.hidden) {
+      return;
+    }
+    if (now - this.last < 1000 / this.model.get("fps")) {
+      return;
+    }
+    const count = this.model.get("frame_count");
+    let next = (this.shown ?? -1) + 1;
+    if (next >= count) {
+      if (!this.model.get("loop") || count === 0) {
+        return;
+      }
+      next = 0;
+    }
+    this.last = now;
+    this.seek(next);
+    if (now - this.reported > 250) {
+      this.reported = now;
+      this.report();
+    }
+  }
+
+  // tell python which frame is shown, at most a few times per second while playing
+  report() {
+    if (this.target >= 0 && this.model.get("frame") !== this.target) {
+      this.model.set("frame", this.target);
+      this.model.save_changes();
+    }
+  }
+
+  dispose() {
+    if (this.raf !== null) {
+      cancelAnimationFrame(this.raf);
+      this.raf = null;
+    }
+    players.delete(this.id);
+    this.plugin = null;
+  }
+}
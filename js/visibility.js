@@ -0,0 +1,31 @@
+// Page-level IntersectionObserver shared by the viewers of all ipymolstar
+// widgets. Viewers are reported visible slightly before they scroll into view,
+// such that they are ready when they get there. Elements which are not
+// displayed, e.g. in a hidden tab, are not visible.
+const MARGIN = "200px";
+
+globalThis.__ipymolstarVisibility ??= { observer: null, callbacks: new WeakMap() };
+const visibility = globalThis.__ipymolstarVisibility;
+
+function getObserver() {
+  visibility.observer ??= new IntersectionObserver(
+    (entries) => entries.forEach((entry) => visibility.callbacks.get(entry.target)?.(entry.isIntersecting)),
+    { rootMargin: MARGIN }
+  );
+  return visibility.observer;
+}
+
+// Call `callback(visible)` when `element` enters or leaves the viewport;
+// returns a function to stop observing
+export function observeVisibility(element, callback) {
+  if (typeof IntersectionObserver === "undefined") {
+    callback(true);
+    return () => {};
+  }
+  visibility.callbacks.set(element, callback);
+  getObserver().observe(element);
+  return () => {
+    visibility.observer.unobserve(element);
+    visibility.callbacks.delete(element);
+  };
+}
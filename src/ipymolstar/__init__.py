@@ -1,5 +1,30 @@
-from ipymolstar.pdbemolstar import PDBeMolstar
-from ipymolstar.molviewspec import MolViewSpec
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ipymolstar.gallery import Gallery
+    from ipymolstar.molviewspec import MolViewSpec
+    from ipymolstar.pdbemolstar import PDBeMolstar
 
 __version__ = "0.1.0"
-__all__ = ["MolViewSpec", "PDBeMolstar", "__version__"]
+__all__ = ["Gallery", "MolViewSpec", "PDBeMolstar", "__version__"]
+
+# widget classes by module, imported on first access: importing anywidget and
+# ipywidgets takes the bulk of the time to import ipymolstar otherwise
+_WIDGETS = {
+    "Gallery": "ipymolstar.gallery",
+    "MolViewSpec": "ipymolstar.molviewspec",
+    "PDBeMolstar": "ipymolstar.pdbemolstar",
+}
+
+
+def __getattr__(name: str):
+    if name not in _WIDGETS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_WIDGETS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
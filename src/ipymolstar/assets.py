@@ -0,0 +1,113 @@
+import contextlib
+import functools
+import hashlib
+import pathlib
+from typing import ClassVar, Optional
+
+import anywidget
+import traitlets
+
+STATIC = pathlib.Path(__file__).parent / "static"
+
+
+class Asset:
+    """Static file sent to the frontend at most once per page, by content hash."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+
+    @functools.cached_property
+    def content(self) -> bytes:
+        return self.path.read_bytes()
+
+    @functools.cached_property
+    def hash(self) -> str:
+        digest = hashlib.sha256(self.content).hexdigest()
+        _hashes[digest] = self
+        return digest
+
+
+_hashes: dict[str, Asset] = {}
+
+
+@functools.lru_cache(maxsize=None)
+def asset(path: pathlib.Path) -> Asset:
+    return Asset(path)
+
+
+def find_asset(digest: str) -> Optional[Asset]:
+    return _hashes.get(digest)
+
+
+# set by `inline_assets`
+_inline = False
+
+
+@contextlib.contextmanager
+def inline_assets():
+    """
+    Include the module and stylesheets in the state of widgets serialized in
+    the block, such that they render without a kernel.
+
+    Example:
+        with inline_assets():
+            embed_minimal_html("export.html", views=[viewer])
+    """
+    global _inline
+    previous, _inline = _inline, True
+    try:
+        yield
+    finally:
+        _inline = previous
+
+
+def _asset_contents_to_json(value: dict, widget) -> dict:
+    if not _inline:
+        return {}
+    return {
+        digest: find_asset(digest).content.decode()
+        for digest in (widget._module_hash, *widget._style_hashes)
+    }
+
+
+class HashedAssetWidget(anywidget.AnyWidget):
+    """
+    AnyWidget whose module and stylesheets are referenced by content hash.
+
+    Instead of the widget's ESM and CSS, every instance syncs a small loader
+    module and the SHA-256 hashes of `_module` and `_styles`. The loader keeps a
+    page-level registry of loaded hashes and requests the contents it does not
+    have from the kernel, so each file is transferred and evaluated at most
+    once per page and not stored in the state of every widget. Without a
+    kernel, as for exported widgets, the contents have to be included in the
+    state with `inline_assets`.
+    """
+
+    _esm = STATIC / "loader.js"
+
+    _module: ClassVar[pathlib.Path]
+    _styles: ClassVar[list[pathlib.Path]] = []
+
+    _module_hash = traitlets.Unicode().tag(sync=True)
+    _style_hashes = traitlets.List(traitlets.Unicode()).tag(sync=True)
+    # contents by hash, only within `inline_assets`
+    _asset_contents = traitlets.Dict().tag(sync=True, to_json=_asset_contents_to_json)
+
+    def __init__(self, styles: Optional[list[pathlib.Path]] = None, **kwargs):
+        styles = self._styles if styles is None else styles
+        super().__init__(
+            _module_hash=asset(self._module).hash,
+            _style_hashes=[asset(path).hash for path in styles],
+            **kwargs,
+        )
+        self.on_msg(self._handle_asset_request)
+
+    def _handle_asset_request(self, widget, content, buffers):
+        if content.get("type") != "ipymolstar:asset":
+            return
+        requested = find_asset(content["hash"])
+        if requested is not None:
+            self.send(
+                {"type": "ipymolstar:asset", "hash": requested.hash},
+                [requested.content],
+            )
@@ -0,0 +1,96 @@
+import gzip
+import zlib
+from typing import Any, Iterable, Literal, Optional, Union
+
+# payloads smaller than this (in bytes) are sent as is
+COMPRESSION_THRESHOLD = 64 * 1024
+
+# formats supported by the browser's `DecompressionStream`
+Compression = Literal["gzip", "deflate"]
+COMPRESSIONS = ("gzip", "deflate")
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def is_gzip(data: Any) -> bool:
+    return (
+        isinstance(data, (bytes, bytearray, memoryview))
+        and bytes(data[:2]) == GZIP_MAGIC
+    )
+
+
+def compress(
+    data: Union[str, bytes, memoryview],
+    method: Optional[Compression] = "gzip",
+    threshold: int = COMPRESSION_THRESHOLD,
+) -> tuple[Union[str, bytes, memoryview], Optional[Compression]]:
+    """
+    Compress `data` with `method` if it is larger than `threshold` bytes.
+
+    Returns the data to send and the compression the frontend has to undo, if
+    any. Data which is already gzip-compressed (e.g. read from a `.gz` file) is
+    passed through untouched.
+    """
+    if is_gzip(data):
+        return data, "gzip"
+    raw = data.encode() if isinstance(data, str) else memoryview(data)
+    if method is None or len(raw) < threshold:
+        return data, None
+    if method == "gzip":
+        return gzip.compress(raw, compresslevel=6, mtime=0), "gzip"
+    if method == "deflate":
+        return zlib.compress(raw, 6), "deflate"
+    raise ValueError(f"Unknown compression {method!r}, options are {COMPRESSIONS}")
+
+
+class CompressionCache:
+    """
+    Compressed payloads by the identity of their data, such that a payload is
+    compressed once rather than on every sync of the widget's state.
+    """
+
+    def __init__(self):
+        # id(data) -> (data, (method, threshold), result); holding `data`
+        # keeps its id from being reused
+        self._entries: dict[int, tuple] = {}
+
+    def compress(self, data, method, threshold):
+        entry = self._entries.get(id(data))
+        if entry is None or entry[1] != (method, threshold):
+            entry = (data, (method, threshold), compress(data, method, threshold))
+            self._entries[id(data)] = entry
+        return entry[2]
+
+    def retain(self, values: Iterable) -> None:
+        """Drop the payloads of data other than `values`."""
+        keep = {id(value) for value in values}
+        self._entries = {k: v for k, v in self._entries.items() if k in keep}
+
+
+def compress_custom_data(
+    custom_data: Optional[dict],
+    method,
+    threshold,
+    compress_binary: bool = False,
+    cache: Optional[CompressionCache] = None,
+) -> Optional[dict]:
+    """
+    `custom_data` with its `data` compressed, marked by a `compression` key.
+
+    Binary data is only compressed with `compress_binary`, and is otherwise
+    sent as is as a zero-copy buffer: binary formats such as BinaryCIF are
+    compact already.
+    """
+    if not custom_data or custom_data.get("data") is None:
+        return custom_data
+    data = custom_data["data"]
+    if not isinstance(data, str) and not compress_binary:
+        # still marks .gz data
+        method = None
+    if cache is not None:
+        data, compression = cache.compress(data, method, threshold)
+    else:
+        data, compression = compress(data, method, threshold)
+    if compression is None:
+        return custom_data
+    return {**custom_data, "data": data, "compression": compression}
@@ -0,0 +1,165 @@
+import asyncio
+import collections
+import logging
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Literal, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# event kind -> name of the trait / param the frontend sets
+EVENT_TRAITS = {
+    "click": "click_event",
+    "mouseover": "mouseover_event",
+    "mouseout": "mouseout_event",
+}
+
+Overflow = Literal["drop-oldest", "latest-only"]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class Event(NamedTuple):
+    kind: str
+    data: Optional[dict]
+
+
+def event_traits(kinds: Iterable[str]) -> list[str]:
+    kinds = [kinds] if isinstance(kinds, str) else list(kinds)
+    unknown = set(kinds) - set(EVENT_TRAITS)
+    if unknown:
+        raise ValueError(
+            f"Unknown event kinds {sorted(unknown)}, options are {list(EVENT_TRAITS)}"
+        )
+    return [EVENT_TRAITS[kind] for kind in kinds]
+
+
+def make_event(name: str, value: Any) -> Event:
+    kind = next(k for k, v in EVENT_TRAITS.items() if v == name)
+    # mouseout is sent as a toggled boolean without payload
+    return Event(kind, None if kind == "mouseout" else value)
+
+
+def default_executor() -> ThreadPoolExecutor:
+    """Thread pool shared by all viewers for threaded event callbacks."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(thread_name_prefix="ipymolstar-events")
+    return _executor
+
+
+def _log_exception(future):
+    if future.exception() is not None:
+        logger.error("Error in event callback", exc_info=future.exception())
+
+
+def dispatcher(
+    callback: Callable[[Event], Any], threaded: bool, executor: Optional[Executor]
+) -> Callable[[Event], None]:
+    """Wrap `callback` to run on `executor` (or the default pool) if requested."""
+    if not threaded and executor is None:
+        return callback
+
+    def dispatch(event: Event):
+        pool = executor or default_executor()
+        pool.submit(callback, event).add_done_callback(_log_exception)
+
+    return dispatch
+
+
+class EventStream:
+    """
+    Bounded stream of viewer events for use with `async for`.
+
+    Events are buffered in a queue of at most `maxsize` events. When the queue is
+    full the oldest event is dropped (`overflow="drop-oldest"`), or only the most
+    recent event is kept at all (`overflow="latest-only"`). The number of dropped
+    events is available as `dropped`.
+
+    The stream stops receiving events when closed, either with `close()` or by
+    using it as a context manager.
+    """
+
+    def __init__(
+        self,
+        unsubscribe: Callable[[], None],
+        maxsize: int = 100,
+        overflow: Overflow = "drop-oldest",
+    ):
+        if overflow not in ("drop-oldest", "latest-only"):
+            raise ValueError(f"Invalid overflow policy {overflow!r}")
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self._unsubscribe = unsubscribe
+        self._queue = collections.deque(
+            maxlen=1 if overflow == "latest-only" else maxsize
+        )
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiter: Optional[asyncio.Future] = None
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, event: Event) -> None:
+        """Add an event; safe to call from any thread."""
+        if self.closed:
+            return
+        with self._lock:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(event)
+        self._wake()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._unsubscribe()
+            self._wake()
+
+    def _wake(self):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._set_waiter()
+        else:
+            loop.call_soon_threadsafe(self._set_waiter)
+
+    def _set_waiter(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Event:
+        self._loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._queue:
+                    return self._queue.popleft()
+            if self.closed:
+                raise StopAsyncIteration
+            self._waiter = self._loop.create_future()
+            # an event may have arrived before the waiter was set
+            if self._queue or self.closed:
+                continue
+            await self._waiter
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
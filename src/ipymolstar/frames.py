@@ -0,0 +1,340 @@
+"""
+Trajectory frame sources for `PDBeMolstar.open_frames`.
+
+File sources memory-map uncompressed trajectories and read a frame in O(1)
+from its byte offset: DCD and raw float32 files have fixed-size frames, and
+multi-model PDB files are indexed by the byte offsets of their models once on
+opening. Pages of a frame are released again after it is read, so that the
+resident memory stays flat independent of the size of the file.
+"""
+
+import abc
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+PathLike = Union[str, os.PathLike]
+
+# frames read ahead of the frames sent last, see `Prefetcher`
+PREFETCH_FRAMES = 32
+
+# the kernel maps the pages around a faulting page too ("fault-around", 64 KiB
+# on Linux), so these are released along with the pages of a frame
+RELEASE_MARGIN = 64 * 1024
+
+
+class FrameSource(abc.ABC):
+    """
+    Frames of a trajectory, read on demand.
+
+    Subclasses implement `__len__` and `read`, and set `n_atoms`. Frames are
+    (n_atoms, 3) float32 coordinates in Ångström, in the atom order of the
+    structure's file.
+    """
+
+    n_atoms: Optional[int] = None
+
+    @abc.abstractmethod
+    def __len__(self) -> int: ...
+
+    @abc.abstractmethod
+    def read(self, index: int) -> np.ndarray: ...
+
+    def close(self) -> None:
+        pass
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        if not -len(self) <= index < len(self):
+            raise IndexError(f"frame {index} out of range for {len(self)} frames")
+        return self.read(index % len(self))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArrayFrames(FrameSource):
+    """Frames held in memory, as added with `PDBeMolstar.add_frames`."""
+
+    def __init__(self):
+        self._frames: list[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def append(self, coordinates) -> None:
+        """Append one (n_atoms, 3) frame or several, (n_frames, n_atoms, 3)."""
+        # copied, as simulation engines tend to update their arrays in place
+        frames = np.array(coordinates, dtype="<f4")
+        if frames.ndim == 2:
+            frames = frames[np.newaxis]
+        if frames.ndim != 3 or frames.shape[2] != 3:
+            raise ValueError(
+                "coordinates must have shape (n_atoms, 3) or (n_frames, n_atoms, 3)"
+            )
+        if self.n_atoms is not None and frames.shape[1] != self.n_atoms:
+            raise ValueError(
+                f"Frames must have {self.n_atoms} atoms like the previous frames, "
+                f"got {frames.shape[1]}"
+            )
+        self.n_atoms = frames.shape[1]
+        self._frames.extend(frames)
+
+    def read(self, index: int) -> np.ndarray:
+        return self._frames[index]
+
+
+class MappedFrames(FrameSource):
+    """Base class of frame sources reading from a memory-mapped file."""
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(f"{self.path} is empty")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _release(self, start: int, stop: int) -> None:
+        """Drop the pages of bytes `start:stop` from memory, once they are copied."""
+        if not hasattr(mmap, "MADV_DONTNEED") or self._mmap.closed:
+            return
+        start = max(0, start - RELEASE_MARGIN)
+        start -= start % mmap.PAGESIZE
+        stop = min(stop + RELEASE_MARGIN, len(self._mmap))
+        if stop > start:
+            self._mmap.madvise(mmap.MADV_DONTNEED, start, stop - start)
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+class RawFrames(MappedFrames):
+    """
+    Frames stored back to back as (n_atoms, 3) arrays of `dtype`, after `offset`
+    bytes of header. Trailing bytes of an incomplete frame are ignored.
+    """
+
+    def __init__(
+        self, path: PathLike, n_atoms: int, offset: int = 0, dtype: str = "<f4"
+    ):
+        super().__init__(path)
+        self.n_atoms = n_atoms
+        self._offset = offset
+        self._dtype = np.dtype(dtype)
+        self._frame_bytes = n_atoms * 3 * self._dtype.itemsize
+
+    def __len__(self) -> int:
+        return max(0, (len(self._mmap) - self._offset) // self._frame_bytes)
+
+    def read(self, index: int) -> np.ndarray:
+        start = self._offset + index * self._frame_bytes
+        frame = np.frombuffer(
+            self._mmap, dtype=self._dtype, count=self.n_atoms * 3, offset=start
+        )
+        frame = frame.reshape(self.n_atoms, 3).astype("<f4")
+        self._release(start, start + self._frame_bytes)
+        return frame
+
+
+class DCDFrames(MappedFrames):
+    """
+    Frames of a CHARMM/NAMD DCD file, of either byte order.
+
+    Files with fixed atoms or 64-bit record markers are not supported.
+    """
+
+    def __init__(self, path: PathLike):
+        super().__init__(path)
+        data = self._mmap
+        for endian in "<>":
+            if struct.unpack_from(f"{endian}i", data, 0)[0] == 84:
+                break
+        else:
+            raise ValueError(
+                f"{self.path} is not a DCD file with 32-bit record markers"
+            )
+        if data[4:8] != b"CORD":
+            raise ValueError(f"{self.path} is not a DCD coordinate file")
+        control = struct.unpack_from(f"{endian}20i", data, 8)
+        charmm = control[19] != 0
+        if control[8]:
+            raise ValueError("DCD files with fixed atoms are not supported")
+
+        # title and atom count records follow the header record
+        position = 92
+        title_bytes = struct.unpack_from(f"{endian}i", data, position)[0]
+        position += 4 + title_bytes + 4
+        self.n_atoms = struct.unpack_from(f"{endian}i", data, position + 4)[0]
+        position += 12
+
+        self._endian = endian
+        self._header = position
+        # per frame: an optional unit cell record (6 float64), then a record per
+        # axis (and a fourth dimension, if any)
+        self._cell_bytes = 4 + 48 + 4 if charmm and control[10] else 0
+        self._axis_bytes = 4 + 4 * self.n_atoms + 4
+        axes = 4 if charmm and control[11] else 3
+        self._frame_bytes = self._cell_bytes + axes * self._axis_bytes
+
+    def __len__(self) -> int:
+        # from the file size rather than the header, as the header of a file
+        # still being written may lag
+        return (len(self._mmap) - self._header) // self._frame_bytes
+
+    def read(self, index: int) -> np.ndarray:
+        start = self._header + index * self._frame_bytes
+        frame = np.empty((self.n_atoms, 3), dtype="<f4")
+        for axis in range(3):
+            frame[:, axis] = np.frombuffer(
+                self._mmap,
+                dtype=f"{self._endian}f4",
+                count=self.n_atoms,
+                offset=start + self._cell_bytes + axis * self._axis_bytes + 4,
+            )
+        self._release(start, start + self._frame_bytes)
+        return frame
+
+
+class PDBFrames(MappedFrames):
+    """
+    Models of a multi-model PDB file as frames.
+
+    The byte offsets of the models are found once on opening, or can be passed
+    as `index` (the `index` of an earlier `PDBFrames` of the same file): frame
+    `i` spans bytes `index[i]:index[i + 1]`. A file without MODEL records is a
+    single frame.
+    """
+
+    # bytes scanned between releasing pages while indexing
+    SCAN_BYTES = 64 * 1024**2
+
+    def __init__(self, path: PathLike, index: Optional[np.ndarray] = None):
+        super().__init__(path)
+        self.index = self._build_index() if index is None else np.asarray(index)
+        self.n_atoms = len(self.read(0))
+
+    def _build_index(self) -> np.ndarray:
+        data = self._mmap
+        offsets = [0] if data[:6] == b"MODEL " else []
+        released = 0
+        position = data.find(b"\nMODEL ")
+        while position != -1:
+            offsets.append(position + 1)
+            if position - released > self.SCAN_BYTES:
+                self._release(released, position)
+                released = position
+            position = data.find(b"\nMODEL ", position + 1)
+        self._release(released, len(data))
+        if not offsets:
+            offsets = [0]
+        return np.array(offsets + [len(data)], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.index) - 1
+
+    def read(self, index: int) -> np.ndarray:
+        start, stop = int(self.index[index]), int(self.index[index + 1])
+        lines = self._mmap[start:stop].split(b"\n")
+        self._release(start, stop)
+        frame = np.array(
+            [
+                (line[30:38], line[38:46], line[46:54])
+                for line in lines
+                if line.startswith((b"ATOM", b"HETATM"))
+            ],
+            dtype="<f4",
+        ).reshape(-1, 3)
+        if self.n_atoms is not None and len(frame) != self.n_atoms:
+            raise ValueError(
+                f"Model {index + 1} has {len(frame)} atoms, the first has {self.n_atoms}"
+            )
+        return frame
+
+
+def open_frames(path: PathLike, **kwargs) -> MappedFrames:
+    """
+    Open a trajectory file by its extension: `.dcd`, `.pdb`/`.ent` (multi-model)
+    or otherwise raw float32, which requires `n_atoms`.
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == ".dcd":
+        return DCDFrames(path, **kwargs)
+    if suffix in (".pdb", ".ent"):
+        return PDBFrames(path, **kwargs)
+    return RawFrames(path, **kwargs)
+
+
+class Prefetcher:
+    """
+    Reads frames of `source` on a background thread, ahead of a cursor.
+
+    The `ahead` frames from the cursor are read into a cache. `get` returns a
+    frame from the cache, or reads it if it is not (yet) cached, and moves the
+    cursor past it; `seek` moves the cursor, e.g. to where playback jumped.
+    Frames outside of the window are dropped, so that the cache holds at most
+    `ahead` frames.
+    """
+
+    def __init__(self, source: FrameSource, ahead: int = PREFETCH_FRAMES):
+        self.source = source
+        self.ahead = ahead
+        self._cache: dict[int, np.ndarray] = {}
+        self._cursor = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="ipymolstar-prefetch", daemon=True
+        )
+        self._thread.start()
+
+    def get(self, index: int) -> np.ndarray:
+        with self._condition:
+            frame = self._cache.pop(index, None)
+            self._seek(index + 1)
+        return self.source.read(index) if frame is None else frame
+
+    def seek(self, cursor: int) -> None:
+        with self._condition:
+            self._seek(cursor)
+
+    def _seek(self, cursor: int) -> None:
+        self._cursor = cursor
+        for index in list(self._cache):
+            if not self._in_window(index):
+                del self._cache[index]
+        self._condition.notify()
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._cache.clear()
+            self._condition.notify()
+        self._thread.join()
+
+    def _in_window(self, index: int) -> bool:
+        return self._cursor <= index < self._cursor + self.ahead
+
+    def _next(self) -> Optional[int]:
+        stop = min(len(self.source), self._cursor + self.ahead)
+        return next(
+            (i for i in range(self._cursor, stop) if i not in self._cache), None
+        )
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed and (index := self._next()) is None:
+                    self._condition.wait()
+                if self._closed:
+                    return
+            frame = self.source.read(index)
+            with self._condition:
+                if self._in_window(index) and not self._closed:
+                    self._cache[index] = frame
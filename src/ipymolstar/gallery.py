@@ -0,0 +1,115 @@
+import pathlib
+from typing import ClassVar, Iterable, Optional, Union
+
+import traitlets
+
+from ipymolstar.assets import STATIC, HashedAssetWidget
+from ipymolstar.compression import (
+    COMPRESSION_THRESHOLD,
+    COMPRESSIONS,
+    CompressionCache,
+    compress_custom_data,
+)
+from ipymolstar.pdbemolstar import CONTEXT_POOL_SIZE, THEMES, _as_buffer
+
+
+def _structures_to_json(structures: list[dict], widget) -> list[dict]:
+    widget._compressed.retain(
+        entry["custom_data"].get("data")
+        for entry in structures
+        if "custom_data" in entry
+    )
+    return [
+        {
+            "custom_data": compress_custom_data(
+                entry["custom_data"],
+                widget.compression,
+                widget.compression_threshold,
+                widget.compress_binary,
+                widget._compressed,
+            )
+        }
+        if "custom_data" in entry
+        else entry
+        for entry in structures
+    ]
+
+
+class Gallery(HashedAssetWidget):
+    """
+    Grid of structures drawn by a single pdbe-molstar plugin.
+
+    Instead of a viewer (plugin and WebGL context) per structure, one plugin
+    renders the tiles to images in turn as they scroll into view. Clicking a
+    tile shows it in the interactive viewer above the grid. While tiles are
+    rendered the viewer shows them, and it returns to the selected structure
+    once they are done.
+
+    Structures are given as `molecule_id`s or as `custom_data` dicts as for
+    `PDBeMolstar`, optionally with a `label` shown on the tile.
+    """
+
+    _module = STATIC / "gallery.js"
+    _styles: ClassVar[list[pathlib.Path]] = [THEMES["light"]["stylesheet"]]
+
+    # entries {"molecule_id": ...} or {"custom_data": ...}
+    structures = traitlets.List().tag(sync=True, to_json=_structures_to_json)
+    # index of the structure shown in the interactive viewer
+    selected = traitlets.Int(0, allow_none=True).tag(sync=True)
+    columns = traitlets.Int(5).tag(sync=True)
+    # width and height of the tiles in pixels
+    tile_size = traitlets.Int(160).tag(sync=True)
+    width = traitlets.Unicode("100%").tag(sync=True)
+    height = traitlets.Unicode("500px").tag(sync=True)
+    bg_color = traitlets.Unicode(THEMES["light"]["bg_color"]).tag(sync=True)
+    compression = traitlets.Enum(COMPRESSIONS, default_value="gzip", allow_none=True)
+    compression_threshold = traitlets.Int(COMPRESSION_THRESHOLD)
+    compress_binary = traitlets.Bool(False)
+    context_pool_size = traitlets.Int(CONTEXT_POOL_SIZE).tag(sync=True)
+    live_contexts = traitlets.Int(0).tag(sync=True)
+
+    # per tile, reported by the frontend once rendered: milliseconds to load
+    # the structure (load_ms) and to render the tile (render_ms), or an error
+    tile_timings = traitlets.List().tag(sync=True)
+
+    def __init__(self, structures: Iterable[Union[str, dict]] = (), **kwargs):
+        self._compressed = CompressionCache()
+        super().__init__(structures=list(structures), **kwargs)
+
+    @traitlets.validate("structures")
+    def _validate_structures(self, proposal):
+        return [self._entry(structure) for structure in proposal["value"]]
+
+    @staticmethod
+    def _entry(structure: Union[str, dict]) -> dict:
+        if isinstance(structure, str):
+            return {"molecule_id": structure}
+        if "molecule_id" in structure:
+            return structure
+        # entries {"custom_data": ...}, e.g. of another gallery, or the
+        # custom_data dict itself
+        entry = (
+            dict(structure)
+            if "custom_data" in structure
+            else {"custom_data": structure}
+        )
+        custom_data = entry["custom_data"]
+        if not isinstance(custom_data, dict):
+            raise traitlets.TraitError(
+                f"custom_data must be a dict, got {custom_data!r}"
+            )
+        data = custom_data.get("data")
+        if not isinstance(data, (str, type(None))):
+            try:
+                data = _as_buffer(data)
+            except (TypeError, ValueError) as e:
+                raise traitlets.TraitError(f"Invalid custom_data['data']: {e}") from e
+        entry["custom_data"] = {**custom_data, "data": data}
+        return entry
+
+    @property
+    def selected_structure(self) -> Optional[dict]:
+        """Entry of the structure shown in the interactive viewer."""
+        if self.selected is None or not 0 <= self.selected < len(self.structures):
+            return None
+        return self.structures[self.selected]
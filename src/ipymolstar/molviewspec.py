@@ -1,7 +1,39 @@
-import anywidget
+import functools
+import io
+import itertools
+import json
+import logging
+import os
 import pathlib
+import threading
+import uuid
+import zipfile
+from concurrent.futures import Future
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    ClassVar,
+    Iterable,
+    Optional,
+    TypedDict,
+    Union,
+)
+
 import traitlets
 
+from ipymolstar.assets import STATIC, HashedAssetWidget
+from ipymolstar.compression import (
+    COMPRESSION_THRESHOLD,
+    COMPRESSIONS,
+    CompressionCache,
+    compress,
+)
+from ipymolstar.pdbemolstar import CONTEXT_POOL_SIZE, IDLE_TIMEOUT, _as_buffer
+from ipymolstar.screenshot import Screenshots
+
+logger = logging.getLogger(__name__)
+
 # https://github.com/molstar/molstar/blob/80415a2771fcddbca3cc13ddba4be10c92a1454b/src/apps/viewer/app.ts#L88
 DEFAULT_VIEWER_OPTIONS = {
     "layoutIsExpanded": False,
@@ -15,13 +47,441 @@ DEFAULT_MVS_LOAD_OPTIONS = {
 }
 
 
-class MolViewSpec(anywidget.AnyWidget):
-    _esm = pathlib.Path(__file__).parent / "static" / "molviewspec.js"
-    _css = pathlib.Path(__file__).parent / "static" / "molviewspec.css"
+def _diff_tree(old, new, path=(), ops=None) -> list[dict]:
+    """
+    Structural patch turning the JSON tree `old` into `new`.
+
+    Operations are `replace`, `add` and `remove` on a `path` of keys / list
+    indices. Lists are compared elementwise with additions and removals at the
+    end, matching how builder chains grow and shrink.
+    """
+    ops = [] if ops is None else ops
+    if type(old) is not type(new):
+        ops.append({"op": "replace", "path": list(path), "value": new})
+    elif isinstance(new, dict):
+        for key in old.keys() - new.keys():
+            ops.append({"op": "remove", "path": [*path, key]})
+        for key, value in new.items():
+            if key in old:
+                _diff_tree(old[key], value, (*path, key), ops)
+            else:
+                ops.append({"op": "add", "path": [*path, key], "value": value})
+    elif isinstance(new, list):
+        for i, (a, b) in enumerate(zip(old, new)):
+            _diff_tree(a, b, (*path, i), ops)
+        for i in range(len(old) - 1, len(new) - 1, -1):
+            ops.append({"op": "remove", "path": [*path, i]})
+        for i in range(len(old), len(new)):
+            ops.append({"op": "add", "path": [*path, i], "value": new[i]})
+    elif old != new:
+        ops.append({"op": "replace", "path": list(path), "value": new})
+    return ops
+
+
+def _apply_patch(tree, ops: list[dict]):
+    """Apply a patch from `_diff_tree` in place, returns the patched tree."""
+    for op in ops:
+        *parents, key = op["path"] or [None]
+        if key is None:
+            tree = op["value"]
+            continue
+        target = tree
+        for k in parents:
+            target = target[k]
+        if op["op"] == "remove":
+            del target[key]
+        elif op["op"] == "add" and isinstance(target, list):
+            target.insert(key, op["value"])
+        else:
+            target[key] = op["value"]
+    return tree
+
+
+def _snapshot_dict(frame: Any) -> dict:
+    """MVS snapshot or state as JSON-compatible dict."""
+    if isinstance(frame, str):
+        return json.loads(frame)
+    if isinstance(frame, dict):
+        return frame
+    # molviewspec (pydantic) Snapshot / State
+    return json.loads(frame.model_dump_json(exclude_none=True))
+
+
+class SnapshotStream:
+    """
+    MVS snapshots streamed to a `MolViewSpec` viewer.
+
+    Frames are taken from `frames` in a background thread and sent in chunks to
+    a ring buffer of `buffer_size` frames in the frontend, which starts playing
+    as soon as the first chunk arrives. The frontend reports back the frames it
+    played, and the producer waits while the buffer is full: at most
+    `buffer_size` frames are held at any time and `frames` is consumed at the
+    pace of playback.
+
+    As the frontend reports are handled by the kernel, wait for a stream by
+    polling `done` (e.g. with `asyncio.sleep`) rather than by blocking.
+    """
+
+    def __init__(
+        self,
+        widget: "MolViewSpec",
+        frames: Iterable,
+        buffer_size: int = 100,
+        chunk_size: int = 10,
+        fps: Optional[float] = None,
+    ):
+        if not 0 < chunk_size <= buffer_size:
+            raise ValueError("chunk_size must be between 1 and buffer_size")
+        self.id = uuid.uuid4().hex
+        self.buffer_size = buffer_size
+        self.chunk_size = chunk_size
+        self.fps = fps
+        self.sent = 0
+        self.played = 0
+        self.closed = False
+        self.error: Optional[BaseException] = None
+        self._widget = widget
+        self._frames = iter(frames)
+        self._finished = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="ipymolstar-stream", daemon=True
+        )
+
+    @property
+    def done(self) -> bool:
+        """All frames were sent and played, or the stream was stopped."""
+        return self.closed or (self._finished and self.played >= self.sent)
+
+    def start(self) -> "SnapshotStream":
+        self._send(
+            "stream_start",
+            buffer_size=self.buffer_size,
+            chunk_size=self.chunk_size,
+            fps=self.fps,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop producing frames and playback in the frontend."""
+        with self._cond:
+            if self.done:
+                return
+            self.closed = True
+            self._cond.notify_all()
+        self._send("stream_stop")
+
+    def _ack(self, played: int) -> None:
+        with self._cond:
+            self.played = max(self.played, played)
+            self._cond.notify_all()
+
+    def _has_room(self, n: int) -> bool:
+        """`n` more frames fit in the frontend's buffer, or the stream was stopped."""
+        return self.closed or self.sent + n - self.played <= self.buffer_size
+
+    def _send(self, kind: str, **content) -> None:
+        self._widget.send({"type": kind, "stream": self.id, **content})
+
+    def _run(self):
+        try:
+            while True:
+                chunk = [
+                    _snapshot_dict(frame)
+                    for frame in itertools.islice(self._frames, self.chunk_size)
+                ]
+                if not chunk:
+                    break
+                with self._cond:
+                    self._cond.wait_for(functools.partial(self._has_room, len(chunk)))
+                    if self.closed:
+                        return
+                self._send("stream_frames", start=self.sent, frames=chunk)
+                self.sent += len(chunk)
+            self._send("stream_end", count=self.sent)
+        except Exception as error:
+            self.error = error
+            logger.error("Error in snapshot stream", exc_info=error)
+            self.stop()
+        finally:
+            self._finished = True
+
+
+def _msvj_payload(msvj: str, compressed: tuple) -> Any:
+    data, compression = compressed
+    return msvj if compression is None else {"compression": compression, "data": data}
+
+
+def _msvj_to_json(msvj: str, widget) -> Any:
+    cache = widget._compressed_msvj
+    cache.retain([msvj])
+    return _msvj_payload(
+        msvj, cache.compress(msvj, widget.compression, widget.compression_threshold)
+    )
+
+
+def _assets_to_json(assets: dict, widget) -> dict:
+    cache = widget._compressed_assets
+    cache.retain(assets.values())
+    compressed = {}
+    for name, data in assets.items():
+        data, compression = cache.compress(
+            data, widget.compression, widget.compression_threshold
+        )
+        compressed[name] = {"data": data, "compression": compression}
+    return compressed
+
+
+class Camera(TypedDict, total=False):
+    target: list[float]
+    position: list[float]
+    up: list[float]
+    transition_duration_ms: Optional[int]
+
+
+class MolViewSpec(HashedAssetWidget):
+    _module = STATIC / "molviewspec.js"
+    _styles: ClassVar[list[pathlib.Path]] = [STATIC / "molviewspec.css"]
 
     width = traitlets.Unicode("100%").tag(sync=True)
     height = traitlets.Unicode("500px").tag(sync=True)
-    msvj_data = traitlets.Unicode("").tag(sync=True)
+    msvj_data = traitlets.Unicode("").tag(sync=True, to_json=_msvj_to_json)
+    # files referenced by relative URLs in msvj_data, by path
+    assets = traitlets.Dict().tag(sync=True, to_json=_assets_to_json)
 
     viewer_options = traitlets.Dict(DEFAULT_VIEWER_OPTIONS).tag(sync=True)
     mvs_load_options = traitlets.Dict(DEFAULT_MVS_LOAD_OPTIONS).tag(sync=True)
+    # msvj_data larger than compression_threshold bytes is sent compressed
+    compression = traitlets.Enum(COMPRESSIONS, default_value="gzip", allow_none=True)
+    compression_threshold = traitlets.Int(COMPRESSION_THRESHOLD)
+
+    # camera as in MVS camera nodes, updated (at most `camera_rate` times per
+    # second) when the user moves the camera
+    camera = traitlets.Dict(default_value=None, allow_none=True).tag(sync=True)
+    camera_rate = traitlets.Float(5.0).tag(sync=True)
+
+    # page-level, 0 keeps the contexts of all viewers live
+    context_pool_size = traitlets.Int(CONTEXT_POOL_SIZE).tag(sync=True)
+    # live WebGL contexts on the page, reported by the frontend
+    live_contexts = traitlets.Int(0).tag(sync=True)
+    # seconds without interaction or updates after which rendering pauses,
+    # 0 keeps rendering
+    idle_timeout = traitlets.Float(IDLE_TIMEOUT).tag(sync=True)
+    # reported by the frontend: "running", "idle", "hidden" (page), "offscreen",
+    # "parked" (see context_pool_size) or "loading"
+    render_state = traitlets.Unicode("").tag(sync=True)
+    # seconds rendering (active_s) and paused (paused_s), draws, and draws
+    # avoided while paused estimated from the draw rate while rendering
+    render_stats = traitlets.Dict().tag(sync=True)
+
+    def __init__(self, **kwargs):
+        # msvj_data as last sent in full or as patch to the frontend
+        self._sent_msvj = None
+        self._compressed_msvj = CompressionCache()
+        self._compressed_assets = CompressionCache()
+        self._stream: Optional[SnapshotStream] = None
+        self._screenshots = Screenshots(self)
+        super().__init__(**kwargs)
+        self.on_msg(self._handle_msg)
+        self.on_msg(self._screenshots.handle)
+
+    def stream(
+        self,
+        frames: Iterable,
+        buffer_size: int = 100,
+        chunk_size: int = 10,
+        fps: Optional[float] = None,
+    ) -> SnapshotStream:
+        """
+        Play MVS snapshots as they are produced.
+
+        Args:
+            frames: Iterable of snapshots (molviewspec `Snapshot` / `State`,
+                dicts or MVSJ strings), consumed in a background thread.
+            buffer_size: Maximum number of frames buffered in the frontend.
+            chunk_size: Number of frames sent per message.
+            fps: Playback rate, by default snapshots are shown for their
+                `linger_duration_ms`.
+
+        Returns:
+            The running stream, replacing any previous stream.
+        """
+        if self._stream is not None:
+            self._stream.stop()
+        self._stream = SnapshotStream(self, frames, buffer_size, chunk_size, fps)
+        return self._stream.start()
+
+    def _handle_msg(self, widget, content, buffers):
+        stream = self._stream
+        if (
+            content.get("type") == "stream_ack"
+            and stream
+            and content["stream"] == stream.id
+        ):
+            stream._ack(content["played"])
+
+    def load_mvsx(self, mvsx: Union[str, os.PathLike, bytes, IO[bytes]]) -> None:
+        """
+        Show an MVSX archive.
+
+        The archive's `index.mvsj` becomes `msvj_data` and all other files are
+        sent along as `assets`, so that no files have to be downloaded by the
+        browser.
+
+        Args:
+            mvsx: Path, file object or bytes of the archive.
+        """
+        if isinstance(mvsx, (bytes, bytearray, memoryview)):
+            mvsx = io.BytesIO(mvsx)
+        with zipfile.ZipFile(mvsx) as archive:
+            files = {
+                info.filename: archive.read(info)
+                for info in archive.infolist()
+                if not info.is_dir()
+            }
+        if "index.mvsj" not in files:
+            raise ValueError("MVSX archive has no index.mvsj")
+        msvj_data = files.pop("index.mvsj").decode()
+        with self.hold_sync():
+            self.assets = files
+            self.msvj_data = msvj_data
+
+    @traitlets.validate("assets")
+    def _validate_assets(self, proposal):
+        assets = {}
+        for name, data in proposal["value"].items():
+            try:
+                assets[name] = (
+                    data.encode() if isinstance(data, str) else _as_buffer(data)
+                )
+            except (TypeError, ValueError) as e:
+                raise traitlets.TraitError(f"Invalid asset {name!r}: {e}") from e
+        return assets
+
+    def set_camera(
+        self,
+        target: tuple[float, float, float],
+        position: tuple[float, float, float],
+        up: tuple[float, float, float] = (0, 1, 0),
+        transition_duration_ms: int = 0,
+    ) -> None:
+        """
+        Move the camera without reloading the scene.
+
+        Args:
+            target: Point the camera looks at.
+            position: Camera position, as for MVS camera nodes.
+            up: Up direction of the view.
+            transition_duration_ms: Duration of the camera transition.
+        """
+        camera: Camera = {
+            "target": [float(x) for x in target],
+            "position": [float(x) for x in position],
+            "up": [float(x) for x in up],
+            "transition_duration_ms": transition_duration_ms,
+        }
+        self.camera = camera
+
+    def screenshot(
+        self,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        transparent: bool = False,
+        supersample: int = 1,
+    ) -> "Future[bytes]":
+        """
+        Render the current view to a PNG image.
+
+        Args:
+            width: Image width in pixels, by default the width of the viewer.
+            height: Image height in pixels, by default the height of the viewer.
+            transparent: Render without background.
+            supersample: Render at this multiple (1-4) of the size and scale
+                down, for smoother edges.
+
+        Returns:
+            Future of the PNG bytes, resolved when the kernel handles the
+            frontend's reply after the running cell. Wait for it in a task or
+            a later cell, not in the cell itself; see `PDBeMolstar.screenshot`.
+        """
+        return self._screenshots.request(width, height, transparent, supersample)
+
+    def screenshots(
+        self,
+        states: Iterable,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        transparent: bool = False,
+        supersample: int = 1,
+        concurrency: int = 2,
+    ) -> AsyncIterator[bytes]:
+        """
+        Render a sequence of MVS states with this viewer, for use with `async for`.
+
+        States (molviewspec `State`, dicts or MVSJ strings) are loaded in turn,
+        yielding PNG images in order, with up to `concurrency` states sent
+        ahead. Afterwards the viewer shows `msvj_data` again.
+
+        Images arrive while the kernel processes comm messages, so consume them
+        in a task rather than in the cell itself, see `PDBeMolstar.screenshots`.
+        """
+
+        def load(state):
+            msvj = json.dumps(_snapshot_dict(state))
+            compressed = compress(msvj, self.compression, self.compression_threshold)
+            return {"msvj": _msvj_payload(msvj, compressed)}
+
+        return self._screenshots.batch(
+            states,
+            load,
+            concurrency,
+            width=width,
+            height=height,
+            transparent=transparent,
+            supersample=supersample,
+        )
+
+    @traitlets.validate("camera")
+    def _validate_camera(self, proposal):
+        camera = proposal["value"]
+        if camera is None:
+            return camera
+        for key in ("target", "position", "up"):
+            if len(camera.get(key, ())) != 3:
+                raise traitlets.TraitError(f"Camera {key!r} must be a 3D vector")
+        return camera
+
+    def get_state(self, key=None):
+        state = super().get_state(key=key)
+        if "msvj_data" in state:
+            self._sent_msvj = self.msvj_data
+        return state
+
+    def send_state(self, key=None):
+        # changes to msvj_data are sent as a patch to the frontend's state tree
+        # when that is smaller than the document; full syncs (key=None) and
+        # changes together with the assets it refers to are not
+        if key is not None:
+            keys = {key} if isinstance(key, str) else set(key)
+            if "msvj_data" in keys and "assets" not in keys and self._send_msvj_patch():
+                keys.discard("msvj_data")
+                if not keys:
+                    return
+            key = keys
+        super().send_state(key=key)
+
+    def _send_msvj_patch(self) -> bool:
+        try:
+            old, new = json.loads(self._sent_msvj), json.loads(self.msvj_data)
+        except (TypeError, ValueError):
+            return False
+        if not (isinstance(old, dict) and isinstance(new, dict)):
+            return False
+        ops = _diff_tree(old, new)
+        if len(json.dumps(ops)) >= len(self.msvj_data):
+            return False
+        if ops:
+            self.send({"type": "patch", "ops": ops})
+        self._sent_msvj = self.msvj_data
+        return True
@@ -1,7 +1,36 @@
+import contextlib
 import pathlib
-from typing import Optional
+from concurrent.futures import Executor
+from typing import Any, Callable, Iterable, Optional
 
-from ipymolstar.pdbemolstar import THEMES, Color, QueryParam, ResetParam
+from ipymolstar.compression import (
+    COMPRESSION_THRESHOLD,
+    COMPRESSIONS,
+    compress_custom_data,
+)
+from ipymolstar.events import (
+    EVENT_TRAITS,
+    Event,
+    EventStream,
+    Overflow,
+    dispatcher,
+    event_traits,
+    make_event,
+)
+from ipymolstar.pdbemolstar import (
+    CONTEXT_POOL_SIZE,
+    IDLE_TIMEOUT,
+    STRUCTURE_CACHE_SIZE,
+    THEMES,
+    Color,
+    QueryParam,
+    ResetParam,
+    _AppliedColors,
+    _encode_residue_colors,
+    _encode_residue_tooltips,
+    _residue_color_arrays,
+    theme_css,
+)
 
 try:
     import panel as pn
@@ -12,6 +41,13 @@ import param
 from panel.custom import AnyWidgetComponent
 
 
+def _as_bytes(payload: dict) -> dict:
+    # bokeh serializes `bytes` but not `memoryview`
+    return {
+        k: v.tobytes() if isinstance(v, memoryview) else v for k, v in payload.items()
+    }
+
+
 class PDBeMolstar(AnyWidgetComponent):
     _esm = pathlib.Path(__file__).parent.parent / "static" / "pdbemolstar.js"
     _stylesheets = [
@@ -63,6 +99,19 @@ class PDBeMolstar(AnyWidgetComponent):
     domain_annotation = param.Boolean(default=False)
     symmetry_annotation = param.Boolean(default=False)
     pdbe_url = param.String(default="https://www.ebi.ac.uk/pdbe/")
+    structure_cache_size = param.Integer(default=STRUCTURE_CACHE_SIZE, bounds=(0, None))
+    context_pool_size = param.Integer(default=CONTEXT_POOL_SIZE, bounds=(0, None))
+    live_contexts = param.Integer(default=0)
+    idle_timeout = param.Number(default=IDLE_TIMEOUT, bounds=(0, None))
+    render_state = param.String(default="")
+    render_stats = param.Dict(default={})
+    # custom_data larger than compression_threshold bytes is sent compressed
+    compression = param.Selector(
+        default="gzip", objects=[*COMPRESSIONS, None], precedence=-1
+    )
+    compression_threshold = param.Integer(
+        default=COMPRESSION_THRESHOLD, bounds=(0, None), precedence=-1
+    )
     encoding = param.Selector(default="bcif", objects=["bcif", "cif"])
     low_precision_coords = param.Boolean(default=False)
     select_interaction = param.Boolean(default=True)
@@ -96,66 +145,282 @@ class PDBeMolstar(AnyWidgetComponent):
     reactive = param.Boolean(default=False)
 
     spin = param.Boolean(default=False)
-    _focus = param.List(default=None)
     highlight = param.Dict(default=None)
-    _clear_highlight = param.Boolean(default=False)
     color_data = param.Dict(default=None)
-    _clear_selection = param.Boolean(default=False)
     tooltips = param.Dict(default=None)
-    _clear_tooltips = param.Boolean(default=False)
-    _set_color = param.Dict(default=None)
-    _reset = param.Dict(default=None)
-    _update = param.Dict(default=None)
-    _args = param.Dict(default={})
 
     mouseover_event = param.Dict(default={})
+    mouseover_rate = param.Number(default=20.0, bounds=(0, None))
+    mouseover_dropped = param.Integer(default=0)
     mouseout_event = param.Boolean(default=False)
     click_event = param.Dict(default={})
     click_focus = param.Boolean(default=True)
 
     def __init__(self, theme="light", **params):
-        _stylesheets = [THEMES[theme]["css"]]
+        self._applied_colors = _AppliedColors()
+        self._batch_commands = None
+        self._command_id = 0
+        _stylesheets = [theme_css(theme)]
         bg_color = params.pop("bg_color", THEMES[theme]["bg_color"])
         self._stylesheets = _stylesheets  # shouldnt work but it does
 
         super().__init__(bg_color=bg_color, **params)
 
+    def _process_param_change(self, params):
+        params = super()._process_param_change(params)
+        if params.get("custom_data"):
+            custom_data = compress_custom_data(
+                params["custom_data"], self.compression, self.compression_threshold
+            )
+            params["custom_data"] = _as_bytes(custom_data)
+        return params
+
+    @param.depends(
+        "molecule_id", "custom_data", "visual_style", "color_data", watch=True
+    )
+    def _clear_applied_colors(self):
+        # reloading the structure discards all colors in the frontend, and
+        # color_data replaces them
+        self._applied_colors.clear()
+
+    def _handle_msg(self, data):
+        # a view (re)loaded its structure, e.g. a view displayed later, and
+        # shows none of the colors applied before
+        if data.get("type") == "load_complete":
+            self._applied_colors.clear()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Queue commands and send them to the frontend in a single message.
+
+        Commands are applied in order within one animation frame. Parameter changes
+        made inside the block are synced together in one update.
+
+        Example:
+            with viewer.batch():
+                viewer.color(data)
+                viewer.focus(focus_data)
+        """
+        if self._batch_commands is not None:
+            # nested batch; commands are sent by the outer one
+            yield
+            return
+
+        self._batch_commands = []
+        try:
+            with pn.io.hold():
+                yield
+                if self._batch_commands:
+                    self._send_commands(self._batch_commands)
+        finally:
+            self._batch_commands = None
+
+    def _command(self, name: str, data=None):
+        """Send a command to the frontend, or queue it inside a batch."""
+        self._command_id += 1
+        command = {"id": self._command_id, "name": name, "data": data}
+        if self._batch_commands is not None:
+            self._batch_commands.append(command)
+        else:
+            self._send_commands([command])
+
+    def _send_commands(self, commands: list[dict]):
+        # bytes are serialized by bokeh as binary buffers
+        self._send_msg({"type": "commands", "commands": commands})
+
+    def events(
+        self,
+        kinds: Iterable[str] = tuple(EVENT_TRAITS),
+        maxsize: int = 100,
+        overflow: Overflow = "drop-oldest",
+    ) -> EventStream:
+        """
+        Stream of viewer events for use with `async for`.
+
+        Args:
+            kinds: Event kinds to receive: "click", "mouseover" and/or "mouseout".
+            maxsize: Maximum number of buffered events.
+            overflow: "drop-oldest" to drop the oldest buffered event when full, or
+                "latest-only" to only keep the most recent event.
+        """
+        names = event_traits(kinds)
+        watcher = self.param.watch(
+            lambda event: stream.put(make_event(event.name, event.new)), names
+        )
+        stream = EventStream(lambda: self.param.unwatch(watcher), maxsize, overflow)
+        return stream
+
+    def on_event(
+        self,
+        callback: Callable[[Event], Any],
+        kinds: Iterable[str] = tuple(EVENT_TRAITS),
+        threaded: bool = False,
+        executor: Optional[Executor] = None,
+    ) -> Callable[[], None]:
+        """
+        Call `callback(event)` for viewer events.
+
+        With `threaded`, callbacks are submitted to a shared thread pool (or to
+        `executor`) so that slow callbacks do not block the server's event loop.
+
+        Returns a function which removes the callback.
+        """
+        names = event_traits(kinds)
+        dispatch = dispatcher(callback, threaded, executor)
+        watcher = self.param.watch(
+            lambda event: dispatch(make_event(event.name, event.new)), names
+        )
+        return lambda: self.param.unwatch(watcher)
+
     def color(
         self,
         data: list[QueryParam],
         non_selected_color=None,
         keep_colors=False,
         keep_representations=False,
+        delta=True,
     ) -> None:
         """
         Alias for PDBE Molstar's `select` method.
 
         See https://github.com/molstar/pdbe-molstar/wiki/3.-Helper-Methods for parameter
         details
+
+        When `delta` is True and `data` selects the same residues as the previous call,
+        only entries whose color changed are sent and applied on top of the current
+        colors. Pass `delta=False` to send all entries, e.g. to restore colors the
+        viewer lost in a way the component cannot track.
         """
+        options = {
+            "nonSelectedColor": non_selected_color,
+            "keepRepresentations": keep_representations,
+        }
+        changed = None
+        if keep_colors:
+            self._applied_colors.clear()
+        else:
+            keys = [{k: v for k, v in q.items() if k != "color"} for q in data]
+            colors = [q.get("color") for q in data]
+            if delta:
+                changed = self._applied_colors.changed(options, keys, colors)
+            else:
+                self._applied_colors.record(options, keys, colors)
 
-        self.color_data = {
+        if changed is not None:
+            if not changed:
+                return
+            data = [data[i] for i in changed]
+            non_selected_color, keep_colors = None, True
+
+        color_data = {
             "data": data,
             "nonSelectedColor": non_selected_color,
             "keepColors": keep_colors,
             "keepRepresentations": keep_representations,
         }
-        self.color_data = None
+        self._command("select", color_data)
+
+    def color_arrays(
+        self,
+        residue_numbers,
+        colors,
+        chains=None,
+        auth: bool = False,
+        non_selected_color=None,
+        keep_colors=False,
+        keep_representations=False,
+        delta=True,
+    ) -> None:
+        """
+        Color residues from arrays instead of a list of `QueryParam` dicts.
+
+        Args:
+            residue_numbers: Array of residue numbers.
+            colors: Array of shape (n, 3) or (n, 4) with uint8 RGB(A) values.
+            chains: Chain id per residue, a single chain id for all residues, or None.
+            auth: Interpret residue numbers and chains as author instead of label ids.
+            non_selected_color: Color of residues not in `residue_numbers`.
+            keep_colors: Keep colors from previous calls.
+            keep_representations: Keep representations from previous calls.
+            delta: Only send residues whose color changed since the previous call
+                with the same residues and options. False sends all residues.
+        """
+        residue_numbers, colors, chains = _residue_color_arrays(
+            residue_numbers, colors, chains
+        )
+        options = {
+            "auth": auth,
+            "nonSelectedColor": non_selected_color,
+            "keepRepresentations": keep_representations,
+        }
+        changed = None
+        keys = (residue_numbers, chains)
+        if keep_colors:
+            self._applied_colors.clear()
+        elif delta:
+            changed = self._applied_colors.changed(options, keys, colors)
+        else:
+            self._applied_colors.record(options, keys, colors)
+
+        if changed is not None:
+            if not changed:
+                return
+            residue_numbers, colors = residue_numbers[changed], colors[changed]
+            chains = None if chains is None else chains[changed]
+            non_selected_color, keep_colors = None, True
+
+        color_arrays = {
+            **_as_bytes(_encode_residue_colors(residue_numbers, colors, chains, auth)),
+            "nonSelectedColor": non_selected_color,
+            "keepColors": keep_colors,
+            "keepRepresentations": keep_representations,
+        }
+        self._command("select_arrays", color_arrays)
+
+    def tooltip_arrays(
+        self,
+        residue_numbers,
+        tooltips,
+        chains=None,
+        auth: bool = False,
+        ranges: bool = True,
+    ) -> None:
+        """
+        Set residue tooltips from arrays instead of a list of `QueryParam` dicts.
+
+        Tooltip strings are deduplicated and sent as indices into a table of unique
+        strings.
+
+        Args:
+            residue_numbers: Array of residue numbers.
+            tooltips: Tooltip string per residue.
+            chains: Chain id per residue, a single chain id for all residues, or None.
+            auth: Interpret residue numbers and chains as author instead of label ids.
+            ranges: Merge consecutive residues with the same tooltip into a single
+                residue range selection.
+        """
+        self._command(
+            "tooltips_arrays",
+            _as_bytes(
+                _encode_residue_tooltips(
+                    residue_numbers, tooltips, chains, auth, ranges
+                )
+            ),
+        )
 
     def focus(self, data: list[QueryParam]):
-        self._focus = data
-        self._focus = None
+        self._command("focus", data)
 
     def clear_highlight(self):
-        self._clear_highlight = not self._clear_highlight
+        self._command("clear_highlight")
 
     def clear_tooltips(self):
-        self._clear_tooltips = not self._clear_tooltips
+        self._command("clear_tooltips")
 
     def clear_selection(self, structure_number=None):
-        # move payload to the traitlet which triggers the callback
-        self._args = {"number": structure_number}
-        self._clear_selection = not self._clear_selection
+        self._applied_colors.clear()
+        self._command("clear_selection", {"number": structure_number})
 
     # todo make two traits: select_color, hightlight_color
     def set_color(
@@ -167,13 +432,12 @@ class PDBeMolstar(AnyWidgetComponent):
         if select is not None:
             data["select"] = select
         if data:
-            self._set_color = data
-            self._set_color = None
+            self._command("set_color", data)
 
     def reset(self, data: ResetParam):
-        self._reset = data
-        self._reset = None
+        self._applied_colors.clear()
+        self._command("reset", data)
 
     def update(self, data):
-        self._update = data
-        self._update = None
+        self._applied_colors.clear()
+        self._command("update", data)
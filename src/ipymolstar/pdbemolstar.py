@@ -1,22 +1,292 @@
+import contextlib
+import os
 import pathlib
-from typing import Any, List, Optional, TypedDict
+from concurrent.futures import Executor, Future
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    ClassVar,
+    Iterable,
+    List,
+    Optional,
+    TypedDict,
+    Union,
+)
 
-import anywidget
 import traitlets
 
+from ipymolstar.assets import STATIC, HashedAssetWidget, asset
+from ipymolstar.compression import (
+    COMPRESSION_THRESHOLD,
+    COMPRESSIONS,
+    CompressionCache,
+    compress_custom_data,
+)
+from ipymolstar.events import (
+    EVENT_TRAITS,
+    Event,
+    EventStream,
+    Overflow,
+    dispatcher,
+    event_traits,
+    make_event,
+)
+from ipymolstar.screenshot import Screenshots
+from ipymolstar.trajectory import Frames
+
+if TYPE_CHECKING:
+    from ipymolstar.frames import FrameSource
+
+# stylesheets are read on first use, see `theme_css`
 THEMES = {
-    "light": {
-        "bg_color": "#F7F7F7",
-        "css": (
-            pathlib.Path(__file__).parent / "static" / "pdbe-light.css"
-        ).read_text(),
-    },
-    "dark": {
-        "bg_color": "#111111",
-        "css": (pathlib.Path(__file__).parent / "static" / "pdbe-dark.css").read_text(),
-    },
+    "light": {"bg_color": "#F7F7F7", "stylesheet": STATIC / "pdbe-light.css"},
+    "dark": {"bg_color": "#111111", "stylesheet": STATIC / "pdbe-dark.css"},
 }
 
+# byte budget of the page-level structure cache shared by all viewers
+STRUCTURE_CACHE_SIZE = 256 * 1024**2
+
+# number of viewers on the page which keep a live WebGL context, see
+# js/context_pool.js; browsers drop contexts beyond about 16
+CONTEXT_POOL_SIZE = 12
+
+# seconds without interaction or updates after which viewers stop rendering
+IDLE_TIMEOUT = 30.0
+
+
+def theme_css(theme: str) -> str:
+    """CSS of `theme`, read on first use."""
+    return asset(THEMES[theme]["stylesheet"]).content.decode()
+
+
+def _as_buffer(data: Any) -> memoryview:
+    """Return a flat, zero-copy byte view of a buffer-protocol object.
+
+    Accepts `bytes`, `bytearray`, `memoryview`, `mmap.mmap` and NumPy arrays.
+    The view is sent as a binary comm buffer by ipywidgets, avoiding JSON/base64.
+    """
+    view = memoryview(data)
+    if not view.c_contiguous:
+        raise ValueError("Binary data must be C-contiguous")
+    return view.cast("B")
+
+
+def _residue_color_arrays(residue_numbers, colors, chains=None) -> tuple:
+    """Validate per-residue color arrays.
+
+    Returns int32 residue numbers, (n, 3) uint8 RGB colors and an array of
+    chain ids per residue (or None).
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        msg = "Coloring residues from arrays requires the numpy package to be installed"
+        raise ImportError(msg)
+
+    residue_numbers = np.ascontiguousarray(residue_numbers, dtype="<i4")
+    colors = np.asarray(colors)
+    if not np.issubdtype(colors.dtype, np.integer):
+        raise TypeError("colors must be an integer array of RGB(A) values in 0-255")
+    if colors.ndim != 2 or colors.shape[1] not in (3, 4):
+        raise ValueError("colors must have shape (n, 3) or (n, 4)")
+    if residue_numbers.ndim != 1 or len(residue_numbers) != len(colors):
+        raise ValueError("residue_numbers and colors must have the same length")
+    rgb = np.ascontiguousarray(colors[:, :3], dtype=np.uint8)
+
+    chains = _chain_array(chains, residue_numbers)
+
+    return residue_numbers, rgb, chains
+
+
+def _chain_array(chains, residue_numbers):
+    """Chain id per residue from a sequence of chain ids, a single chain id or None."""
+    import numpy as np
+
+    if chains is None:
+        return None
+    if isinstance(chains, str):
+        return np.full(len(residue_numbers), chains)
+    chains = np.asarray(chains, dtype=str)
+    if chains.shape != residue_numbers.shape:
+        raise ValueError("chains and residue_numbers must have the same length")
+    return chains
+
+
+def _encode_chains(chains) -> dict:
+    """Encode chain ids as uint16 indices into a table of unique chain ids."""
+    import numpy as np
+
+    if chains is None:
+        return {"chain_table": [], "chain_index": None}
+    chain_table, chain_index = np.unique(chains, return_inverse=True)
+    return {
+        "chain_table": chain_table.tolist(),
+        "chain_index": _as_buffer(np.ascontiguousarray(chain_index, dtype="<u2")),
+    }
+
+
+def _encode_residue_colors(
+    residue_numbers, colors, chains=None, auth: bool = False
+) -> dict:
+    """Pack per-residue colors into typed binary buffers.
+
+    Residue numbers are sent as little-endian int32, colors as packed uint8 RGB
+    and chains as uint16 indices into a table of unique chain ids.
+    """
+    residue_numbers, rgb, chains = _residue_color_arrays(
+        residue_numbers, colors, chains
+    )
+    return {
+        "residue_number": _as_buffer(residue_numbers),
+        "color": _as_buffer(rgb),
+        **_encode_chains(chains),
+        "auth": auth,
+    }
+
+
+def _encode_residue_tooltips(
+    residue_numbers, tooltips, chains=None, auth: bool = False, ranges: bool = True
+) -> dict:
+    """Pack per-residue tooltips into typed binary buffers.
+
+    Tooltips are deduplicated into a table of unique strings and sent as uint32
+    indices into that table. With `ranges`, consecutive residues of the same
+    chain and tooltip are merged into a single range from `residue_number` to
+    `residue_end`.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        msg = "Setting tooltips from arrays requires the numpy package to be installed"
+        raise ImportError(msg)
+
+    residue_numbers = np.ascontiguousarray(residue_numbers, dtype="<i4")
+    tooltips = np.asarray(tooltips, dtype=str)
+    if residue_numbers.ndim != 1 or tooltips.shape != residue_numbers.shape:
+        raise ValueError("residue_numbers and tooltips must have the same length")
+    chains = _chain_array(chains, residue_numbers)
+    tooltip_table, tooltip_index = np.unique(tooltips, return_inverse=True)
+
+    residue_end = None
+    if ranges and len(residue_numbers):
+        new_run = np.ones(len(residue_numbers), dtype=bool)
+        new_run[1:] = (np.diff(residue_numbers) != 1) | (np.diff(tooltip_index) != 0)
+        if chains is not None:
+            new_run[1:] |= chains[1:] != chains[:-1]
+        starts = np.flatnonzero(new_run)
+        ends = np.append(starts[1:], len(residue_numbers)) - 1
+        residue_end = _as_buffer(np.ascontiguousarray(residue_numbers[ends]))
+        residue_numbers = np.ascontiguousarray(residue_numbers[starts])
+        tooltip_index = tooltip_index[starts]
+        chains = None if chains is None else chains[starts]
+
+    return {
+        "residue_number": _as_buffer(residue_numbers),
+        "residue_end": residue_end,
+        "tooltip_table": tooltip_table.tolist(),
+        "tooltip_index": _as_buffer(np.ascontiguousarray(tooltip_index, dtype="<u4")),
+        **_encode_chains(chains),
+        "auth": auth,
+    }
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if hasattr(a, "shape") or hasattr(b, "shape"):
+        return getattr(a, "shape", None) == getattr(b, "shape", None) and bool(
+            (a == b).all()
+        )
+    return a == b
+
+
+class _AppliedColors:
+    """Coloring last sent to the frontend, used to send only changed residues."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.options = None
+        self.keys = None
+        self.colors = None
+        self.incremental = 0
+
+    def record(self, options: dict, keys, colors):
+        """Record a coloring sent in full."""
+        self.options, self.keys, self.colors = options, keys, colors
+        self.incremental = 0
+
+    def changed(self, options: dict, keys, colors) -> Optional[list[int]]:
+        """Record a new coloring and return the indices of changed entries.
+
+        Returns None when the coloring cannot be applied on top of the previous
+        one and has to be sent in full.
+        """
+        previous_keys, previous_colors = self.keys, self.colors
+        same = options == self.options and _same(previous_keys, keys)
+        self.options, self.keys, self.colors = options, keys, colors
+        if not same:
+            self.incremental = 0
+            return None
+
+        if hasattr(colors, "shape"):
+            changed = (previous_colors != colors).any(axis=1).nonzero()[0].tolist()
+        else:
+            changed = [
+                i for i, (a, b) in enumerate(zip(previous_colors, colors)) if a != b
+            ]
+
+        # every incremental update adds color layers in the plugin; resend
+        # the full coloring once as many residues were updated as there are
+        self.incremental += len(changed)
+        if self.incremental > len(colors):
+            self.incremental = 0
+            return None
+        return changed
+
+
+def _separate_buffers(obj, path=(), buffer_paths=None, buffers=None):
+    """Split binary values out of a nested structure of dicts and lists.
+
+    Returns the structure with binary values replaced by None, the paths to the
+    replaced values and the binary values themselves, which are sent as comm
+    buffers.
+    """
+    if buffer_paths is None:
+        buffer_paths, buffers = [], []
+        obj = _separate_buffers(obj, path, buffer_paths, buffers)
+        return obj, buffer_paths, buffers
+
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        buffer_paths.append(list(path))
+        buffers.append(obj)
+        return None
+    if isinstance(obj, dict):
+        return {
+            k: _separate_buffers(v, (*path, k), buffer_paths, buffers)
+            for k, v in obj.items()
+        }
+    if isinstance(obj, (list, tuple)):
+        return [
+            _separate_buffers(v, (*path, i), buffer_paths, buffers)
+            for i, v in enumerate(obj)
+        ]
+    return obj
+
+
+def _custom_data_to_json(custom_data: Optional[dict], widget) -> Optional[dict]:
+    widget._compressed.retain([custom_data.get("data")] if custom_data else [])
+    return compress_custom_data(
+        custom_data,
+        widget.compression,
+        widget.compression_threshold,
+        widget.compress_binary,
+        widget._compressed,
+    )
+
 
 class Color(TypedDict):
     r: int
@@ -64,15 +334,17 @@ class ResetParam(TypedDict, total=False):
     selectColor: Optional[bool]
 
 
-class PDBeMolstar(anywidget.AnyWidget):
-    _esm = pathlib.Path(__file__).parent / "static" / "pdbemolstar.js"
-    _css = pathlib.Path(__file__).parent / "static" / "pdbe-light.css"
+class PDBeMolstar(HashedAssetWidget):
+    _module = STATIC / "pdbemolstar.js"
+    _styles: ClassVar[list[pathlib.Path]] = [STATIC / "pdbe-light.css"]
 
     width = traitlets.Unicode("100%").tag(sync=True)
     height = traitlets.Unicode("500px").tag(sync=True)
 
     molecule_id = traitlets.Unicode().tag(sync=True)
-    custom_data = traitlets.Dict(default_value=None, allow_none=True).tag(sync=True)
+    custom_data = traitlets.Dict(default_value=None, allow_none=True).tag(
+        sync=True, to_json=_custom_data_to_json
+    )
     assembly_id = traitlets.Unicode().tag(sync=True)
     default_preset = traitlets.Enum(
         ["default", "unitcell", "all-models", "supercell"],
@@ -119,6 +391,26 @@ class PDBeMolstar(anywidget.AnyWidget):
     domain_annotation = traitlets.Bool(False).tag(sync=True)
     symmetry_annotation = traitlets.Bool(False).tag(sync=True)
     pdbe_url = traitlets.Unicode("https://www.ebi.ac.uk/pdbe/").tag(sync=True)
+    structure_cache_size = traitlets.Int(STRUCTURE_CACHE_SIZE).tag(sync=True)
+    # page-level, 0 keeps the contexts of all viewers live
+    context_pool_size = traitlets.Int(CONTEXT_POOL_SIZE).tag(sync=True)
+    # live WebGL contexts on the page, reported by the frontend
+    live_contexts = traitlets.Int(0).tag(sync=True)
+    # seconds without interaction or updates after which rendering pauses,
+    # 0 keeps rendering
+    idle_timeout = traitlets.Float(IDLE_TIMEOUT).tag(sync=True)
+    # reported by the frontend: "running", "idle", "hidden" (page), "offscreen",
+    # "parked" (see context_pool_size) or "loading"
+    render_state = traitlets.Unicode("").tag(sync=True)
+    # seconds rendering (active_s) and paused (paused_s), draws, and draws
+    # avoided while paused estimated from the draw rate while rendering
+    render_stats = traitlets.Dict().tag(sync=True)
+    # custom_data larger than compression_threshold bytes is sent compressed;
+    # binary data (bytes, arrays, ...) only with compress_binary, it is sent as
+    # a zero-copy buffer otherwise
+    compression = traitlets.Enum(COMPRESSIONS, default_value="gzip", allow_none=True)
+    compression_threshold = traitlets.Int(COMPRESSION_THRESHOLD)
+    compress_binary = traitlets.Bool(False)
     encoding = traitlets.Enum(["bcif", "cif"], default_value="bcif").tag(sync=True)
     low_precision_coords = traitlets.Bool(False).tag(sync=True)
     select_interaction = traitlets.Bool(True).tag(sync=True)
@@ -152,28 +444,173 @@ class PDBeMolstar(anywidget.AnyWidget):
     reactive = traitlets.Bool(False).tag(sync=True)
 
     spin = traitlets.Bool(False).tag(sync=True)
-    _focus = traitlets.List(default_value=None, allow_none=True).tag(sync=True)
     highlight = traitlets.Dict(default_value=None, allow_none=True).tag(sync=True)
-    _clear_highlight = traitlets.Bool(default_value=False).tag(sync=True)
     color_data = traitlets.Dict(default_value=None, allow_none=True).tag(sync=True)
-    _clear_selection = traitlets.Bool(default_value=False).tag(sync=True)
     tooltips = traitlets.Dict(default_value=None, allow_none=True).tag(sync=True)
-    _clear_tooltips = traitlets.Bool(default_value=False).tag(sync=True)
-    _set_color = traitlets.Dict(default_value=None, allow_none=True).tag(sync=True)
-    _reset = traitlets.Dict(allow_none=True, default_value=None).tag(sync=True)
-    _update = traitlets.Dict(allow_none=True, default_value=None).tag(sync=True)
-
-    _args = traitlets.Dict().tag(sync=True)
 
     mouseover_event = traitlets.Dict().tag(sync=True)
+    mouseover_rate = traitlets.Float(20.0).tag(sync=True)
+    mouseover_dropped = traitlets.Int(0).tag(sync=True)
     mouseout_event = traitlets.Bool().tag(sync=True)
     click_event = traitlets.Dict().tag(sync=True)
     click_focus = traitlets.Bool(True).tag(sync=True)
 
+    # trajectory frames added with `add_frames` or opened with `open_frames`
+    frame_count = traitlets.Int(0).tag(sync=True)
+    # index of the frame shown, set to seek; updated a few times per second
+    # while playing
+    frame = traitlets.Int(0).tag(sync=True)
+    playing = traitlets.Bool(False).tag(sync=True)
+    fps = traitlets.Float(10.0).tag(sync=True)
+    # start over after the last frame, else wait there for new frames
+    loop = traitlets.Bool(True).tag(sync=True)
+
     def __init__(self, theme="light", **kwargs):
-        _css = THEMES[theme]["css"]
+        self._applied_colors = _AppliedColors()
+        self._compressed = CompressionCache()
+        self._batch_commands = None
+        self._command_id = 0
+        self._screenshots = Screenshots(self)
+        self._frames = Frames(self)
         bg_color = kwargs.pop("bg_color", THEMES[theme]["bg_color"])
-        super().__init__(_css=_css, bg_color=bg_color, **kwargs)
+        super().__init__(
+            styles=[THEMES[theme]["stylesheet"]], bg_color=bg_color, **kwargs
+        )
+        self.on_msg(self._screenshots.handle)
+        self.on_msg(self._frames.handle)
+        self.on_msg(self._handle_load_complete)
+
+    @traitlets.observe("molecule_id", "custom_data", "visual_style", "color_data")
+    def _clear_applied_colors(self, change):
+        # reloading the structure discards all colors in the frontend, and
+        # color_data replaces them
+        self._applied_colors.clear()
+
+    def _handle_load_complete(self, widget, content, buffers):
+        # a view (re)loaded its structure, e.g. a view displayed later, and
+        # shows none of the colors applied before
+        if content.get("type") == "load_complete":
+            self._applied_colors.clear()
+
+    @traitlets.observe("molecule_id", "custom_data")
+    def _clear_frames(self, change):
+        # frames are coordinates of the previous structure's atoms
+        if len(self._frames):
+            self._frames.clear()
+
+    @traitlets.validate("custom_data")
+    def _validate_custom_data(self, proposal):
+        custom_data = proposal["value"]
+        if custom_data is None or isinstance(
+            custom_data.get("data"), (str, type(None))
+        ):
+            return custom_data
+        try:
+            data = _as_buffer(custom_data["data"])
+        except (TypeError, ValueError) as e:
+            raise traitlets.TraitError(f"Invalid custom_data['data']: {e}") from e
+        return {**custom_data, "data": data}
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Queue commands and send them to the frontend in a single message.
+
+        Commands are applied in order within one animation frame. Trait changes made
+        inside the block are synced together in one state update.
+
+        Example:
+            with viewer.batch():
+                viewer.color(data)
+                viewer.focus(focus_data)
+        """
+        if self._batch_commands is not None:
+            # nested batch; commands are sent by the outer one
+            yield
+            return
+
+        self._batch_commands = []
+        try:
+            with self.hold_sync():
+                yield
+                if self._batch_commands:
+                    self._send_commands(self._batch_commands)
+        finally:
+            self._batch_commands = None
+
+    def _command(self, name: str, data=None):
+        """Send a command to the frontend, or queue it inside a batch."""
+        self._command_id += 1
+        command = {"id": self._command_id, "name": name, "data": data}
+        if self._batch_commands is not None:
+            self._batch_commands.append(command)
+        else:
+            self._send_commands([command])
+
+    def _send_commands(self, commands: list[dict]):
+        commands, buffer_paths, buffers = _separate_buffers(commands)
+        self.send(
+            {"type": "commands", "commands": commands, "buffer_paths": buffer_paths},
+            buffers,
+        )
+
+    def events(
+        self,
+        kinds: Iterable[str] = tuple(EVENT_TRAITS),
+        maxsize: int = 100,
+        overflow: Overflow = "drop-oldest",
+    ) -> EventStream:
+        """
+        Stream of viewer events for use with `async for`.
+
+        Args:
+            kinds: Event kinds to receive: "click", "mouseover" and/or "mouseout".
+            maxsize: Maximum number of buffered events.
+            overflow: "drop-oldest" to drop the oldest buffered event when full, or
+                "latest-only" to only keep the most recent event.
+
+        Events are delivered while the kernel processes comm messages, so consume
+        the stream in a task rather than awaiting it in the cell itself:
+
+            async def consume():
+                with viewer.events(["click"]) as events:
+                    async for event in events:
+                        print(event.kind, event.data)
+
+            task = asyncio.ensure_future(consume())
+        """
+        names = event_traits(kinds)
+
+        def handler(change):
+            stream.put(make_event(change["name"], change["new"]))
+
+        stream = EventStream(lambda: self.unobserve(handler, names), maxsize, overflow)
+        self.observe(handler, names)
+        return stream
+
+    def on_event(
+        self,
+        callback: Callable[[Event], Any],
+        kinds: Iterable[str] = tuple(EVENT_TRAITS),
+        threaded: bool = False,
+        executor: Optional[Executor] = None,
+    ) -> Callable[[], None]:
+        """
+        Call `callback(event)` for viewer events.
+
+        With `threaded`, callbacks are submitted to a shared thread pool (or to
+        `executor`) so that slow callbacks do not block the comm message handler.
+
+        Returns a function which removes the callback.
+        """
+        names = event_traits(kinds)
+        dispatch = dispatcher(callback, threaded, executor)
+
+        def handler(change):
+            dispatch(make_event(change["name"], change["new"]))
+
+        self.observe(handler, names)
+        return lambda: self.unobserve(handler, names)
 
     def color(
         self,
@@ -181,36 +618,145 @@ class PDBeMolstar(anywidget.AnyWidget):
         non_selected_color=None,
         keep_colors=False,
         keep_representations=False,
+        delta=True,
     ) -> None:
         """
         Alias for PDBE Molstar's `select` method.
 
         See https://github.com/molstar/pdbe-molstar/wiki/3.-Helper-Methods for parameter
         details
+
+        When `delta` is True and `data` selects the same residues as the previous call,
+        only entries whose color changed are sent and applied on top of the current
+        colors. Pass `delta=False` to send all entries, e.g. to restore colors the
+        viewer lost in a way the widget cannot track.
         """
+        options = {
+            "nonSelectedColor": non_selected_color,
+            "keepRepresentations": keep_representations,
+        }
+        changed = None
+        if keep_colors:
+            self._applied_colors.clear()
+        else:
+            keys = [{k: v for k, v in q.items() if k != "color"} for q in data]
+            colors = [q.get("color") for q in data]
+            if delta:
+                changed = self._applied_colors.changed(options, keys, colors)
+            else:
+                self._applied_colors.record(options, keys, colors)
+
+        if changed is not None:
+            if not changed:
+                return
+            data = [data[i] for i in changed]
+            non_selected_color, keep_colors = None, True
 
-        self.color_data = {
+        color_data = {
             "data": data,
             "nonSelectedColor": non_selected_color,
             "keepColors": keep_colors,
             "keepRepresentations": keep_representations,
         }
-        self.color_data = None
+        self._command("select", color_data)
+
+    def color_arrays(
+        self,
+        residue_numbers,
+        colors,
+        chains=None,
+        auth: bool = False,
+        non_selected_color=None,
+        keep_colors=False,
+        keep_representations=False,
+        delta=True,
+    ) -> None:
+        """
+        Color residues from arrays instead of a list of `QueryParam` dicts.
+
+        Args:
+            residue_numbers: Array of residue numbers.
+            colors: Array of shape (n, 3) or (n, 4) with uint8 RGB(A) values.
+            chains: Chain id per residue, a single chain id for all residues, or None.
+            auth: Interpret residue numbers and chains as author instead of label ids.
+            non_selected_color: Color of residues not in `residue_numbers`.
+            keep_colors: Keep colors from previous calls.
+            keep_representations: Keep representations from previous calls.
+            delta: Only send residues whose color changed since the previous call
+                with the same residues and options. False sends all residues.
+        """
+        residue_numbers, colors, chains = _residue_color_arrays(
+            residue_numbers, colors, chains
+        )
+        options = {
+            "auth": auth,
+            "nonSelectedColor": non_selected_color,
+            "keepRepresentations": keep_representations,
+        }
+        changed = None
+        if keep_colors:
+            self._applied_colors.clear()
+        elif delta:
+            changed = self._applied_colors.changed(
+                options, (residue_numbers, chains), colors
+            )
+        else:
+            self._applied_colors.record(options, (residue_numbers, chains), colors)
+
+        if changed is not None:
+            if not changed:
+                return
+            residue_numbers, colors = residue_numbers[changed], colors[changed]
+            chains = None if chains is None else chains[changed]
+            non_selected_color, keep_colors = None, True
+
+        color_arrays = {
+            **_encode_residue_colors(residue_numbers, colors, chains, auth),
+            "nonSelectedColor": non_selected_color,
+            "keepColors": keep_colors,
+            "keepRepresentations": keep_representations,
+        }
+        self._command("select_arrays", color_arrays)
+
+    def tooltip_arrays(
+        self,
+        residue_numbers,
+        tooltips,
+        chains=None,
+        auth: bool = False,
+        ranges: bool = True,
+    ) -> None:
+        """
+        Set residue tooltips from arrays instead of a list of `QueryParam` dicts.
+
+        Tooltip strings are deduplicated and sent as indices into a table of unique
+        strings.
+
+        Args:
+            residue_numbers: Array of residue numbers.
+            tooltips: Tooltip string per residue.
+            chains: Chain id per residue, a single chain id for all residues, or None.
+            auth: Interpret residue numbers and chains as author instead of label ids.
+            ranges: Merge consecutive residues with the same tooltip into a single
+                residue range selection.
+        """
+        self._command(
+            "tooltips_arrays",
+            _encode_residue_tooltips(residue_numbers, tooltips, chains, auth, ranges),
+        )
 
     def focus(self, data: list[QueryParam]):
-        self._focus = data
-        self._focus = None
+        self._command("focus", data)
 
     def clear_highlight(self):
-        self._clear_highlight = not self._clear_highlight
+        self._command("clear_highlight")
 
     def clear_tooltips(self):
-        self._clear_tooltips = not self._clear_tooltips
+        self._command("clear_tooltips")
 
     def clear_selection(self, structure_number=None):
-        # move payload to the traitlet which triggers the callback
-        self._args = {"number": structure_number}
-        self._clear_selection = not self._clear_selection
+        self._applied_colors.clear()
+        self._command("clear_selection", {"number": structure_number})
 
     # todo make two traits: select_color, hightlight_color
     def set_color(
@@ -222,13 +768,142 @@ class PDBeMolstar(anywidget.AnyWidget):
         if select is not None:
             data["select"] = select
         if data:
-            self._set_color = data
-            self._set_color = None
+            self._command("set_color", data)
 
     def reset(self, data: ResetParam):
-        self._reset = data
-        self._reset = None
+        self._applied_colors.clear()
+        self._command("reset", data)
 
     def update(self, data):
-        self._update = data
-        self._update = None
+        self._applied_colors.clear()
+        self._command("update", data)
+
+    def add_frames(self, coordinates) -> None:
+        """
+        Add trajectory frames of the loaded structure.
+
+        The frontend shows a frame by replacing the coordinates of the loaded
+        structure, keeping its representations. Seek by setting `frame`, and
+        play with `playing`, `fps` and `loop`. Frames are cleared when another
+        structure is loaded.
+
+        Args:
+            coordinates: Atom positions in Ångström of one frame, shape
+                (n_atoms, 3), or of several, shape (n_frames, n_atoms, 3), in
+                the atom order of the structure's file. Sent as float32.
+        """
+        self._frames.add(coordinates)
+
+    def open_frames(self, source: "Union[str, os.PathLike, FrameSource]", **kwargs):
+        """
+        Play trajectory frames of a file on the loaded structure.
+
+        The file is memory-mapped and frames are read when the frontend asks
+        for them, around the frame it shows, so that files larger than memory
+        can be played. Frames are read ahead on a background thread.
+
+        Args:
+            source: Path of a `.dcd`, multi-model `.pdb` or raw float32 file,
+                or a frame source of `ipymolstar.frames`. The source is closed
+                when the frames are cleared.
+            **kwargs: Passed to `ipymolstar.frames.open_frames`, e.g. `n_atoms`
+                for raw files.
+        """
+        try:
+            from ipymolstar.frames import FrameSource, open_frames
+        except ImportError:
+            msg = "Trajectory frames require the numpy package to be installed"
+            raise ImportError(msg)
+
+        if not isinstance(source, FrameSource):
+            source = open_frames(source, **kwargs)
+        self._frames.open(source)
+
+    def clear_frames(self):
+        """Remove all trajectory frames and show the structure's own coordinates."""
+        self._frames.clear()
+
+    def screenshot(
+        self,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        transparent: bool = False,
+        supersample: int = 1,
+    ) -> "Future[bytes]":
+        """
+        Render the current view to a PNG image.
+
+        Args:
+            width: Image width in pixels, by default the width of the viewer.
+            height: Image height in pixels, by default the height of the viewer.
+            transparent: Render without background.
+            supersample: Render at this multiple (1-4) of the size and scale
+                down, for smoother edges.
+
+        Returns:
+            Future of the PNG bytes. The frontend's reply is only handled once
+            the kernel processes comm messages, after the running cell, so
+            waiting for it in the cell itself (blocking, or awaiting at the top
+            level) never returns. Wait for it in a task, or in a later cell:
+
+                async def save():
+                    png = await asyncio.wrap_future(viewer.screenshot())
+                    Path("view.png").write_bytes(png)
+
+                task = asyncio.ensure_future(save())
+        """
+        return self._screenshots.request(width, height, transparent, supersample)
+
+    def screenshots(
+        self,
+        structures: Iterable[Union[str, dict]],
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        transparent: bool = False,
+        supersample: int = 1,
+        concurrency: int = 2,
+    ) -> AsyncIterator[bytes]:
+        """
+        Render a sequence of structures with this viewer, for use with `async for`.
+
+        Structures are given as `molecule_id`s or `custom_data` dicts and are
+        rendered in turn, yielding PNG images in order. Up to `concurrency`
+        structures are sent ahead, such that the frontend downloads the next
+        structures while rendering the current one. Afterwards the viewer shows
+        its own structure again, without the colors applied before.
+
+        Images arrive while the kernel processes comm messages, so consume them
+        in a task rather than in the cell itself:
+
+            async def render():
+                return [png async for png in viewer.screenshots(["1qyn", "6vsb"])]
+
+            task = asyncio.ensure_future(render())
+
+        See `screenshot` for the other arguments.
+        """
+        # loading the structures and restoring the viewer discards its colors
+        self._applied_colors.clear()
+
+        def load(structure):
+            if isinstance(structure, str):
+                return {"molecule_id": structure}
+            custom_data = self._validate_custom_data({"value": structure})
+            return {
+                "custom_data": compress_custom_data(
+                    custom_data,
+                    self.compression,
+                    self.compression_threshold,
+                    self.compress_binary,
+                )
+            }
+
+        return self._screenshots.batch(
+            structures,
+            load,
+            concurrency,
+            width=width,
+            height=height,
+            transparent=transparent,
+            supersample=supersample,
+        )
@@ -0,0 +1,106 @@
+import asyncio
+import collections
+import itertools
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+
+# supersampled images are rendered at up to this multiple of their size
+MAX_SUPERSAMPLE = 4
+
+
+class Screenshots:
+    """
+    Screenshot requests of a widget, resolved by the frontend's replies.
+
+    Requests are rendered by the frontend one at a time and in order. A request
+    can carry data to load first (`load`), which the frontend starts preparing
+    (downloading, decompressing) as soon as the request arrives. The viewer's
+    own data is restored once, when a batch ends.
+    """
+
+    def __init__(self, widget):
+        self._widget = widget
+        self._pending: dict[int, Future] = {}
+        self._ids = itertools.count(1)
+
+    def request(
+        self,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        transparent: bool = False,
+        supersample: int = 1,
+        load: Optional[dict] = None,
+    ) -> "Future[bytes]":
+        for name, value in (("width", width), ("height", height)):
+            if value is not None and (not isinstance(value, int) or value <= 0):
+                raise ValueError(f"{name} must be a positive integer, got {value!r}")
+        if supersample not in range(1, MAX_SUPERSAMPLE + 1):
+            raise ValueError(
+                f"supersample must be an integer from 1 to {MAX_SUPERSAMPLE}"
+            )
+
+        # binary values of `load` are sent as comm buffers
+        from ipymolstar.pdbemolstar import _separate_buffers
+
+        load, buffer_paths, buffers = _separate_buffers(load)
+        request_id = next(self._ids)
+        future: Future = Future()
+        self._pending[request_id] = future
+        self._widget.send(
+            {
+                "type": "screenshot",
+                "id": request_id,
+                "width": width,
+                "height": height,
+                "transparent": transparent,
+                "supersample": supersample,
+                "load": load,
+                "buffer_paths": buffer_paths,
+            },
+            buffers,
+        )
+        return future
+
+    def handle(self, widget, content, buffers) -> None:
+        if content.get("type") != "screenshot":
+            return
+        future = self._pending.pop(content["id"], None)
+        if future is None:
+            return
+        if content.get("error"):
+            future.set_exception(RuntimeError(f"Screenshot failed: {content['error']}"))
+        else:
+            future.set_result(bytes(buffers[0]))
+
+    async def batch(
+        self,
+        items: Iterable[Any],
+        load: Callable[[Any], dict],
+        concurrency: int = 2,
+        **kwargs,
+    ) -> AsyncIterator[bytes]:
+        """Screenshots of `items`, loaded with `load(item)`, in order."""
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        items = iter(items)
+        pending: collections.deque = collections.deque()
+
+        def send(n: int):
+            for item in itertools.islice(items, n):
+                pending.append(self.request(load=load(item), **kwargs))
+
+        try:
+            send(concurrency)
+            while pending:
+                future = pending.popleft()
+                try:
+                    png = await asyncio.wrap_future(future)
+                except BaseException:
+                    for other in pending:
+                        other.cancel()
+                    raise
+                send(1)
+                yield png
+        finally:
+            # the frontend shows the viewer's own data again
+            self._widget.send({"type": "screenshot_end"})
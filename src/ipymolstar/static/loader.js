@@ -0,0 +1,93 @@
+// Loads a widget's module and stylesheets by content hash, see
+// `ipymolstar.assets.HashedAssetWidget`. Contents are requested from the
+// kernel once per page and shared by all widgets, unless they are included
+// in the widget's state (`ipymolstar.assets.inline_assets`).
+const assets = (globalThis.__ipymolstarAssets ??= new Map());
+
+// milliseconds after which a widget still waiting for the kernel says so; the
+// kernel may be busy, or there is none, as for widgets rendered from saved
+// widget state
+const NOTICE_TIMEOUT = 10000;
+
+function request(model, hash) {
+  const inline = model.get("_asset_contents")?.[hash];
+  if (inline !== undefined) {
+    return Promise.resolve(inline);
+  }
+  return new Promise((resolve) => {
+    const onMessage = (msg, buffers) => {
+      if (msg.type !== "ipymolstar:asset" || msg.hash !== hash) {
+        return;
+      }
+      model.off("msg:custom", onMessage);
+      resolve(new TextDecoder().decode(buffers[0]));
+    };
+    model.on("msg:custom", onMessage);
+    model.send({ type: "ipymolstar:asset", hash });
+  });
+}
+
+function load(model, hash, evaluate) {
+  if (!assets.has(hash)) {
+    const loading = request(model, hash)
+      .then(evaluate)
+      .catch((error) => {
+        assets.delete(hash);
+        throw error;
+      });
+    assets.set(hash, loading);
+  }
+  return assets.get(hash);
+}
+
+async function evaluateModule(source) {
+  const url = URL.createObjectURL(new Blob([source], { type: "text/javascript" }));
+  try {
+    return await import(url);
+  } finally {
+    URL.revokeObjectURL(url);
+  }
+}
+
+function evaluateStyle(source) {
+  const style = document.createElement("style");
+  style.textContent = source;
+  document.head.appendChild(style);
+}
+
+function notice(el, text) {
+  const message = document.createElement("div");
+  message.textContent = text;
+  message.style.padding = "1em";
+  message.style.color = "#a94442";
+  el.appendChild(message);
+  return message;
+}
+
+async function render({ model, el }) {
+  let waiting = null;
+  const timer = setTimeout(() => {
+    waiting = notice(
+      el,
+      "ipymolstar: waiting for the kernel to send the widget code. Widgets shown " +
+        "without a running kernel need to be exported within " +
+        "`ipymolstar.assets.inline_assets()`."
+    );
+  }, NOTICE_TIMEOUT);
+  let module;
+  try {
+    [module] = await Promise.all([
+      load(model, model.get("_module_hash"), evaluateModule),
+      ...model.get("_style_hashes").map((hash) => load(model, hash, evaluateStyle)),
+    ]);
+  } catch (error) {
+    notice(el, `ipymolstar: loading the widget failed: ${error}`);
+    throw error;
+  } finally {
+    clearTimeout(timer);
+    waiting?.remove();
+  }
+  return module.default.render({ model, el });
+}
+
+export default { render };
@@ -0,0 +1,78 @@
+from typing import Any, Optional
+
+# frames are sent in messages of up to about this many bytes
+MESSAGE_SIZE = 16 * 1024**2
+
+
+class Frames:
+    """
+    Trajectory frames of a widget, read from a frame source (`ipymolstar.frames`).
+
+    Frames added in python are kept in memory, frames of files are read ahead
+    on a background thread. Either are only sent when the frontend asks for
+    them, which it does for a window around the frame it shows within a byte
+    budget, such that long trajectories are not all kept in browser memory.
+    """
+
+    def __init__(self, widget):
+        self._widget = widget
+        self._source = None
+        self._prefetcher = None
+
+    def __len__(self) -> int:
+        return 0 if self._source is None else len(self._source)
+
+    @property
+    def n_atoms(self) -> Optional[int]:
+        return None if self._source is None else self._source.n_atoms
+
+    def add(self, coordinates: Any) -> None:
+        try:
+            from ipymolstar.frames import ArrayFrames
+        except ImportError:
+            msg = "Trajectory frames require the numpy package to be installed"
+            raise ImportError(msg)
+
+        if self._source is None:
+            self._source = ArrayFrames()
+        elif not isinstance(self._source, ArrayFrames):
+            raise ValueError("Frames were opened from a file, clear them to add frames")
+        self._source.append(coordinates)
+        self._widget.frame_count = len(self._source)
+
+    def open(self, source) -> None:
+        from ipymolstar.frames import Prefetcher
+
+        self.clear()
+        self._source = source
+        self._prefetcher = Prefetcher(source)
+        self._widget.frame_count = len(source)
+
+    def clear(self) -> None:
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+        if self._source is not None:
+            self._source.close()
+        self._source = self._prefetcher = None
+        with self._widget.hold_sync():
+            self._widget.playing = False
+            self._widget.frame = 0
+            self._widget.frame_count = 0
+
+    def send(self, start: int, stop: int) -> None:
+        """Send frames `start` to `stop` to the frontend."""
+        stop = min(stop, len(self))
+        if start >= stop:
+            return
+        read = self._source.read if self._prefetcher is None else self._prefetcher.get
+        per_message = max(1, MESSAGE_SIZE // (self.n_atoms * 3 * 4))
+        for first in range(start, stop, per_message):
+            frames = [read(i) for i in range(first, min(first + per_message, stop))]
+            self._widget.send(
+                {"type": "frames", "start": first, "n_atoms": self.n_atoms},
+                [memoryview(frame).cast("B") for frame in frames],
+            )
+
+    def handle(self, widget, content, buffers) -> None:
+        if content.get("type") == "get_frames":
+            self.send(content["start"], content["stop"])
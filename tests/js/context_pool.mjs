@@ -0,0 +1,210 @@
+// Attaches 5 viewers to a context pool of 2 against minimal DOM and plugin
+// stand-ins, and checks that only the most recently used viewers keep a live
+// context and that interacting with a parked viewer restores it. Viewers
+// scrolled out of view, on a hidden page or idle stop rendering.
+// Run with `node tests/js/context_pool.mjs`; exits non-zero on failure.
+import assert from "node:assert/strict";
+import { readFileSync, writeFileSync, mkdtempSync } from "node:fs";
+import { tmpdir } from "node:os";
+import { join } from "node:path";
+import { pathToFileURL } from "node:url";
+
+class Element extends EventTarget {
+  constructor() {
+    super();
+    this.style = {};
+    this.parentElement = null;
+  }
+
+  insertBefore(child) {
+    child.parentElement = this;
+  }
+
+  remove() {
+    this.parentElement = null;
+  }
+
+  toDataURL() {
+    return "data:image/png;base64,";
+  }
+}
+
+globalThis.document = Object.assign(new EventTarget(), {
+  hidden: false,
+  createElement: () => new Element(),
+});
+globalThis.requestAnimationFrame = (callback) => setTimeout(callback, 0);
+
+// reports visibility changes of observed elements on `intersect(target, visible)`
+class IntersectionObserver {
+  constructor(callback) {
+    this.callback = callback;
+    this.targets = new Set();
+    IntersectionObserver.instance = this;
+  }
+
+  observe(target) {
+    this.targets.add(target);
+  }
+
+  unobserve(target) {
+    this.targets.delete(target);
+  }
+
+  intersect(target, isIntersecting) {
+    if (this.targets.has(target)) this.callback([{ target, isIntersecting }]);
+  }
+}
+globalThis.IntersectionObserver = IntersectionObserver;
+
+class Subject {
+  constructor() {
+    this.observers = new Set();
+  }
+
+  subscribe(observer) {
+    this.observers.add(observer);
+    return { unsubscribe: () => this.observers.delete(observer) };
+  }
+
+  next() {
+    [...this.observers].forEach((observer) => observer());
+  }
+}
+
+function fakePlugin() {
+  const canvas = new Element();
+  canvas.parentElement = new Element();
+  const contextRestored = new Subject();
+  const plugin = {
+    lost: false,
+    paused: false,
+    canvas3d: {
+      pause: () => (plugin.paused = true),
+      animate: () => (plugin.paused = false),
+      requestDraw() {},
+      didDraw: new Subject(),
+    },
+    canvas3dContext: { canvas, contextRestored, webgl: { gl: {} } },
+  };
+  const extension = {
+    loseContext: () => (plugin.lost = true),
+    // the context is restored asynchronously
+    restoreContext: () =>
+      setTimeout(() => {
+        plugin.lost = false;
+        contextRestored.next();
+      }, 0),
+  };
+  plugin.canvas3dContext.webgl.gl.getExtension = () => extension;
+  return plugin;
+}
+
+async function load(name) {
+  const module = join(mkdtempSync(join(tmpdir(), "ipymolstar-")), `${name}.mjs`);
+  writeFileSync(module, readFileSync(new URL(`../../js/${name}.js`, import.meta.url)));
+  return import(pathToFileURL(module));
+}
+const { PooledViewer, contextPool, syncLiveContexts, syncRenderState } = await load("context_pool");
+const { observeVisibility } = await load("visibility");
+
+const state = { live_contexts: 0 };
+let saves = 0;
+const model = {
+  get: (name) => state[name],
+  set: (name, value) => (state[name] = value),
+  save_changes: () => saves++,
+};
+const unsyncLiveContexts = syncLiveContexts(model);
+// live_contexts is updated once changes of the pool settle
+const settled = () => new Promise((resolve) => setTimeout(resolve, 150));
+contextPool.resize(2);
+
+const viewers = [];
+const plugins = [];
+for (let i = 0; i < 5; i++) {
+  const viewer = new PooledViewer(new Element());
+  const plugin = fakePlugin();
+  viewer.attach(plugin);
+  viewers.push(viewer);
+  plugins.push(plugin);
+}
+
+const lost = () => plugins.map((plugin) => plugin.lost);
+assert.deepEqual(lost(), [true, true, true, false, false]);
+assert.deepEqual(plugins.map((plugin) => plugin.paused), [true, true, true, false, false]);
+await settled();
+assert.equal(state.live_contexts, 2);
+assert.equal(saves, 1);
+assert.ok(viewers[0].parked && !viewers[4].parked);
+
+// interacting with a parked viewer restores it and parks the least recently used one
+viewers[0].container.dispatchEvent(new Event("pointerdown"));
+await new Promise((resolve) => setTimeout(resolve, 10));
+assert.deepEqual(lost(), [false, true, true, true, false]);
+assert.equal(plugins[0].paused, false);
+await settled();
+assert.equal(state.live_contexts, 2);
+assert.equal(saves, 1);
+
+// disposing a live viewer frees its slot
+viewers[4].dispose();
+await settled();
+assert.equal(state.live_contexts, 1);
+
+// size 0 keeps all contexts live
+contextPool.resize(0);
+viewers.slice(1, 4).forEach((viewer) => viewer.use());
+await settled();
+assert.deepEqual(lost(), [false, false, false, false, false]);
+assert.equal(state.live_contexts, 4);
+unsyncLiveContexts();
+
+// the render loop only runs while the viewer is visible
+const changes = [];
+const unobserve = observeVisibility(viewers[1].container, (visible) => {
+  changes.push(visible);
+  viewers[1].setVisible(visible);
+});
+IntersectionObserver.instance.intersect(viewers[1].container, false);
+assert.equal(plugins[1].paused, true);
+IntersectionObserver.instance.intersect(viewers[1].container, true);
+assert.equal(plugins[1].paused, false);
+unobserve();
+IntersectionObserver.instance.intersect(viewers[1].container, false);
+assert.deepEqual(changes, [false, true]);
+
+// rendering pauses after the idle timeout and when the page is hidden, and is
+// resumed by the next interaction or update
+const viewer = viewers[2];
+const reports = [];
+const listeners = {};
+const renderModel = {
+  get: () => 0.02,
+  set() {},
+  save_changes() {},
+  on: (name, callback) => (listeners[name] = callback),
+  off: (name) => delete listeners[name],
+};
+syncRenderState(renderModel, viewer);
+viewer.onStateChange = (state, stats) => reports.push([state, stats]);
+plugins[2].canvas3d.didDraw.next();
+plugins[2].canvas3d.didDraw.next();
+await new Promise((resolve) => setTimeout(resolve, 50));
+assert.equal(viewer.state, "idle");
+assert.equal(plugins[2].paused, true);
+viewer.container.dispatchEvent(new Event("pointermove"));
+assert.equal(viewer.state, "running");
+assert.equal(plugins[2].paused, false);
+document.hidden = true;
+document.dispatchEvent(new Event("visibilitychange"));
+assert.equal(viewer.state, "hidden");
+assert.equal(plugins[2].paused, true);
+document.hidden = false;
+document.dispatchEvent(new Event("visibilitychange"));
+assert.deepEqual(reports.map(([state]) => state), ["idle", "running", "hidden", "running"]);
+const [, stats] = reports.at(-1);
+assert.equal(stats.draws, 2);
+assert.ok(stats.paused_s > 0.02 && stats.draws_avoided > 0);
+
+console.log("ok");
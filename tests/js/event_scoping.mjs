@@ -0,0 +1,153 @@
+// Renders 20 PDBeMolstar widgets against a minimal DOM and plugin stand-in and
+// checks that an interaction in one viewer results in exactly one message.
+// Run with `node tests/js/event_scoping.mjs`; exits non-zero on failure.
+import assert from "node:assert/strict";
+import { readFileSync, writeFileSync, mkdtempSync } from "node:fs";
+import { tmpdir } from "node:os";
+import { join } from "node:path";
+import { pathToFileURL } from "node:url";
+
+class Element extends EventTarget {
+  constructor(parent = null) {
+    super();
+    this.parentNode = parent;
+    this.style = {};
+    this.children = [];
+  }
+
+  appendChild(child) {
+    child.parentNode = this;
+    this.children.push(child);
+  }
+
+  getContext() {
+    return { fillStyle: "#000000" };
+  }
+
+  // EventTarget does not bubble; re-dispatch along the ancestors like the DOM
+  dispatchEvent(event) {
+    let target = this;
+    while (target) {
+      EventTarget.prototype.dispatchEvent.call(target, cloneEvent(event));
+      target = target.parentNode;
+    }
+  }
+}
+
+function cloneEvent(event) {
+  const clone = new Event(event.type, { bubbles: true });
+  clone.eventData = event.eventData;
+  return clone;
+}
+
+const document = new Element();
+document.createElement = () => new Element();
+globalThis.document = document;
+
+class PDBeMolstarPlugin {
+  constructor() {
+    this.events = { loadComplete: { subscribe: () => ({ unsubscribe() {} }) } };
+    this.visual = {};
+    this.plugin = { dispose() {} };
+  }
+
+  render(target) {
+    this.target = target;
+  }
+
+  // pdbe-molstar dispatches its custom events on the render target
+  dispatch(type, eventData) {
+    const event = new Event(type, { bubbles: true });
+    event.eventData = eventData;
+    this.target.dispatchEvent(event);
+  }
+}
+const plugins = [];
+globalThis.window = {
+  PDBeMolstarPlugin: class extends PDBeMolstarPlugin {
+    constructor() {
+      super();
+      plugins.push(this);
+    }
+  },
+};
+
+class Model {
+  constructor() {
+    this.state = {
+      molecule_id: "1qyn",
+      structure_cache_size: 0,
+      context_pool_size: 0,
+      live_contexts: 0,
+      mouseover_rate: 0,
+      mouseover_dropped: 0,
+      mouseout_event: false,
+    };
+    this.messages = 0;
+  }
+
+  get(name) {
+    return this.state[name];
+  }
+
+  set(name, value) {
+    this.state[name] = value;
+  }
+
+  save_changes() {
+    this.messages++;
+  }
+
+  on() {}
+  off() {}
+}
+
+// replace the bundled plugin by the fake one; local modules are copied as .mjs,
+// without Mol* imports which are only used once a structure is loaded
+const read = (name) =>
+  readFileSync(new URL(`../../js/${name}.js`, import.meta.url), "utf8")
+    .replace(/from "\.\/(\w+)\.js"/g, 'from "./$1.mjs"')
+    .replace(/^import .* from "molstar.*$/gm, "");
+const source = read("pdbemolstar").replace(
+  /^import .* from "pdbe-molstar.*$/m,
+  "const { PDBeMolstarPlugin } = window;"
+);
+const directory = mkdtempSync(join(tmpdir(), "ipymolstar-"));
+const module = join(directory, "pdbemolstar.mjs");
+writeFileSync(module, source);
+for (const name of ["buffers", "colors", "context_pool", "screenshot", "trajectory", "visibility"]) {
+  writeFileSync(join(directory, `${name}.mjs`), read(name));
+}
+const widget = (await import(pathToFileURL(module))).default;
+
+const models = [];
+const cleanups = [];
+for (let i = 0; i < 20; i++) {
+  const model = new Model();
+  const el = new Element();
+  document.appendChild(el);
+  cleanups.push(await widget.render({ model, el }));
+  models.push(model);
+}
+// viewers are started asynchronously once visible; count messages from then on
+await new Promise((resolve) => setTimeout(resolve, 0));
+models.forEach((model) => (model.messages = 0));
+
+const total = () => models.reduce((sum, model) => sum + model.messages, 0);
+
+plugins[7].dispatch("PDB.molstar.click", { residueNumber: 42 });
+assert.equal(total(), 1);
+assert.equal(models[7].messages, 1);
+assert.deepEqual(models[7].state.click_event, { residueNumber: 42 });
+
+plugins[3].dispatch("PDB.molstar.mouseover", { residueNumber: 1 });
+plugins[3].dispatch("PDB.molstar.mouseout", {});
+assert.equal(total(), 3);
+assert.equal(models[3].messages, 2);
+
+// all listeners are released on teardown
+cleanups.forEach((cleanup) => cleanup());
+plugins.forEach((plugin) => plugin.dispatch("PDB.molstar.click", { residueNumber: 1 }));
+assert.equal(total(), 3);
+
+console.log("ok");
@@ -0,0 +1,235 @@
+// Plays trajectory frames against minimal Mol* and plugin stand-ins and checks
+// that frames are unpacked and requested once, that seeks while a frame is
+// being shown collapse to the latest one, that playback follows `fps`, `loop`
+// and new frames, that only a window of frames ahead is requested and kept,
+// and that a detached player shows nothing.
+// Run with `node tests/js/trajectory.mjs`; exits non-zero on failure.
+import assert from "node:assert/strict";
+import { readFileSync, writeFileSync, mkdtempSync } from "node:fs";
+import { tmpdir } from "node:os";
+import { join } from "node:path";
+import { pathToFileURL } from "node:url";
+
+globalThis.document = { hidden: false };
+let animationFrame = null;
+globalThis.requestAnimationFrame = (callback) => (animationFrame = callback);
+globalThis.cancelAnimationFrame = () => (animationFrame = null);
+
+// just enough of Mol* for the frame transform
+class Trajectory {
+  constructor(data, props) {
+    this.data = data;
+    this.label = props.label;
+  }
+}
+globalThis.molstar = {
+  SO: { Molecule: { Trajectory } },
+  PluginStateTransform: { BuiltIn: (definition) => (implementation) => ({ ...definition, ...implementation }) },
+  PD: { Text: (value) => value, Numeric: (value) => value },
+  Task: { create: (name, run) => run() },
+  Model: { trajectoryFromModelAndCoordinates: (model, coordinates) => ({ model, coordinates }) },
+  Coordinates: { create: (frames) => ({ frames }) },
+};
+
+const directory = mkdtempSync(join(tmpdir(), "ipymolstar-"));
+const read = (name) =>
+  readFileSync(new URL(`../../js/${name}.js`, import.meta.url), "utf8")
+    .replace(/from "\.\/(\w+)\.js"/g, 'from "./$1.mjs"')
+    .replace(/^import .* from "molstar.*$/gm, "");
+writeFileSync(join(directory, "buffers.mjs"), read("buffers"));
+writeFileSync(
+  join(directory, "trajectory.mjs"),
+  "const { SO, PluginStateTransform, PD, Task, Model, Coordinates } = globalThis.molstar;\n" +
+    read("trajectory")
+);
+const { TrajectoryPlayer } = await import(pathToFileURL(join(directory, "trajectory.mjs")));
+
+// applies inserted and updated frame transforms to the loaded trajectory,
+// recording the frame shown after each commit
+function fakePlugin() {
+  const topology = new Trajectory({ representative: "topology" }, { label: "1qyn" });
+  const cells = new Map();
+  const plugin = {
+    shown: [],
+    state: { data: { cells } },
+    managers: {
+      structure: {
+        hierarchy: { current: { trajectories: [{ cell: { transform: { ref: "parsed" } } }] } },
+      },
+    },
+    build() {
+      const ops = [];
+      const builder = {
+        to(ref) {
+          builder.target = ref;
+          return builder;
+        },
+        insert(transformer, params) {
+          builder.ref = "frame";
+          ops.push(() => cells.set("frame", { transformer, params }));
+          return builder;
+        },
+        update(params) {
+          ops.push(() => (cells.get(builder.target).params = params));
+          return builder;
+        },
+        async commit() {
+          await new Promise((resolve) => setTimeout(resolve, 0));
+          ops.forEach((op) => op());
+          const { transformer, params } = cells.get("frame");
+          const result = await transformer.apply({ a: topology, params });
+          plugin.shown.push(result.data === topology.data ? "topology" : result.data.coordinates.frames[0]);
+        },
+      };
+      return builder;
+    },
+  };
+  return plugin;
+}
+
+const state = { frame_count: 0, frame: 0, playing: false, fps: 10, loop: true };
+const sent = [];
+const model = {
+  get: (name) => state[name],
+  set: (name, value) => (state[name] = value),
+  save_changes() {},
+  send: (content) => sent.push(content),
+};
+const pooled = { visible: true, touch() {} };
+const settle = () => new Promise((resolve) => setTimeout(resolve, 5));
+
+// float32 xyz of `n` atoms per frame, atom i of frame f at (f, i, 10 + i)
+function frames(start, count, n = 4) {
+  return Array.from({ length: count }, (_, f) => {
+    const xyz = new Float32Array(n * 3);
+    for (let i = 0; i < n; i++) xyz.set([start + f, i, 10 + i], i * 3);
+    return new DataView(xyz.buffer);
+  });
+}
+
+const player = new TrajectoryPlayer(model, pooled);
+
+// frames received before the structure is loaded are kept, missing ones are
+// requested on load
+player.receive({ start: 0, n_atoms: 4 }, frames(0, 2));
+state.frame_count = 5;
+const plugin = fakePlugin();
+player.attach(plugin);
+assert.deepEqual(sent, [{ type: "get_frames", start: 2, stop: 5 }]);
+await settle();
+assert.equal(plugin.shown.length, 1);
+const [first] = plugin.shown;
+assert.deepEqual([...first.x], [0, 0, 0, 0]);
+assert.deepEqual([...first.y], [0, 1, 2, 3]);
+assert.deepEqual([...first.z], [10, 11, 12, 13]);
+
+// a missing frame is shown once it arrives; seeks while showing a frame
+// collapse to the latest
+player.seek(3);
+await settle();
+assert.equal(plugin.shown.length, 1);
+player.receive({ start: 2, n_atoms: 4 }, frames(2, 3));
+player.seek(1);
+player.seek(4);
+await settle();
+assert.deepEqual(plugin.shown.map((frame) => frame.x[0]), [0, 3, 4]);
+
+// new frames are not requested again
+state.frame_count = 6;
+player.receive({ start: 5, n_atoms: 4 }, frames(5, 1));
+player.sync();
+assert.equal(sent.length, 1);
+
+// playback advances at `fps` and starts over at the end
+state.playing = true;
+state.fps = 10;
+player.setPlaying();
+const step = async (now) => {
+  animationFrame(now);
+  await settle();
+};
+await step(1000);
+await step(1050);
+await step(1100);
+assert.deepEqual(plugin.shown.slice(3).map((frame) => frame.x[0]), [5, 0]);
+assert.equal(state.frame, 5);
+
+// without loop it waits at the end for new frames
+state.loop = false;
+for (let now = 1200; now < 1800; now += 100) {
+  await step(now);
+}
+assert.equal(plugin.shown.at(-1).x[0], 5);
+state.frame_count = 7;
+player.receive({ start: 6, n_atoms: 4 }, frames(6, 1));
+await step(1900);
+assert.equal(plugin.shown.at(-1).x[0], 6);
+
+// pausing reports the frame shown; clearing the frames shows the topology
+state.playing = false;
+player.setPlaying();
+assert.equal(state.frame, 6);
+assert.equal(animationFrame, null);
+state.frame_count = 0;
+player.sync();
+await settle();
+assert.equal(plugin.shown.at(-1), "topology");
+assert.equal(player.frames.size, 0);
+player.dispose();
+
+// of long trajectories, a window of frames ahead of the frame shown is
+// requested and kept within the byte budget: 8 frames of 4 atoms here
+Object.assign(state, { frame_count: 100, frame: 0, loop: true });
+sent.length = 0;
+const windowed = new TrajectoryPlayer(model, pooled);
+windowed.frameBytes = 4 * 12;
+windowed.cacheBytes = 8 * 4 * 12;
+const windowedPlugin = fakePlugin();
+windowed.attach(windowedPlugin);
+assert.deepEqual(sent, [{ type: "get_frames", start: 0, stop: 8 }]);
+windowed.receive({ start: 0, n_atoms: 4 }, frames(0, 8));
+await settle();
+
+// the window slides once half of it is missing
+for (let frame = 1; frame <= 4; frame++) {
+  windowed.seek(frame);
+  await settle();
+}
+assert.equal(sent.length, 2);
+assert.deepEqual(sent[1], { type: "get_frames", start: 8, stop: 12 });
+windowed.receive({ start: 8, n_atoms: 4 }, frames(8, 4));
+assert.equal(windowed.frames.size, 8);
+assert.deepEqual([...windowed.frames.keys()].sort((a, b) => a - b), [4, 5, 6, 7, 8, 9, 10, 11]);
+
+// seeking far requests the window from there
+windowed.seek(90);
+assert.deepEqual(sent[2], { type: "get_frames", start: 90, stop: 98 });
+
+// while detached (the plugin shows another structure) nothing is shown or
+// requested, until attached again
+windowed.receive({ start: 90, n_atoms: 4 }, frames(90, 8));
+await settle();
+const shownCount = windowedPlugin.shown.length;
+windowed.detach();
+windowed.seek(95);
+await settle();
+assert.equal(windowedPlugin.shown.length, shownCount);
+state.frame = 95;
+windowed.attach(windowedPlugin);
+await settle();
+assert.equal(windowedPlugin.shown.at(-1).x[0], 95);
+assert.equal(sent.length, 3);
+windowed.dispose();
+
+// frames received before frame_count is synced are kept; the budget applies
+// once the count is known
+Object.assign(state, { frame_count: 0, frame: 0 });
+const early = new TrajectoryPlayer(model, pooled);
+early.cacheBytes = 2 * 4 * 12;
+early.receive({ start: 0, n_atoms: 4 }, frames(0, 3));
+assert.deepEqual([...early.frames.keys()], [0, 1, 2]);
+state.frame_count = 4;
+early.receive({ start: 3, n_atoms: 4 }, frames(3, 1));
+assert.deepEqual([...early.frames.keys()].sort(), [0, 1]);
+early.dispose();
+console.log("ok");
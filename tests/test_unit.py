@@ -1,7 +1,23 @@
+import json
+import shutil
+import subprocess
+import time
+import zlib
+from pathlib import Path
+
+import pytest
+import traitlets
 from ipymolstar import PDBeMolstar, MolViewSpec
 from molviewspec import create_builder
 
 
+def capture_messages(widget) -> list:
+    """Collect custom messages sent by `widget` instead of sending them"""
+    messages = []
+    widget.send = lambda content, buffers=None: messages.append((content, buffers))
+    return messages
+
+
 def test_pdbemolstar():
     """Test the PDBeMolstar component"""
     # Create a PDBeMolstar instance
@@ -38,3 +54,772 @@ def test_molviewspec():
     assert isinstance(molview_spec, MolViewSpec), (
         "Failed to create MolViewSpec instance"
     )
+
+
+def test_custom_data_buffers():
+    """custom_data payloads are kept as zero-copy binary views"""
+    np = pytest.importorskip("numpy")
+
+    raw = b"data_1QYN\n"
+    arr = np.frombuffer(raw, dtype=np.uint8)
+    pdbe_molstar = PDBeMolstar(custom_data={"data": arr, "format": "cif"})
+    data = pdbe_molstar.custom_data["data"]
+    assert isinstance(data, memoryview)
+    assert data.obj is arr
+    assert bytes(data) == raw
+
+
+def test_color_arrays():
+    """Columnar residue colors are packed into typed binary buffers"""
+    np = pytest.importorskip("numpy")
+    from ipymolstar.pdbemolstar import _encode_residue_colors
+
+    colors = np.array([[255, 0, 0, 255], [0, 255, 0, 255], [0, 0, 255, 255]])
+    payload = _encode_residue_colors([10, 11, 12], colors, chains=["B", "A", "B"])
+    assert np.frombuffer(payload["residue_number"], dtype="<i4").tolist() == [
+        10,
+        11,
+        12,
+    ]
+    assert bytes(payload["color"]) == bytes([255, 0, 0, 0, 255, 0, 0, 0, 255])
+    assert payload["chain_table"] == ["A", "B"]
+    assert np.frombuffer(payload["chain_index"], dtype="<u2").tolist() == [1, 0, 1]
+
+    with pytest.raises(ValueError):
+        _encode_residue_colors([10, 11], colors)
+
+    pdbe_molstar = PDBeMolstar(molecule_id="1qyn")
+    messages = capture_messages(pdbe_molstar)
+    pdbe_molstar.color_arrays([10, 11, 12], colors, chains="A")
+    ((content, buffers),) = messages
+    command = content["commands"][0]
+    assert command["name"] == "select_arrays"
+    assert command["data"]["residue_number"] is None
+    assert [0, "data", "residue_number"] in content["buffer_paths"]
+    assert len(buffers) == 3
+
+
+def test_color_delta():
+    """Only residues whose color changed are sent on repeated color calls"""
+    pdbe_molstar = PDBeMolstar(molecule_id="1qyn")
+    messages = capture_messages(pdbe_molstar)
+
+    def sent(i):
+        return messages[i][0]["commands"][0]["data"]
+
+    red, blue = {"r": 255, "g": 0, "b": 0}, {"r": 0, "g": 0, "b": 255}
+    data = [{"residue_number": i, "color": red} for i in range(1, 11)]
+    pdbe_molstar.color(data, non_selected_color="#ffffff")
+    assert len(sent(0)["data"]) == 10
+
+    data[3] = {"residue_number": 4, "color": blue}
+    pdbe_molstar.color(data, non_selected_color="#ffffff")
+    assert sent(1)["data"] == [{"residue_number": 4, "color": blue}]
+    assert sent(1)["keepColors"] is True
+    assert sent(1)["nonSelectedColor"] is None
+
+    # unchanged colors are not sent at all
+    pdbe_molstar.color(data, non_selected_color="#ffffff")
+    assert len(messages) == 2
+
+    # reloading the structure requires a full update
+    pdbe_molstar.molecule_id = "6vsb"
+    pdbe_molstar.color(data, non_selected_color="#ffffff")
+    assert len(sent(2)["data"]) == 10
+
+    # as do coloring through color_data and a view (re)loading the structure
+    pdbe_molstar.color_data = {"data": [], "nonSelectedColor": None}
+    pdbe_molstar.color(data, non_selected_color="#ffffff")
+    assert len(sent(3)["data"]) == 10
+    pdbe_molstar._handle_custom_msg({"type": "load_complete"}, [])
+    pdbe_molstar.color(data, non_selected_color="#ffffff")
+    assert len(sent(4)["data"]) == 10
+
+    # without delta everything is sent, and later calls are incremental again
+    pdbe_molstar.color(data, non_selected_color="#ffffff", delta=False)
+    assert len(sent(5)["data"]) == 10
+    data[0] = {"residue_number": 1, "color": blue}
+    pdbe_molstar.color(data, non_selected_color="#ffffff")
+    assert sent(6)["data"] == [{"residue_number": 1, "color": blue}]
+
+
+def test_panel_color_delta():
+    """The panel component resends colors in full when the widget does"""
+    pytest.importorskip("panel")
+    from ipymolstar.panel import PDBeMolstar as PanelPDBeMolstar
+
+    pdbe_molstar = PanelPDBeMolstar(molecule_id="1qyn")
+    messages = []
+    pdbe_molstar._send_msg = messages.append
+
+    def sent(i):
+        return messages[i]["commands"][0]["data"]
+
+    red, blue = {"r": 255, "g": 0, "b": 0}, {"r": 0, "g": 0, "b": 255}
+    data = [{"residue_number": i, "color": red} for i in range(1, 11)]
+    pdbe_molstar.color(data)
+    pdbe_molstar.color(data)
+    assert len(messages) == 1
+
+    pdbe_molstar.color_data = {"data": [], "nonSelectedColor": None}
+    pdbe_molstar.color(data)
+    assert len(sent(1)["data"]) == 10
+    pdbe_molstar._handle_msg({"type": "load_complete"})
+    pdbe_molstar.color(data)
+    assert len(sent(2)["data"]) == 10
+
+    pdbe_molstar.color(data, delta=False)
+    assert len(sent(3)["data"]) == 10
+    data[0] = {"residue_number": 1, "color": blue}
+    pdbe_molstar.color(data)
+    assert sent(4)["data"] == [{"residue_number": 1, "color": blue}]
+
+
+def test_batch():
+    """Commands in a batch are sent as a single sequenced message"""
+    pdbe_molstar = PDBeMolstar(molecule_id="1qyn")
+    messages = capture_messages(pdbe_molstar)
+
+    pdbe_molstar.clear_tooltips()
+    with pdbe_molstar.batch():
+        pdbe_molstar.color([{"residue_number": 1, "color": {"r": 255, "g": 0, "b": 0}}])
+        pdbe_molstar.focus([{"residue_number": 1}])
+        pdbe_molstar.clear_selection()
+
+    assert len(messages) == 2
+    commands = messages[1][0]["commands"]
+    assert [c["name"] for c in commands] == ["select", "focus", "clear_selection"]
+    assert [c["id"] for c in commands] == [2, 3, 4]
+
+    pdbe_molstar.clear_highlight()
+    assert messages[2][0]["commands"][0]["id"] == 5
+
+    # commands are not kept in the widget state
+    state = pdbe_molstar.get_state()
+    assert not any(k.startswith(("_focus", "_clear", "_reset", "_args")) for k in state)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="requires node")
+def test_event_scoping():
+    """An interaction in one of 20 viewers sends exactly one message"""
+    script = Path(__file__).parent / "js" / "event_scoping.mjs"
+    result = subprocess.run(["node", str(script)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="requires node")
+def test_context_pool():
+    """Recently used viewers keep a live WebGL context, visible active ones render"""
+    script = Path(__file__).parent / "js" / "context_pool.mjs"
+    result = subprocess.run(["node", str(script)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+    for widget in (PDBeMolstar(context_pool_size=4), MolViewSpec(context_pool_size=4)):
+        state = widget.get_state()
+        assert state["context_pool_size"] == 4
+        assert state["live_contexts"] == 0
+
+    widget = MolViewSpec(idle_timeout=5)
+    widget.set_state({"render_state": "idle", "render_stats": {"paused_s": 5.0}})
+    assert widget.get_state()["idle_timeout"] == 5
+    assert widget.render_state == "idle"
+
+
+def test_event_stream():
+    """Viewer events can be consumed with async for, with bounded buffering"""
+    import asyncio
+
+    pdbe_molstar = PDBeMolstar(molecule_id="1qyn")
+
+    async def consume():
+        with pdbe_molstar.events(["click"], overflow="latest-only") as events:
+            for i in range(3):
+                pdbe_molstar.click_event = {"residueNumber": i}
+            event = await events.__anext__()
+            return event, events.dropped
+
+    event, dropped = asyncio.run(consume())
+    assert event.kind == "click"
+    assert event.data == {"residueNumber": 2}
+    assert dropped == 2
+
+    # the stream is unsubscribed once closed
+    assert not pdbe_molstar._trait_notifiers["click_event"]["change"]
+
+
+def test_tooltip_arrays():
+    """Tooltips are sent as a deduplicated string table and binary indices"""
+    np = pytest.importorskip("numpy")
+    from ipymolstar.pdbemolstar import _encode_residue_tooltips, _separate_buffers
+
+    residues = np.arange(1, 5001)
+    tooltips = np.where(residues % 10 == 0, "Covered", "No coverage")
+    payload = _encode_residue_tooltips(residues, tooltips, chains="A")
+    assert payload["tooltip_table"] == ["Covered", "No coverage"]
+    # runs of residues with the same tooltip are merged into ranges
+    assert np.frombuffer(payload["residue_number"], dtype="<i4")[:3].tolist() == [
+        1,
+        10,
+        11,
+    ]
+    assert np.frombuffer(payload["residue_end"], dtype="<i4")[:3].tolist() == [
+        9,
+        10,
+        19,
+    ]
+    assert np.frombuffer(payload["tooltip_index"], dtype="<u4")[:3].tolist() == [
+        1,
+        0,
+        1,
+    ]
+
+    state, _, buffers = _separate_buffers(payload)
+    compact = len(json.dumps(state)) + sum(memoryview(b).nbytes for b in buffers)
+    verbose = len(
+        json.dumps(
+            {
+                "data": [
+                    {"residue_number": int(r), "tooltip": t}
+                    for r, t in zip(residues, tooltips)
+                ]
+            }
+        )
+    )
+    assert compact * 10 < verbose
+
+
+def test_molviewspec_patch():
+    """Changes to msvj_data are sent as a patch of the state tree"""
+    from ipymolstar.molviewspec import _apply_patch, _diff_tree
+
+    def state(color, label=None):
+        builder = create_builder()
+        representation = (
+            builder.download(url="https://files.rcsb.org/download/1qyn.pdb")
+            .parse(format="pdb")
+            .model_structure()
+            .component()
+            .representation()
+        )
+        representation.color(color=color)
+        if label:
+            representation.color(color="red", selector={"label_seq_id": 12})
+        return builder.get_state().dumps()
+
+    old, new = json.loads(state("blue")), json.loads(state("green", label=True))
+    assert _apply_patch(json.loads(state("blue")), _diff_tree(old, new)) == new
+    assert (
+        _apply_patch(json.loads(state("green", label=True)), _diff_tree(new, old))
+        == old
+    )
+
+    widget = MolViewSpec(msvj_data=state("blue"))
+    messages = capture_messages(widget)
+    full_syncs = []
+    widget._send = lambda msg, buffers=None: full_syncs.append(msg)
+
+    widget.msvj_data = state("green")
+    ((content, _),) = messages
+    assert content["type"] == "patch"
+    ops = {tuple(op["path"][-2:]): op["value"] for op in content["ops"]}
+    assert ops[("params", "color")] == "green"
+    assert len(json.dumps(content)) < len(widget.msvj_data) / 2
+    assert not full_syncs
+
+    # unparseable documents are synced in full
+    widget.msvj_data = "not json"
+    assert full_syncs[-1]["state"] == {"msvj_data": "not json"}
+    assert len(messages) == 1
+
+
+def test_molviewspec_camera():
+    """The camera is a separate trait and does not resend the scene"""
+    widget = MolViewSpec(msvj_data="{}")
+    sent = []
+    widget._send = lambda msg, buffers=None: sent.append(msg)
+
+    widget.set_camera(
+        target=(0, 0, 0), position=(0, 0, 100), transition_duration_ms=500
+    )
+    (msg,) = sent
+    assert msg["state"] == {
+        "camera": {
+            "target": [0.0, 0.0, 0.0],
+            "position": [0.0, 0.0, 100.0],
+            "up": [0.0, 1.0, 0.0],
+            "transition_duration_ms": 500,
+        }
+    }
+
+    with pytest.raises(traitlets.TraitError):
+        widget.camera = {"target": [0, 0], "position": [0, 0, 1], "up": [0, 1, 0]}
+
+
+def test_molviewspec_stream():
+    """Streamed frames are sent ahead of playback at most `buffer_size` frames"""
+    produced = []
+
+    def frames():
+        for i in range(100):
+            produced.append(i)
+            builder = create_builder()
+            builder.primitives().sphere(center=(i, 0, 0), radius=1)
+            yield builder.get_snapshot(title=str(i), linger_duration_ms=10)
+
+    widget = MolViewSpec()
+    messages = capture_messages(widget)
+    stream = widget.stream(frames(), buffer_size=20, chunk_size=5)
+
+    def wait(condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    wait(lambda: stream.sent == 20)
+    time.sleep(0.05)
+    assert stream.sent == 20 and len(produced) <= 25
+
+    # the frontend reports played frames
+    widget._handle_custom_msg(
+        {"type": "stream_ack", "stream": stream.id, "played": 10}, []
+    )
+    wait(lambda: stream.sent == 30)
+
+    widget._handle_custom_msg(
+        {"type": "stream_ack", "stream": stream.id, "played": 100}, []
+    )
+    wait(lambda: stream.done)
+
+    kinds = [content["type"] for content, _ in messages]
+    assert kinds[0] == "stream_start" and kinds[-1] == "stream_end"
+    frames_sent = [f for content, _ in messages for f in content.get("frames", [])]
+    assert [f["metadata"]["title"] for f in frames_sent] == [str(i) for i in range(100)]
+
+    stream.stop()
+    assert messages[-1][0]["type"] == "stream_end"
+
+
+def test_compression():
+    """Large payloads are compressed for transport, .gz data passes through"""
+    import gzip
+
+    pdb = (Path(__file__).parent.parent / "assets" / "1qyn.pdb").read_text()
+    widget = PDBeMolstar(custom_data={"data": pdb, "format": "pdb", "binary": False})
+    state = widget.get_state("custom_data")["custom_data"]
+    assert state["compression"] == "gzip"
+    assert gzip.decompress(state["data"]).decode() == pdb
+    assert len(state["data"]) < len(pdb) / 4
+    assert widget.custom_data["data"] == pdb
+
+    small = {"data": pdb[:100], "format": "pdb", "binary": False}
+    widget.custom_data = small
+    assert widget.get_state("custom_data")["custom_data"] == small
+
+    compressed = gzip.compress(pdb.encode())
+    widget.custom_data = {"data": compressed, "format": "pdb", "binary": False}
+    state = widget.get_state("custom_data")["custom_data"]
+    assert state["compression"] == "gzip" and bytes(state["data"]) == compressed
+
+    # binary data is sent as is unless compress_binary
+    bcif = (Path(__file__).parent.parent / "assets" / "6vsb.bcif").read_bytes()
+    widget.custom_data = {"data": bcif, "format": "cif", "binary": True}
+    state = widget.get_state("custom_data")["custom_data"]
+    assert "compression" not in state and state["data"].obj is bcif
+    widget.compress_binary = True
+    assert widget.get_state("custom_data")["custom_data"]["compression"] == "gzip"
+
+    # compressed once per value
+    widget.custom_data = {"data": pdb, "format": "pdb", "binary": False}
+    first = widget.get_state("custom_data")["custom_data"]["data"]
+    assert widget.get_state("custom_data")["custom_data"]["data"] is first
+
+    widget.compression = None
+    assert "compression" not in widget.get_state("custom_data")["custom_data"]
+
+    msvj = json.dumps({"root": {"kind": "root", "children": [{"kind": "x" * 100_000}]}})
+    view = MolViewSpec(msvj_data=msvj, compression="deflate")
+    state = view.get_state("msvj_data")["msvj_data"]
+    assert state["compression"] == "deflate"
+    assert zlib.decompress(state["data"]).decode() == msvj
+
+
+def test_molviewspec_mvsx():
+    """MVSX archives are sent as state and binary assets in one transfer"""
+    import io
+    import zipfile
+
+    pdb = (Path(__file__).parent.parent / "assets" / "1qyn.pdb").read_bytes()
+    builder = create_builder()
+    (
+        builder.download(url="structures/1qyn.pdb")
+        .parse(format="pdb")
+        .model_structure()
+        .component()
+        .representation()
+    )
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("index.mvsj", builder.get_state().dumps())
+        zf.writestr("structures/1qyn.pdb", pdb)
+
+    widget = MolViewSpec()
+    sent = []
+    widget._send = lambda msg, buffers=None: sent.append((msg, buffers))
+    widget.load_mvsx(archive.getvalue())
+
+    assert json.loads(widget.msvj_data)["root"] == builder.get_state().root.model_dump(
+        exclude_none=True
+    )
+    assert bytes(widget.assets["structures/1qyn.pdb"]) == pdb
+
+    # one state update with the (compressed) file as binary buffer
+    ((msg, buffers),) = sent
+    assert set(msg["state"]) == {"assets", "msvj_data"}
+    assert msg["state"]["assets"]["structures/1qyn.pdb"]["compression"] == "gzip"
+    assert len(buffers) == 1
+
+    with pytest.raises(ValueError):
+        widget.load_mvsx(io.BytesIO(b"PK\x05\x06" + b"\x00" * 18))
+
+
+def test_hashed_assets():
+    """ESM and CSS are referenced by hash and sent on request only"""
+    import hashlib
+
+    from ipymolstar.assets import STATIC, inline_assets
+
+    light, dark = PDBeMolstar(), PDBeMolstar(theme="dark")
+    for widget in (light, dark):
+        state = widget.get_state()
+        assert len(state["_esm"]) < 5000
+        assert "_css" not in state
+    assert light._module_hash == dark._module_hash
+    css = (STATIC / "pdbe-dark.css").read_bytes()
+    assert dark._style_hashes == [hashlib.sha256(css).hexdigest()]
+
+    messages = capture_messages(dark)
+    dark._handle_custom_msg(
+        {"type": "ipymolstar:asset", "hash": dark._style_hashes[0]}, []
+    )
+    dark._handle_custom_msg({"type": "ipymolstar:asset", "hash": "unknown"}, [])
+    ((content, buffers),) = messages
+    assert content["hash"] == dark._style_hashes[0]
+    assert buffers == [css]
+
+    # included in the state for exports
+    assert dark.get_state("_asset_contents") == {"_asset_contents": {}}
+    with inline_assets():
+        contents = dark.get_state("_asset_contents")["_asset_contents"]
+    assert set(contents) == {dark._module_hash, *dark._style_hashes}
+    assert contents[dark._style_hashes[0]] == css.decode()
+
+
+def test_screenshot():
+    """Screenshots are requested by message and resolved by the frontend's reply"""
+    import asyncio
+
+    viewer = PDBeMolstar(molecule_id="1qyn")
+    messages = capture_messages(viewer)
+    future = viewer.screenshot(width=200, height=100, supersample=2)
+    ((content, _buffers),) = messages
+    assert (content["type"], content["width"], content["supersample"]) == (
+        "screenshot",
+        200,
+        2,
+    )
+    assert content["load"] is None
+    viewer._handle_custom_msg({"type": "screenshot", "id": content["id"]}, [b"\x89PNG"])
+    assert future.result() == b"\x89PNG"
+
+    future = viewer.screenshot()
+    viewer._handle_custom_msg(
+        {"type": "screenshot", "id": messages[-1][0]["id"], "error": "no size"}, []
+    )
+    with pytest.raises(RuntimeError, match="no size"):
+        future.result()
+    with pytest.raises(ValueError):
+        viewer.screenshot(supersample=8)
+
+    async def batch(viewer, items, **kwargs):
+        # the frontend replies with the loaded item, up to `concurrency` are sent ahead
+        loop = asyncio.get_running_loop()
+        sent = []
+
+        def reply(content, buffers=None):
+            if content["type"] == "screenshot_end":
+                sent.append(None)
+                return
+            sent.append(content["load"])
+            png = json.dumps(content["load"]).encode()
+            loop.call_soon(
+                viewer._handle_custom_msg,
+                {"type": "screenshot", "id": content["id"]},
+                [png],
+            )
+
+        viewer.send = reply
+        images = []
+        async for png in viewer.screenshots(items, **kwargs):
+            images.append(json.loads(png))
+            assert len(sent) <= len(images) + kwargs["concurrency"]
+            assert None not in sent
+        # the viewer is restored once, after the batch
+        assert sent.pop() is None
+        return images, sent
+
+    coloring = [{"residue_number": 1, "color": {"r": 255, "g": 0, "b": 0}}]
+    viewer.color(coloring)
+    items = ["1qyn", "6vsb", {"data": b"data_1QYN\n", "format": "cif", "binary": False}]
+    images, _sent = asyncio.run(batch(viewer, items, concurrency=2))
+    assert [image["molecule_id"] for image in images[:2]] == ["1qyn", "6vsb"]
+    assert images[2]["custom_data"]["format"] == "cif"
+
+    # the viewer lost its colors, they are sent again in full
+    messages = capture_messages(viewer)
+    viewer.color(coloring)
+    assert len(messages) == 1
+
+    builder = create_builder()
+    builder.download(url="https://files.rcsb.org/download/1qyn.pdb")
+    mvs = MolViewSpec(compression_threshold=0)
+    images, _ = asyncio.run(batch(mvs, [builder.get_state()], concurrency=1))
+    # compressed MVSJ is sent as a binary buffer
+    assert images[0]["msvj"]["compression"] == "gzip"
+
+
+def test_gallery():
+    """Gallery entries are normalized and custom_data is compressed"""
+    from ipymolstar import Gallery
+
+    data = b"data_1QYN\n" * 1000
+    gallery = Gallery(
+        ["1qyn", {"data": data, "format": "cif", "binary": False, "label": "local"}],
+        compression_threshold=1024,
+        compress_binary=True,
+    )
+    assert gallery.structures[0] == {"molecule_id": "1qyn"}
+    assert gallery.structures[1]["custom_data"]["label"] == "local"
+    assert gallery.selected_structure == {"molecule_id": "1qyn"}
+
+    state = gallery.get_state("structures")["structures"]
+    assert state[0] == {"molecule_id": "1qyn"}
+    custom_data = state[1]["custom_data"]
+    assert custom_data["compression"] == "gzip"
+    assert zlib.decompress(bytes(custom_data["data"]), 31) == data
+
+    with pytest.raises(traitlets.TraitError):
+        gallery.structures = [{"data": 1.5, "format": "pdb"}]
+    with pytest.raises(traitlets.TraitError):
+        gallery.structures = [{"custom_data": {"data": 1.5, "format": "pdb"}}]
+
+    # entries as in `structures` are validated and converted too
+    gallery.structures = [{"custom_data": {"data": bytearray(data), "format": "cif"}}]
+    assert isinstance(gallery.structures[0]["custom_data"]["data"], memoryview)
+
+    # timings are reported by the frontend as tiles render
+    gallery.set_state({"tile_timings": [{"load_ms": 120, "render_ms": 40}, None]})
+    assert gallery.tile_timings[0]["load_ms"] == 120
+    gallery.selected = 5
+    assert gallery.selected_structure is None
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="requires node")
+def test_trajectory(monkeypatch):
+    """Frames are sent as float32 buffers on request"""
+    np = pytest.importorskip("numpy")
+
+    import ipymolstar.trajectory
+
+    script = Path(__file__).parent / "js" / "trajectory.mjs"
+    result = subprocess.run(["node", str(script)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+    viewer = PDBeMolstar(molecule_id="1qyn")
+    messages = capture_messages(viewer)
+    coordinates = np.arange(12, dtype=np.float64).reshape(4, 3)
+    viewer.add_frames(coordinates)
+    # the frontend requests the frames it needs
+    assert messages == []
+    assert viewer.frame_count == 1
+    viewer._handle_custom_msg({"type": "get_frames", "start": 0, "stop": 1}, [])
+    ((content, buffers),) = messages
+    assert content == {"type": "frames", "start": 0, "n_atoms": 4}
+    assert (
+        np.frombuffer(buffers[0], dtype="<f4").tolist() == coordinates.ravel().tolist()
+    )
+
+    # frames are copied, chunked per message and must match in atom count
+    monkeypatch.setattr(ipymolstar.trajectory, "MESSAGE_SIZE", 100)
+    batch = np.stack([coordinates + i for i in range(1, 4)])
+    viewer.add_frames(batch)
+    batch[:] = 0
+    assert viewer.frame_count == 4
+    with pytest.raises(ValueError, match="4 atoms"):
+        viewer.add_frames(np.zeros((5, 3)))
+    with pytest.raises(ValueError, match="shape"):
+        viewer.add_frames(np.zeros((4, 2)))
+
+    del messages[:]
+    viewer._handle_custom_msg({"type": "get_frames", "start": 1, "stop": 8}, [])
+    assert [(c["start"], len(b)) for c, b in messages] == [(1, 2), (3, 1)]
+    assert np.frombuffer(messages[0][1][1], dtype="<f4")[0] == 2
+
+    viewer.set_state({"frame": 3, "playing": True})
+    viewer.molecule_id = "6vsb"
+    assert (viewer.frame_count, viewer.frame, viewer.playing) == (0, 0, False)
+
+
+def write_dcd(path, frames, cell=False):
+    """Write (n_frames, n_atoms, 3) coordinates as a little-endian CHARMM DCD file"""
+    import struct
+
+    import numpy as np
+
+    def record(payload: bytes) -> bytes:
+        marker = struct.pack("<i", len(payload))
+        return marker + payload + marker
+
+    control = [0] * 20
+    control[0], control[10], control[19] = len(frames), int(cell), 24
+    with open(path, "wb") as f:
+        f.write(record(b"CORD" + struct.pack("<20i", *control)))
+        f.write(record(struct.pack("<i", 1) + b"ipymolstar".ljust(80)))
+        f.write(record(struct.pack("<i", frames.shape[1])))
+        for frame in frames:
+            if cell:
+                f.write(record(np.zeros(6, dtype="<f8").tobytes()))
+            for axis in range(3):
+                f.write(
+                    record(np.ascontiguousarray(frame[:, axis], dtype="<f4").tobytes())
+                )
+
+
+def test_frame_sources(tmp_path):
+    """Frames of memory-mapped files are read by index and prefetched"""
+    np = pytest.importorskip("numpy")
+
+    from ipymolstar.frames import (
+        DCDFrames,
+        FrameSource,
+        PDBFrames,
+        Prefetcher,
+        RawFrames,
+        open_frames,
+    )
+
+    frames = np.random.default_rng(0).uniform(-50, 50, (6, 5, 3)).astype("<f4")
+
+    for cell in (False, True):
+        write_dcd(tmp_path / "traj.dcd", frames, cell=cell)
+        with open_frames(tmp_path / "traj.dcd") as source:
+            assert isinstance(source, DCDFrames)
+            assert (len(source), source.n_atoms) == (6, 5)
+            assert np.array_equal(source[3], frames[3])
+            assert np.array_equal(source[-1], frames[5])
+            with pytest.raises(IndexError):
+                source[6]
+
+    # trailing bytes of a frame still being written are ignored
+    (tmp_path / "traj.f32").write_bytes(b"HEADER" + frames.tobytes() + b"\0" * 7)
+    with RawFrames(tmp_path / "traj.f32", n_atoms=5, offset=6) as source:
+        assert len(source) == 6
+        assert np.array_equal(source[2], frames[2])
+
+    lines = []
+    for number, frame in enumerate(frames, 1):
+        lines.append(f"MODEL     {number:>4}")
+        for i, (x, y, z) in enumerate(frame, 1):
+            lines.append(
+                f"ATOM  {i:>5}  CA  ALA A{i:>4}    {x:8.3f}{y:8.3f}{z:8.3f}  1.00  0.00           C"
+            )
+        lines.append("ENDMDL")
+    (tmp_path / "traj.pdb").write_text("\n".join(lines + ["END", ""]))
+    with open_frames(tmp_path / "traj.pdb") as source:
+        assert isinstance(source, PDBFrames)
+        assert (len(source), source.n_atoms) == (6, 5)
+        assert np.allclose(source[4], frames[4], atol=1e-3)
+        index = source.index
+    with PDBFrames(tmp_path / "traj.pdb", index=index) as source:
+        assert np.allclose(source[5], frames[5], atol=1e-3)
+
+    # sources without `__len__` and `read` fail on creation
+    class Incomplete(FrameSource):
+        def read(self, index):
+            return frames[index]
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+    # frames are read ahead of the last one taken
+    with open_frames(tmp_path / "traj.dcd") as source:
+        prefetcher = Prefetcher(source, ahead=3)
+        assert np.array_equal(prefetcher.get(0), frames[0])
+        for _ in range(100):
+            if len(prefetcher._cache) == 3:
+                break
+            time.sleep(0.01)
+        assert sorted(prefetcher._cache) == [1, 2, 3]
+        assert np.array_equal(prefetcher.get(1), frames[1])
+        prefetcher.seek(5)
+        assert set(prefetcher._cache) <= {5}
+        prefetcher.close()
+
+    # widgets read frames of files when the frontend asks for them
+    viewer = PDBeMolstar(molecule_id="1qyn")
+    messages = capture_messages(viewer)
+    viewer.open_frames(tmp_path / "traj.dcd")
+    assert viewer.frame_count == 6 and messages == []
+    viewer._handle_custom_msg({"type": "get_frames", "start": 2, "stop": 4}, [])
+    ((content, buffers),) = messages
+    assert content == {"type": "frames", "start": 2, "n_atoms": 5}
+    assert np.frombuffer(buffers[1], dtype="<f4").tolist() == frames[3].ravel().tolist()
+    with pytest.raises(ValueError, match="clear"):
+        viewer.add_frames(frames[0])
+    source = viewer._frames._source
+    viewer.clear_frames()
+    assert source._mmap.closed and viewer.frame_count == 0
+
+
+# budget for `import ipymolstar` (cumulative, in microseconds); widget modules
+# and their dependencies are only imported on first use
+IMPORT_TIME_BUDGET_US = 50_000
+
+
+def test_import_time():
+    """Importing ipymolstar imports no widgets or dependencies and reads no assets"""
+    import sys
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import ipymolstar"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # lines of "import time: self [us] | cumulative | imported package"
+    imports = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                imports[name.strip()] = int(cumulative)
+    assert imports["ipymolstar"] < IMPORT_TIME_BUDGET_US
+    assert not {"anywidget", "ipywidgets", "traitlets", "numpy"} & imports.keys()
+    assert not [name for name in imports if name.startswith("ipymolstar.")]
+
+    # stylesheets are read when a viewer is created, not on import
+    script = """
+import pathlib
+reads = []
+read_bytes = pathlib.Path.read_bytes
+pathlib.Path.read_bytes = lambda path: reads.append(path.name) or read_bytes(path)
+import ipymolstar
+from ipymolstar.pdbemolstar import theme_css
+ipymolstar.PDBeMolstar, ipymolstar.MolViewSpec, ipymolstar.Gallery
+assert reads == [], reads
+assert ".msp-plugin" in theme_css("dark") and reads == ["pdbe-dark.css"], reads
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr